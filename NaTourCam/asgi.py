@@ -9,16 +9,16 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.urls import re_path
 from notifications import consumers
+from notifications.tickets import TicketAuthMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'NaTourCam.settings')
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "websocket": TicketAuthMiddleware(
         URLRouter([
             re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
         ])
@@ -164,3 +164,66 @@ CHANNEL_LAYERS = {
         },
     },
 }
+
+# Payment gateway used by the process_payments worker
+PAYMENT_GATEWAY = {
+    'BACKEND': 'bookings.gateways.FakePaymentGateway',
+    'OPTIONS': {},
+}
+
+# Minutes a freed seat is held for a promoted waitlist party
+WAITLIST_HOLD_MINUTES = 30
+
+# Dynamic departure pricing; see tours.pricing.DEFAULT_RULES for the defaults
+DYNAMIC_PRICING = {
+    'CACHE_TIMEOUT': 300,
+}
+
+# Notification WebSocket batching and limits; see notifications.consumers
+NOTIFICATION_SOCKET = {
+    'BATCH_WINDOW': 0.05,
+    'MAX_QUEUED_EVENTS': 200,
+    'MAX_SUBSCRIPTIONS': 50,
+    'REPLAY_LIMIT': 100,
+    'TICKET_MAX_AGE': 60,
+    'USER_CACHE_TTL': 300,
+}
+
+# Outgoing email for the deliver_notifications worker. Locally, run a debugging
+# SMTP server with: python -m aiosmtpd -n -l localhost:1025
+DEFAULT_FROM_EMAIL = 'NaTourCam <no-reply@natourcam.com>'
+EMAIL_HOST = 'localhost'
+EMAIL_PORT = 1025
+
+# SMS adapter used by the deliver_notifications worker
+SMS_BACKEND = {
+    'BACKEND': 'notifications.sms.ConsoleSMSBackend',
+    'OPTIONS': {},
+}
+
+# Admin dashboard cache; see analytics.dashboard
+ANALYTICS_DASHBOARD = {
+    'FRESH_FOR': 60,
+    'STALE_FOR': 600,
+}
+
+# In-process revenue cube behind /api/analytics/revenue-cube/; see analytics.cube
+REVENUE_CUBE = {
+    'REFRESH_INTERVAL': 30,
+    'REFRESH_OVERLAP': 60,
+}
+
+# Product event log: events are buffered in memory and bulk inserted after the response
+EVENT_LOG = {
+    'BUFFER_SIZE': 500,
+    'FLUSH_INTERVAL': 5,
+}
+
+# Live top destinations and tours (Space-Saving summaries per region and day)
+TRENDING = {
+    'CAPACITY': 100,
+    'VIEW_WEIGHT': 1,
+    'BOOKING_WEIGHT': 10,
+    'REFRESH_INTERVAL': 30,
+    'REFRESH_OVERLAP': 60,
+}
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import UserAnalytics, AttractionAnalytics, TourAnalytics, BookingAnalytics, SystemAnalytics
+from .models import (
+    UserAnalytics, AttractionAnalytics, TourAnalytics, BookingAnalytics, SystemAnalytics, DailyEventAggregate,
+    VisitorSketch,
+)
 
 @admin.register(UserAnalytics)
 class UserAnalyticsAdmin(admin.ModelAdmin):
@@ -25,3 +28,14 @@ class BookingAnalyticsAdmin(admin.ModelAdmin):
 class SystemAnalyticsAdmin(admin.ModelAdmin):
     list_display = ('date', 'total_users', 'total_attractions', 'total_tours', 'total_bookings', 'total_revenue')
     list_filter = ('date',)
+
+@admin.register(DailyEventAggregate)
+class DailyEventAggregateAdmin(admin.ModelAdmin):
+    list_display = ('date', 'event_type', 'object_id', 'count')
+    list_filter = ('event_type', 'date')
+
+@admin.register(VisitorSketch)
+class VisitorSketchAdmin(admin.ModelAdmin):
+    list_display = ('date', 'kind', 'object_id')
+    list_filter = ('kind', 'date')
+    exclude = ('registers',)
@@ -0,0 +1,212 @@
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from bookings.models import Booking, Payment
+from .rollups import REVENUE_STATUSES
+
+DIMENSIONS = ('tour', 'month', 'status', 'payment_method')
+
+DEFAULT_CUBE_OPTIONS = {
+    # Seconds between incremental refreshes
+    'REFRESH_INTERVAL': 30,
+    # Seconds of changes re-read on each refresh, covering transactions that commit late
+    'REFRESH_OVERLAP': 60,
+}
+
+
+def cube_options():
+    return {**DEFAULT_CUBE_OPTIONS, **getattr(settings, 'REVENUE_CUBE', {})}
+
+
+class Dictionary:
+    """Dictionary encoding of one dimension: value <-> small integer code"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values):
+        """Codes for the known ``values``; unknown values match nothing"""
+        return [self.codes[value] for value in values if value in self.codes]
+
+
+class Columns:
+    """One immutable version of the cube's columns; refreshes publish a new one"""
+
+    def __init__(self, dictionaries, booking_ids, codes, revenue):
+        self.dictionaries = dictionaries
+        self.booking_ids = booking_ids
+        self.codes = codes
+        self.revenue = revenue
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            {name: Dictionary() for name in DIMENSIONS},
+            np.empty(0, dtype=np.int64),
+            {name: np.empty(0, dtype=np.int32) for name in DIMENSIONS},
+            np.empty(0, dtype=np.float64),
+        )
+
+
+class RevenueCube:
+    """Columnar copy of bookings, one row per booking, for fast pivots.
+
+    Dimensions are stored as int32 codes into per-dimension dictionaries and
+    revenue (the price of bookings in REVENUE_STATUSES, 0 otherwise) as
+    float64, so slicing is a boolean mask and a rollup is one ``bincount``
+    over the combined codes of the grouped dimensions.
+
+    Refreshes build new arrays and publish them with a single assignment
+    to ``columns``, and a query reads ``columns`` once, so queries never
+    need the refresh lock. Dictionaries only ever grow, so codes in an
+    older version keep their values.
+    """
+
+    def __init__(self):
+        self.columns = Columns.empty()
+        self.watermark = None
+
+    def __len__(self):
+        return len(self.columns.booking_ids)
+
+    def refresh(self):
+        """Load bookings changed since the last refresh (everything the first time).
+
+        Deleted bookings leave nothing to pick up incrementally, so when the
+        table ends up holding fewer bookings than the cube it is rebuilt.
+        """
+        started = timezone.now()
+        incremental = self.watermark is not None
+        bookings = Booking.objects.all()
+        if incremental:
+            since = self.watermark - timedelta(seconds=cube_options()['REFRESH_OVERLAP'])
+            # Two indexed lookups; a payment change does not touch its booking
+            bookings = bookings.filter(
+                Q(updated_at__gte=since)
+                | Q(id__in=Payment.objects.filter(updated_at__gte=since).values('booking_id'))
+            )
+
+        rows = bookings.order_by('id').values_list(
+            'id', 'tour_id', TruncMonth('created_at'), 'status', 'payment__payment_method', 'total_price'
+        )
+        self.merge(list(rows.iterator(chunk_size=5000)))
+        self.watermark = started
+        if incremental and Booking.objects.count() < len(self):
+            rebuilt = RevenueCube()
+            rebuilt.refresh()
+            self.columns, self.watermark = rebuilt.columns, rebuilt.watermark
+
+    def merge(self, rows):
+        """Insert new bookings and overwrite changed ones, keeping rows sorted by booking id"""
+        if not rows:
+            return
+        current = self.columns
+        ids, tours, months, statuses, methods, prices = zip(*rows)
+        ids = np.asarray(ids, dtype=np.int64)
+        encoders = {name: current.dictionaries[name].encode for name in DIMENSIONS}
+        codes = {
+            'tour': np.fromiter(map(encoders['tour'], tours), dtype=np.int32, count=len(ids)),
+            'month': np.fromiter((encoders['month'](m.strftime('%Y-%m')) for m in months),
+                                 dtype=np.int32, count=len(ids)),
+            'status': np.fromiter(map(encoders['status'], statuses), dtype=np.int32, count=len(ids)),
+            'payment_method': np.fromiter((encoders['payment_method'](m or 'none') for m in methods),
+                                          dtype=np.int32, count=len(ids)),
+        }
+        revenue = np.fromiter(
+            (price if status in REVENUE_STATUSES else 0 for status, price in zip(statuses, prices)),
+            dtype=np.float64, count=len(ids),
+        )
+
+        positions = np.searchsorted(current.booking_ids, ids)
+        known = positions < len(current.booking_ids)
+        known[known] = current.booking_ids[positions[known]] == ids[known]
+        # Copies, so the published version stays intact for running queries
+        merged_codes = {name: current.codes[name].copy() for name in DIMENSIONS}
+        merged_revenue = current.revenue.copy()
+        for name in DIMENSIONS:
+            merged_codes[name][positions[known]] = codes[name][known]
+        merged_revenue[positions[known]] = revenue[known]
+        booking_ids = current.booking_ids
+
+        new = ~known
+        if new.any():
+            booking_ids = np.concatenate([booking_ids, ids[new]])
+            for name in DIMENSIONS:
+                merged_codes[name] = np.concatenate([merged_codes[name], codes[name][new]])
+            merged_revenue = np.concatenate([merged_revenue, revenue[new]])
+            if not np.all(booking_ids[:-1] <= booking_ids[1:]):
+                order = np.argsort(booking_ids, kind='stable')
+                booking_ids = booking_ids[order]
+                for name in DIMENSIONS:
+                    merged_codes[name] = merged_codes[name][order]
+                merged_revenue = merged_revenue[order]
+
+        self.columns = Columns(current.dictionaries, booking_ids, merged_codes, merged_revenue)
+
+    def query(self, group_by=(), filters=None):
+        """Slice by ``filters`` ({dimension: values}) and roll up to the ``group_by`` dimensions.
+
+        Returns columns: one list per grouped dimension plus ``bookings`` and
+        ``revenue``, with a row for every non-empty cell. Only occupied cells
+        are counted, so memory does not grow with the product of the
+        dictionary sizes.
+        """
+        columns = self.columns
+        mask = np.ones(len(columns.booking_ids), dtype=bool)
+        for name, values in (filters or {}).items():
+            mask &= np.isin(columns.codes[name], columns.dictionaries[name].lookup(values))
+
+        sizes = [max(len(columns.dictionaries[name].values), 1) for name in group_by]
+        if group_by:
+            cells = np.ravel_multi_index([columns.codes[name][mask] for name in group_by], sizes)
+        else:
+            cells = np.zeros(int(mask.sum()), dtype=np.int64)
+        occupied, index = np.unique(cells, return_inverse=True)
+        bookings = np.bincount(index, minlength=len(occupied))
+        revenue = np.bincount(index, weights=columns.revenue[mask], minlength=len(occupied))
+
+        result = {'dimensions': list(group_by)}
+        if group_by:
+            for name, codes in zip(group_by, np.unravel_index(occupied, sizes)):
+                values = columns.dictionaries[name].values
+                result[name] = [values[code] for code in codes]
+        result['bookings'] = bookings.tolist()
+        result['revenue'] = np.round(revenue, 2).tolist()
+        return result
+
+
+_cube = None
+_refreshed_at = 0.0
+_lock = threading.Lock()
+
+
+def get_cube():
+    """The process-wide cube, refreshed incrementally at most every REFRESH_INTERVAL seconds"""
+    global _cube, _refreshed_at
+    with _lock:
+        if _cube is None:
+            _cube = RevenueCube()
+        if time.monotonic() - _refreshed_at >= cube_options()['REFRESH_INTERVAL']:
+            _cube.refresh()
+            _refreshed_at = time.monotonic()
+        return _cube
+
+
+def reset_cube():
+    """Drop the process-wide cube so the next query rebuilds it"""
+    global _cube, _refreshed_at
+    with _lock:
+        _cube, _refreshed_at = None, 0.0
@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max, Sum
+from accounts.models import User
+from attractions.models import Attraction
+from bookings.models import Booking
+from tours.models import Tour
+from .models import BookingAnalytics, SystemAnalytics
+from .rollups import REVENUE_STATUSES, day_start
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DASHBOARD_OPTIONS = {
+    # Seconds a computed dashboard is served as-is
+    'FRESH_FOR': 60,
+    # Further seconds a stale dashboard is served while it is recomputed in the background
+    'STALE_FOR': 600,
+}
+
+
+def dashboard_options():
+    return {**DEFAULT_DASHBOARD_OPTIONS, **getattr(settings, 'ANALYTICS_DASHBOARD', {})}
+
+
+def system_totals():
+    """Platform totals: the latest SystemAnalytics snapshot plus rows created since it"""
+    snapshot = SystemAnalytics.objects.order_by('-date').first()
+    if snapshot is None:
+        # No rollup yet: count everything
+        since = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+        totals = {'users': 0, 'attractions': 0, 'tours': 0, 'bookings': 0, 'revenue': 0}
+    else:
+        since = day_start(snapshot.date + timedelta(days=1))
+        totals = {
+            'users': snapshot.total_users,
+            'attractions': snapshot.total_attractions,
+            'tours': snapshot.total_tours,
+            'bookings': snapshot.total_bookings,
+            'revenue': snapshot.total_revenue,
+        }
+
+    new_bookings = Booking.objects.filter(created_at__gte=since)
+    return {
+        'total_users': totals['users'] + User.objects.filter(date_joined__gte=since).count(),
+        'total_attractions': totals['attractions'] + Attraction.objects.filter(created_at__gte=since).count(),
+        'total_tours': totals['tours'] + Tour.objects.filter(created_at__gte=since).count(),
+        'total_bookings': totals['bookings'] + new_bookings.count(),
+        'total_revenue': totals['revenue'] + (
+            new_bookings.filter(status__in=REVENUE_STATUSES).aggregate(total=Sum('total_price'))['total'] or 0
+        ),
+    }
+
+
+def recent_totals(start, end):
+    """Bookings and revenue for ``start``..``end``: rolled-up days plus live rows after the last rollup"""
+    rolled_up = BookingAnalytics.objects.filter(date__range=[start, end]).aggregate(
+        total_bookings=Sum('total_bookings'), total_revenue=Sum('total_revenue'),
+        last_date=Max('date'),
+    )
+    live_from = max(start, rolled_up['last_date'] + timedelta(days=1)) if rolled_up['last_date'] else start
+    live = Booking.objects.filter(
+        created_at__gte=day_start(live_from), created_at__lt=day_start(end + timedelta(days=1))
+    )
+    return {
+        'total_bookings': (rolled_up['total_bookings'] or 0) + live.count(),
+        'total_revenue': (rolled_up['total_revenue'] or 0) + (
+            live.filter(status__in=REVENUE_STATUSES).aggregate(total=Sum('total_price'))['total'] or 0
+        ),
+    }
+
+
+def build_dashboard(start, end):
+    return {
+        'system': system_totals(),
+        'recent': recent_totals(start, end),
+        'start_date': start,
+        'end_date': end,
+    }
+
+
+def cache_key(start, end):
+    return f'admin_dashboard:{start}:{end}'
+
+
+def refresh_dashboard(start, end):
+    """Recompute one dashboard and cache it with its freshness deadline"""
+    options = dashboard_options()
+    data = build_dashboard(start, end)
+    cache.set(
+        cache_key(start, end),
+        {'data': data, 'fresh_until': time.time() + options['FRESH_FOR']},
+        options['FRESH_FOR'] + options['STALE_FOR'],
+    )
+    return data
+
+
+def _refresh_in_background(start, end, lock_key):
+    try:
+        refresh_dashboard(start, end)
+    except Exception:
+        logger.exception('Failed to refresh admin dashboard for %s..%s', start, end)
+    finally:
+        cache.delete(lock_key)
+        connections.close_all()
+
+
+def get_dashboard(start, end):
+    """Serve a dashboard from cache with stale-while-revalidate.
+
+    A fresh entry is returned as-is. A stale one is returned immediately
+    while one background thread, elected through ``cache.add``, recomputes
+    it. Only a cold cache computes inline.
+    """
+    cached = cache.get(cache_key(start, end))
+    if cached is None:
+        return refresh_dashboard(start, end)
+
+    if cached['fresh_until'] <= time.time():
+        lock_key = f'{cache_key(start, end)}:refreshing'
+        if cache.add(lock_key, True, 60):
+            threading.Thread(
+                target=_refresh_in_background, args=(start, end, lock_key), daemon=True
+            ).start()
+    return cached['data']
@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from attractions.models import Attraction
+from .models import AttractionAnalytics, DailyEventAggregate, ProductEvent
+from .rollups import day_start
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENT_OPTIONS = {
+    # Buffered events that trigger a flush
+    'BUFFER_SIZE': 500,
+    # Seconds after which a non-empty buffer is flushed at the end of a request
+    'FLUSH_INTERVAL': 5,
+}
+
+_buffer = []
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def event_options():
+    return {**DEFAULT_EVENT_OPTIONS, **getattr(settings, 'EVENT_LOG', {})}
+
+
+def record(event_type, object_id=None, user_id=None):
+    """Buffer one event. This only appends to a list; nothing touches the database."""
+    event = ProductEvent(event_type=event_type, object_id=object_id, user_id=user_id, created_at=timezone.now())
+    # Taken so an append cannot land in a list flush() has already swapped out
+    with _lock:
+        _buffer.append(event)
+
+
+def record_request(request, event_type, object_id=None):
+    user = getattr(request, 'user', None)
+    record(event_type, object_id, user.id if user is not None and user.is_authenticated else None)
+
+
+def flush(force=True):
+    """Write buffered events with one bulk insert.
+
+    Without ``force`` nothing happens until the buffer reaches BUFFER_SIZE or
+    FLUSH_INTERVAL has passed, nor inside a transaction whose rollback would
+    take the events with it. Events are best effort: a failed write is
+    logged and dropped rather than breaking the request that triggered it.
+    """
+    global _buffer, _last_flush
+    options = event_options()
+    if not _buffer or not force and (
+        transaction.get_connection().in_atomic_block
+        or len(_buffer) < options['BUFFER_SIZE']
+        and time.monotonic() - _last_flush < options['FLUSH_INTERVAL']
+    ):
+        return 0
+    with _lock:
+        events, _buffer = _buffer, []
+        _last_flush = time.monotonic()
+    try:
+        ProductEvent.objects.bulk_create(events, batch_size=1000)
+    except Exception:
+        logger.exception('Dropped %d product events', len(events))
+        return 0
+    return len(events)
+
+
+def compact_day(day):
+    """Fold one day's raw events into DailyEventAggregate and delete them.
+
+    Counts are added to any existing aggregates and the raw rows are removed
+    in the same transaction, so rerunning never double counts. Only events
+    up to the highest id seen when counting are deleted; ones flushed for
+    the day meanwhile are left for the next run. Attraction
+    views are also added to ``AttractionAnalytics.total_views``.
+    """
+    start = day_start(day)
+    raw = ProductEvent.objects.filter(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+
+    with transaction.atomic():
+        max_id = raw.aggregate(max_id=Max('id'))['max_id']
+        if max_id is None:
+            return 0
+        raw = raw.filter(id__lte=max_id)
+        new_counts = Counter({
+            (row['event_type'], row['object_id'] or 0): row['count']
+            for row in raw.order_by().values('event_type', 'object_id').annotate(count=Count('id'))
+        })
+
+        counts = new_counts.copy()
+        for aggregate in DailyEventAggregate.objects.filter(date=day):
+            counts[(aggregate.event_type, aggregate.object_id)] += aggregate.count
+        DailyEventAggregate.objects.bulk_create(
+            [DailyEventAggregate(date=day, event_type=event_type, object_id=object_id, count=count)
+             for (event_type, object_id), count in counts.items()],
+            update_conflicts=True, unique_fields=['date', 'event_type', 'object_id'], update_fields=['count'],
+            batch_size=1000,
+        )
+
+        views = {
+            object_id: count for (event_type, object_id), count in new_counts.items()
+            if event_type == ProductEvent.ATTRACTION_VIEW
+        }
+        # Attractions deleted since the view have nowhere to count it
+        views = {
+            attraction_id: views[attraction_id]
+            for attraction_id in Attraction.objects.filter(id__in=views).values_list('id', flat=True)
+        }
+        AttractionAnalytics.objects.bulk_create(
+            [AttractionAnalytics(attraction_id=attraction_id) for attraction_id in views], ignore_conflicts=True
+        )
+        for attraction_id, count in views.items():
+            AttractionAnalytics.objects.filter(attraction_id=attraction_id).update(
+                total_views=F('total_views') + count
+            )
+        deleted, _ = raw.delete()
+    return deleted
+
+
+def compact_events(before):
+    """Compact every day with raw events before the date ``before``; returns ``{date: events}``"""
+    days = ProductEvent.objects.filter(created_at__lt=day_start(before)).order_by() \
+        .values_list(TruncDate('created_at'), flat=True).distinct()
+    return {day: compact_day(day) for day in sorted(days)}
@@ -0,0 +1,75 @@
+import heapq
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters summary over at most ``capacity`` items.
+
+    Once full, a new item replaces the current minimum and inherits its
+    count as overestimation error, so every item whose true weight exceeds
+    total / capacity is guaranteed to be tracked. Counts are upper bounds
+    and ``count - error`` lower bounds.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # Lazy min-heap of (count, item); entries whose count is stale are skipped
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def offer(self, item, weight=1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+            self.errors[item] = 0
+        else:
+            minimum, evicted = self._pop_min()
+            del counts[evicted], self.errors[evicted]
+            counts[item] = minimum + weight
+            self.errors[item] = minimum
+        heapq.heappush(self._heap, (counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, item) for item, count in counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def floor(self):
+        """Most weight an untracked item can have: the minimum count once full, else 0"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other):
+        """A new summary of both streams.
+
+        An item missing from a full summary may have been evicted there, so
+        it is charged that summary's minimum count, both as count and as
+        error; this keeps counts upper bounds after merging.
+        """
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        own_floor, other_floor = self.floor(), other.floor()
+        counts, errors = {}, {}
+        for item in dict.fromkeys([*self.counts, *other.counts]):
+            counts[item] = self.counts.get(item, own_floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, own_floor) + other.errors.get(item, other_floor)
+        for item, count in heapq.nlargest(merged.capacity, counts.items(), key=lambda entry: entry[1]):
+            merged.counts[item] = count
+            merged.errors[item] = errors[item]
+        merged._heap = [(count, item) for item, count in merged.counts.items()]
+        heapq.heapify(merged._heap)
+        return merged
+
+    def top(self, n):
+        """The ``n`` heaviest items as ``(item, count, error)``"""
+        return [
+            (item, count, self.errors[item])
+            for item, count in heapq.nlargest(n, self.counts.items(), key=lambda entry: entry[1])
+        ]
@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics import events
+
+
+class Command(BaseCommand):
+    help = 'Fold raw product events into daily aggregates and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=1,
+                            help='Most recent days of raw events to leave in place')
+
+    def handle(self, *args, **options):
+        events.flush()
+        before = timezone.localdate() - timedelta(days=options['keep_days'] - 1)
+        compacted = events.compact_events(before)
+        for day, count in compacted.items():
+            self.stdout.write(f'{day}: {count} events')
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {sum(compacted.values())} events over {len(compacted)} days'
+        ))
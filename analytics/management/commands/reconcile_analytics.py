@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from analytics.models import TourAnalytics, UserAnalytics
+from analytics.totals import find_drift, fix_drift
+
+
+class Command(BaseCommand):
+    help = 'Compare user and tour booking/revenue totals against bookings and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Overwrite drifted totals with the recomputed values')
+        parser.add_argument('--verbose-rows', type=int, default=20,
+                            help='Drifted rows to print per model')
+
+    def handle(self, *args, **options):
+        for model in (UserAnalytics, TourAnalytics):
+            with transaction.atomic():
+                drift = find_drift(model)
+                if drift and options['fix']:
+                    fix_drift(model, drift)
+
+            label = model.__name__
+            if not drift:
+                self.stdout.write(self.style.SUCCESS(f'{label}: no drift'))
+                continue
+            self.stdout.write(self.style.WARNING(
+                f"{label}: {len(drift)} drifted rows{' fixed' if options['fix'] else ''}"
+            ))
+            for owner_id, (bookings, money), (expected_bookings, expected_money) in drift[:options['verbose_rows']]:
+                self.stdout.write(
+                    f'  {owner_id}: bookings {bookings} -> {expected_bookings}, '
+                    f'money {money} -> {expected_money}'
+                )
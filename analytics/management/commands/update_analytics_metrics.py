@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from analytics.metrics import update_metrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute attraction peak seasons and tour completion rates from all bookings'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        attractions, tours = update_metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {attractions} attraction peak seasons and {tours} tour completion rates '
+            f'in {time.monotonic() - started:.2f}s'
+        ))
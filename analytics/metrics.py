@@ -0,0 +1,115 @@
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import ExtractMonth
+from django.utils import timezone
+from bookings.models import Booking
+from .models import AttractionAnalytics, TourAnalytics
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+# Length in months of the busiest stretch reported as the peak season
+SEASON_MONTHS = 3
+
+
+def season_label(start_month):
+    """``'Jun-Aug'`` for a season starting in month index 5 (wrapping past December)"""
+    return f'{MONTHS[start_month]}-{MONTHS[(start_month + SEASON_MONTHS - 1) % 12]}'
+
+
+def peak_seasons(attraction_ids, months, participants):
+    """``{attraction_id: label}`` of the busiest SEASON_MONTHS-month window per attraction.
+
+    Takes parallel arrays of (attraction, departure month 1-12, travellers)
+    and builds every attraction's 12-bin histogram with one ``bincount``;
+    windows wrap around the year, so Dec-Feb is a candidate season.
+    """
+    attraction_ids = np.asarray(attraction_ids, dtype=np.int64)
+    if not len(attraction_ids):
+        return {}
+    ids, index = np.unique(attraction_ids, return_inverse=True)
+    histograms = np.bincount(
+        index * 12 + np.asarray(months, dtype=np.int64) - 1,
+        weights=np.asarray(participants, dtype=np.float64), minlength=len(ids) * 12,
+    ).reshape(len(ids), 12)
+    windows = sum(np.roll(histograms, -offset, axis=1) for offset in range(SEASON_MONTHS))
+    peaks = windows.argmax(axis=1)
+    busy = histograms.sum(axis=1) > 0
+    return {int(attraction_id): season_label(int(peak))
+            for attraction_id, peak in zip(ids[busy], peaks[busy])}
+
+
+def completion_rates(tour_ids, completed, due):
+    """``{tour_id: percentage}`` of due bookings that were completed.
+
+    Takes parallel arrays of (tour, completed flag, booking count) where
+    rows are bookings whose departure has passed or that were completed.
+    Cancelled bookings past departure count as not completed, so the rate
+    is the share of booked departures that actually ran. Tours with no due
+    bookings are left out.
+    """
+    tour_ids = np.asarray(tour_ids, dtype=np.int64)
+    if not len(tour_ids):
+        return {}
+    ids, index = np.unique(tour_ids, return_inverse=True)
+    due = np.asarray(due, dtype=np.float64)
+    totals = np.bincount(index, weights=due, minlength=len(ids))
+    done = np.bincount(index, weights=due * np.asarray(completed, dtype=bool), minlength=len(ids))
+    rates = np.round(100 * done / totals, 2)
+    return {int(tour_id): Decimal(f'{rate:.2f}') for tour_id, rate in zip(ids, rates.tolist())}
+
+
+def booked_months():
+    """Travellers per (attraction, departure month) over all non-cancelled bookings"""
+    rows = Booking.objects.exclude(status='cancelled').filter(tour__attractions__isnull=False).order_by().values_list(
+        'tour__attractions', ExtractMonth('tour_availability__date'),
+    ).annotate(travellers=Sum('participants'))
+    return tuple(zip(*rows)) or ((), (), ())
+
+
+def due_bookings(today):
+    """Bookings per (tour, completed) among those completed or past their departure, cancelled ones included"""
+    is_completed = Q(status='completed') | Q(completed_date__isnull=False)
+    rows = Booking.objects.filter(
+        is_completed | Q(tour_availability__date__lt=today)
+    ).order_by().values_list(
+        'tour_id',
+        Case(When(is_completed, then=Value(1)), default=Value(0), output_field=IntegerField()),
+    ).annotate(count=Count('id'))
+    return tuple(zip(*rows)) or ((), (), ())
+
+
+def write_metrics(model, owner, field, values, default):
+    """Set ``field`` on every ``model`` row from ``{owner_id: value}``; rows without data get ``default``.
+
+    With a ``default`` of None rows without data keep their value. Missing
+    analytics rows are created first; only changed rows are written.
+    """
+    model.objects.bulk_create(
+        [model(**{f'{owner}_id': owner_id}) for owner_id in values], ignore_conflicts=True, batch_size=1000
+    )
+    changed = []
+    for row in model.objects.only('id', f'{owner}_id', field).iterator(chunk_size=2000):
+        value = values.get(getattr(row, f'{owner}_id'), default)
+        if value is not None and getattr(row, field) != value:
+            setattr(row, field, value)
+            changed.append(row)
+    model.objects.bulk_update(changed, [field], batch_size=500)
+    return len(changed)
+
+
+def update_metrics(today=None):
+    """Recompute every attraction's peak season and every tour's completion rate.
+
+    Two grouped queries feed NumPy histograms; returns the number of
+    attraction and tour rows changed. A tour with no bookings due yet keeps
+    its completion rate rather than dropping to 0.
+    """
+    today = today or timezone.localdate()
+    seasons = peak_seasons(*booked_months())
+    rates = completion_rates(*due_bookings(today))
+    with transaction.atomic():
+        return (
+            write_metrics(AttractionAnalytics, 'attraction', 'peak_season', seasons, ''),
+            write_metrics(TourAnalytics, 'tour', 'completion_rate', rates, None),
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.PositiveSmallIntegerField(choices=[(1, 'Search'), (2, 'Attraction View'), (3, 'Tour View'), (4, 'Booking Created'), (5, 'Booking Confirmed'), (6, 'Booking Cancelled'), (7, 'Payment Completed')])),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('user_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyEventAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('event_type', models.PositiveSmallIntegerField(choices=[(1, 'Search'), (2, 'Attraction View'), (3, 'Tour View'), (4, 'Booking Created'), (5, 'Booking Confirmed'), (6, 'Booking Cancelled'), (7, 'Payment Completed')])),
+                ('object_id', models.PositiveIntegerField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('date', 'event_type', 'object_id')},
+            },
+        ),
+    ]
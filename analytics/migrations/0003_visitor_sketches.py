@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_product_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Attraction'), (2, 'Tour')])),
+                ('object_id', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('registers', models.BinaryField()),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('kind', 'object_id', 'date')},
+            },
+        ),
+    ]
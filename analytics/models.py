@@ -79,3 +79,72 @@ class SystemAnalytics(models.Model):
 
     def __str__(self):
         return f"System Analytics for {self.date}"
+
+class ProductEvent(models.Model):
+    """Append-only log of searches, detail views and booking funnel steps"""
+    SEARCH = 1
+    ATTRACTION_VIEW = 2
+    TOUR_VIEW = 3
+    BOOKING_CREATED = 4
+    BOOKING_CONFIRMED = 5
+    BOOKING_CANCELLED = 6
+    PAYMENT_COMPLETED = 7
+
+    EVENT_TYPES = [
+        (SEARCH, 'Search'),
+        (ATTRACTION_VIEW, 'Attraction View'),
+        (TOUR_VIEW, 'Tour View'),
+        (BOOKING_CREATED, 'Booking Created'),
+        (BOOKING_CONFIRMED, 'Booking Confirmed'),
+        (BOOKING_CANCELLED, 'Booking Cancelled'),
+        (PAYMENT_COMPLETED, 'Payment Completed'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.PositiveSmallIntegerField(choices=EVENT_TYPES)
+    # Attraction, tour or booking id depending on the event type; no foreign
+    # keys so logging never joins or cascades
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    user_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} {self.object_id} at {self.created_at}"
+
+class DailyEventAggregate(models.Model):
+    """Daily event counts compacted from ProductEvent"""
+    date = models.DateField()
+    event_type = models.PositiveSmallIntegerField(choices=ProductEvent.EVENT_TYPES)
+    # 0 for events without an object, such as searches
+    object_id = models.PositiveIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ('date', 'event_type', 'object_id')
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} {self.object_id} on {self.date}: {self.count}"
+
+class VisitorSketch(models.Model):
+    """HyperLogLog sketch of one day's unique visitors to an attraction or tour"""
+    ATTRACTION = 1
+    TOUR = 2
+
+    KINDS = [
+        (ATTRACTION, 'Attraction'),
+        (TOUR, 'Tour'),
+    ]
+
+    kind = models.PositiveSmallIntegerField(choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    date = models.DateField()
+    # One byte per register; see analytics.sketches
+    registers = models.BinaryField()
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ('kind', 'object_id', 'date')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id} visitors on {self.date}"
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from attractions.models import Attraction
+from tours.models import Tour
+from .models import DailyEventAggregate, ProductEvent
+from .rollups import REVENUE_STATUSES, day_start
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def previous_period(start, end):
+    """The period of the same length ending the day before ``start``"""
+    length = end - start + timedelta(days=1)
+    return start - length, start - timedelta(days=1)
+
+
+def period_filter(bookings, start, end):
+    return Q(**{
+        f'{bookings}__created_at__gte': day_start(start),
+        f'{bookings}__created_at__lt': day_start(end + timedelta(days=1)),
+    })
+
+
+def period_views(event_type, start, end):
+    """Detail views of the outer row over ``start``..``end``, as subqueries.
+
+    Compacted days come from DailyEventAggregate and days not compacted yet
+    from the raw log; compaction moves rows between the two atomically, so
+    nothing is counted twice.
+    """
+    compacted = Subquery(
+        DailyEventAggregate.objects.filter(
+            event_type=event_type, object_id=OuterRef('id'), date__range=[start, end]
+        ).order_by().values('object_id').annotate(total=Sum('count')).values('total'),
+        output_field=IntegerField(),
+    )
+    raw = Subquery(
+        ProductEvent.objects.filter(
+            event_type=event_type, object_id=OuterRef('id'),
+            created_at__gte=day_start(start), created_at__lt=day_start(end + timedelta(days=1)),
+        ).order_by().values('object_id').annotate(total=Count('id')).values('total'),
+        output_field=IntegerField(),
+    )
+    return Coalesce(compacted, 0) + Coalesce(raw, 0)
+
+
+def period_annotations(bookings, event_type, start, end, prefix):
+    in_period = period_filter(bookings, start, end)
+    return {
+        f'{prefix}_bookings': Count(f'{bookings}__id', filter=in_period),
+        f'{prefix}_revenue': Coalesce(
+            Sum(f'{bookings}__total_price', filter=in_period & Q(**{f'{bookings}__status__in': REVENUE_STATUSES})),
+            Value(Decimal('0')), output_field=MONEY,
+        ),
+        f'{prefix}_views': period_views(event_type, start, end),
+    }
+
+
+def with_periods(queryset, bookings, event_type, start, end, compare):
+    """Annotate period bookings, revenue and views, plus the previous period and changes when ``compare``.
+
+    Everything is conditional aggregation over one join to bookings, so the
+    whole page is a single GROUP BY query.
+    """
+    annotations = period_annotations(bookings, event_type, start, end, 'period')
+    if compare:
+        annotations.update(period_annotations(bookings, event_type, *previous_period(start, end), 'previous'))
+    queryset = queryset.annotate(**annotations)
+    if compare:
+        queryset = queryset.annotate(
+            bookings_change=F('period_bookings') - F('previous_bookings'),
+            revenue_change=F('period_revenue') - F('previous_revenue'),
+            views_change=F('period_views') - F('previous_views'),
+        )
+    return queryset
+
+
+def tour_portfolio(user, start, end, compare=False):
+    """The tours ``user`` created with their lifetime totals and period figures"""
+    queryset = Tour.objects.filter(created_by=user).annotate(
+        total_bookings=Coalesce(F('analytics__total_bookings'), 0),
+        total_revenue=Coalesce(F('analytics__total_revenue'), Value(Decimal('0')), output_field=MONEY),
+        average_rating=F('analytics__average_rating'),
+        total_reviews=Coalesce(F('analytics__total_reviews'), 0),
+        completion_rate=F('analytics__completion_rate'),
+    )
+    return with_periods(queryset, 'bookings', ProductEvent.TOUR_VIEW, start, end, compare)
+
+
+def attraction_portfolio(user, start, end, compare=False):
+    """The attractions ``user`` created; bookings are those of the tours visiting them"""
+    queryset = Attraction.objects.filter(created_by=user).annotate(
+        total_views=Coalesce(F('analytics__total_views'), 0),
+        total_bookings=Coalesce(F('analytics__total_bookings'), 0),
+        average_rating=F('analytics__average_rating'),
+        total_reviews=Coalesce(F('analytics__total_reviews'), 0),
+        peak_season=F('analytics__peak_season'),
+    )
+    return with_periods(queryset, 'tours__bookings', ProductEvent.ATTRACTION_VIEW, start, end, compare)
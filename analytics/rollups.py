@@ -0,0 +1,157 @@
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import connections
+from django.db.models import Case, CharField, Count, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from accounts.models import User
+from attractions.models import Attraction
+from bookings.models import Booking
+from tours.models import Tour
+from .models import BookingAnalytics, SystemAnalytics
+
+# Bookings in these states count towards revenue
+REVENUE_STATUSES = ('confirmed', 'completed')
+TOP_DESTINATIONS = 10
+
+USER_TYPE = Case(
+    When(user__is_administrator=True, then=Value('administrator')),
+    When(user__is_tour_operator=True, then=Value('tour_operator')),
+    default=Value('traveller'),
+    output_field=CharField(),
+)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def daily_counts(queryset, field, start, end):
+    """``{date: count}`` of rows whose ``field`` falls in the date range"""
+    rows = queryset.filter(**{
+        f'{field}__gte': day_start(start),
+        f'{field}__lt': day_start(end + timedelta(days=1)),
+    }).order_by().values(day=TruncDate(field)).annotate(count=Count('id'))
+    return {row['day']: row['count'] for row in rows}
+
+
+def rollup_range(start, end):
+    """Build and upsert BookingAnalytics and SystemAnalytics rows for ``start``..``end``.
+
+    All booking figures come from one GROUP BY over the range's bookings;
+    the cumulative system totals start from one count per model before the
+    range and add that model's per-day counts. Top destinations are ranked
+    from bookings and detail views as the live trending tracker does.
+    Rerunning a range overwrites its rows. Returns the number of days written.
+    """
+    range_start, range_end = day_start(start), day_start(end + timedelta(days=1))
+    bookings = Booking.objects.filter(created_at__gte=range_start, created_at__lt=range_end)
+
+    by_tour = defaultdict(Counter)
+    by_user_type = defaultdict(Counter)
+    revenue = defaultdict(Decimal)
+    for row in bookings.order_by().values('tour_id', day=TruncDate('created_at'), user_type=USER_TYPE).annotate(
+        count=Count('id'),
+        revenue=Sum('total_price', filter=Q(status__in=REVENUE_STATUSES)),
+    ):
+        by_tour[row['day']][row['tour_id']] += row['count']
+        by_user_type[row['day']][row['user_type']] += row['count']
+        revenue[row['day']] += row['revenue'] or 0
+
+    # Imported here: trending builds on this module's helpers
+    from .trending import top_destinations_by_day
+    top_destinations = top_destinations_by_day(start, end, [
+        (tour_id, day, count) for day, counts in by_tour.items() for tour_id, count in counts.items()
+    ], TOP_DESTINATIONS)
+
+    before = Booking.objects.filter(created_at__lt=range_start)
+    totals = {
+        'users': User.objects.filter(date_joined__lt=range_start).count(),
+        'attractions': Attraction.objects.filter(created_at__lt=range_start).count(),
+        'tours': Tour.objects.filter(created_at__lt=range_start).count(),
+        'bookings': before.count(),
+        'revenue': before.filter(status__in=REVENUE_STATUSES).aggregate(total=Sum('total_price'))['total'] or 0,
+    }
+    new_users = daily_counts(User.objects, 'date_joined', start, end)
+    new_attractions = daily_counts(Attraction.objects, 'created_at', start, end)
+    new_tours = daily_counts(Tour.objects, 'created_at', start, end)
+
+    booking_rows, system_rows = [], []
+    day = start
+    while day <= end:
+        day_bookings = sum(by_tour[day].values())
+        totals['users'] += new_users.get(day, 0)
+        totals['attractions'] += new_attractions.get(day, 0)
+        totals['tours'] += new_tours.get(day, 0)
+        totals['bookings'] += day_bookings
+        totals['revenue'] += revenue[day]
+
+        booking_rows.append(BookingAnalytics(
+            date=day,
+            total_bookings=day_bookings,
+            total_revenue=revenue[day],
+            bookings_by_tour={str(tour_id): count for tour_id, count in by_tour[day].items()},
+            bookings_by_user_type=dict(by_user_type[day]),
+        ))
+        system_rows.append(SystemAnalytics(
+            date=day,
+            total_users=totals['users'],
+            total_attractions=totals['attractions'],
+            total_tours=totals['tours'],
+            total_bookings=totals['bookings'],
+            total_revenue=totals['revenue'],
+            top_destinations=top_destinations.get(day, []),
+        ))
+        day += timedelta(days=1)
+
+    BookingAnalytics.objects.bulk_create(
+        booking_rows, update_conflicts=True, unique_fields=['date'],
+        update_fields=['total_bookings', 'total_revenue', 'bookings_by_tour', 'bookings_by_user_type'],
+    )
+    SystemAnalytics.objects.bulk_create(
+        system_rows, update_conflicts=True, unique_fields=['date'],
+        update_fields=['total_users', 'total_attractions', 'total_tours', 'total_bookings',
+                       'total_revenue', 'top_destinations'],
+    )
+    return len(booking_rows)
+
+
+def date_chunks(start, end, chunk_days):
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        yield start, chunk_end
+        start = chunk_end + timedelta(days=1)
+
+
+def _rollup_in_worker(chunk):
+    try:
+        return chunk, rollup_range(*chunk)
+    finally:
+        # Worker threads open their own connections; do not leak them
+        connections.close_all()
+
+
+def backfill(start, end, chunk_days=31, workers=4, progress=None):
+    """Roll up ``start``..``end`` in chunks of ``chunk_days``, ``workers`` chunks at a time.
+
+    Chunks are independent and upserted on ``date``, so an interrupted
+    backfill can simply be rerun. ``workers=1`` runs inline in this thread.
+    ``progress`` is called with ``((chunk_start, chunk_end), days)`` as each
+    chunk finishes.
+    """
+    chunks = list(date_chunks(start, end, chunk_days))
+    if workers == 1:
+        return _collect(((chunk, rollup_range(*chunk)) for chunk in chunks), progress)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return _collect(executor.map(_rollup_in_worker, chunks), progress)
+
+
+def _collect(results, progress):
+    days = 0
+    for chunk, written in results:
+        days += written
+        if progress:
+            progress(chunk, written)
+    return days
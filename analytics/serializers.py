@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from attractions.models import Attraction
+from tours.models import Tour
 from .models import UserAnalytics, AttractionAnalytics, TourAnalytics, BookingAnalytics, SystemAnalytics
 
 class UserAnalyticsSerializer(serializers.ModelSerializer):
@@ -29,4 +31,54 @@ class SystemAnalyticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = SystemAnalytics
         fields = ['date', 'total_users', 'total_attractions', 'total_tours', 'total_bookings', 'total_revenue', 'top_destinations']
-        read_only_fields = ['date', 'total_users', 'total_attractions', 'total_tours', 'total_bookings', 'total_revenue', 'top_destinations']
\ No newline at end of file
+        read_only_fields = ['date', 'total_users', 'total_attractions', 'total_tours', 'total_bookings', 'total_revenue', 'top_destinations']
+
+class PeriodFieldsMixin(serializers.Serializer):
+    """Period figures annotated by analytics.portfolio"""
+    period_bookings = serializers.IntegerField(read_only=True)
+    period_revenue = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    period_views = serializers.IntegerField(read_only=True)
+
+class ComparisonFieldsMixin(serializers.Serializer):
+    """Previous period figures and changes, present when comparing"""
+    previous_bookings = serializers.IntegerField(read_only=True)
+    previous_revenue = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    previous_views = serializers.IntegerField(read_only=True)
+    bookings_change = serializers.IntegerField(read_only=True)
+    revenue_change = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    views_change = serializers.IntegerField(read_only=True)
+
+COMPARISON_FIELDS = ['previous_bookings', 'previous_revenue', 'previous_views',
+                     'bookings_change', 'revenue_change', 'views_change']
+
+class TourPortfolioSerializer(PeriodFieldsMixin, serializers.ModelSerializer):
+    total_bookings = serializers.IntegerField(read_only=True)
+    total_revenue = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    average_rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    total_reviews = serializers.IntegerField(read_only=True)
+    completion_rate = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = Tour
+        fields = ['id', 'title', 'is_active', 'total_bookings', 'total_revenue', 'average_rating', 'total_reviews',
+                  'completion_rate', 'period_bookings', 'period_revenue', 'period_views']
+
+class TourPortfolioComparisonSerializer(ComparisonFieldsMixin, TourPortfolioSerializer):
+    class Meta(TourPortfolioSerializer.Meta):
+        fields = TourPortfolioSerializer.Meta.fields + COMPARISON_FIELDS
+
+class AttractionPortfolioSerializer(PeriodFieldsMixin, serializers.ModelSerializer):
+    total_views = serializers.IntegerField(read_only=True)
+    total_bookings = serializers.IntegerField(read_only=True)
+    average_rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    total_reviews = serializers.IntegerField(read_only=True)
+    peak_season = serializers.CharField(read_only=True)
+    
+    class Meta:
+        model = Attraction
+        fields = ['id', 'name', 'is_active', 'total_views', 'total_bookings', 'average_rating', 'total_reviews',
+                  'peak_season', 'period_bookings', 'period_revenue', 'period_views']
+
+class AttractionPortfolioComparisonSerializer(ComparisonFieldsMixin, AttractionPortfolioSerializer):
+    class Meta(AttractionPortfolioSerializer.Meta):
+        fields = AttractionPortfolioSerializer.Meta.fields + COMPARISON_FIELDS
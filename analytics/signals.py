@@ -1 +1,64 @@
-# Signals for analytics app
\ No newline at end of file
+# Signals for analytics app
+from django.core.signals import request_finished
+from django.db import transaction
+from django.dispatch import receiver
+from bookings.signals import booking_status_changed, payment_status_changed
+from . import events, sketches
+from .models import ProductEvent, TourAnalytics, UserAnalytics
+from .totals import apply_deltas, booking_delta, collect_deltas, payment_delta
+
+# Totals are updated inside the sender's transaction, so they roll back with it
+
+
+@receiver(booking_status_changed)
+def count_booking_transitions(sender, transitions, **kwargs):
+    def delta(t):
+        return booking_delta(t.old_status, t.new_status), 0
+
+    apply_deltas(UserAnalytics, collect_deltas(transitions, 'user_id', delta))
+    apply_deltas(TourAnalytics, collect_deltas(transitions, 'tour_id', delta))
+
+
+@receiver(payment_status_changed)
+def count_payment_transitions(sender, transitions, **kwargs):
+    def delta(t):
+        return 0, payment_delta(t.old_status, t.new_status, t.amount)
+
+    apply_deltas(UserAnalytics, collect_deltas(transitions, 'user_id', delta))
+    apply_deltas(TourAnalytics, collect_deltas(transitions, 'tour_id', delta))
+
+
+BOOKING_EVENTS = {
+    'confirmed': ProductEvent.BOOKING_CONFIRMED,
+    'cancelled': ProductEvent.BOOKING_CANCELLED,
+}
+
+
+def record_on_commit(funnel):
+    # Funnel steps are logged only once the transition has committed
+    if funnel:
+        transaction.on_commit(lambda: [events.record(*event) for event in funnel])
+
+
+@receiver(booking_status_changed)
+def log_booking_funnel(sender, transitions, **kwargs):
+    record_on_commit([
+        (ProductEvent.BOOKING_CREATED if t.old_status is None else BOOKING_EVENTS[t.new_status], t.booking_id, t.user_id)
+        for t in transitions
+        if t.old_status is None or t.new_status in BOOKING_EVENTS
+    ])
+
+
+@receiver(payment_status_changed)
+def log_payment_funnel(sender, transitions, **kwargs):
+    record_on_commit([
+        (ProductEvent.PAYMENT_COMPLETED, t.booking_id, t.user_id)
+        for t in transitions if t.new_status == 'completed'
+    ])
+
+
+@receiver(request_finished)
+def flush_events(sender, **kwargs):
+    # Runs after the response is sent; writes only once the buffer is due
+    events.flush(force=False)
+    sketches.flush(force=False)
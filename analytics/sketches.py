@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from .events import event_options
+from .models import VisitorSketch
+from .rollups import day_start
+
+logger = logging.getLogger(__name__)
+
+# 2**12 one-byte registers: 4 KB per sketch, about 1.6% standard error
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+RANK_BITS = 64 - PRECISION
+
+_pending = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_today = (None, 0.0)
+
+
+def visitor_hash(visitor):
+    return int.from_bytes(hashlib.blake2b(visitor.encode(), digest_size=8).digest(), 'big')
+
+
+def empty():
+    return np.zeros(REGISTERS, dtype=np.uint8)
+
+
+def add_hashes(registers, hashes):
+    """Fold 64-bit hashes into ``registers`` in place.
+
+    The top PRECISION bits pick the register; the register keeps the
+    largest position of the first set bit seen in the remaining bits.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    index = (hashes >> np.uint64(RANK_BITS)).astype(np.intp)
+    rest = hashes & np.uint64((1 << RANK_BITS) - 1)
+    # frexp's exponent is the bit length; exact because rest < 2**53
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    np.maximum.at(registers, index, (RANK_BITS + 1 - bit_length).astype(np.uint8))
+    return registers
+
+
+def estimate(registers):
+    """Estimated number of distinct hashes folded into ``registers``"""
+    raw = ALPHA * REGISTERS ** 2 / np.sum(np.ldexp(1.0, -registers.astype(np.int32)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * REGISTERS and zeros:
+        # Linear counting is more accurate for small cardinalities
+        return round(REGISTERS * np.log(REGISTERS / zeros))
+    return round(raw)
+
+
+def visitor_key(request):
+    """Signed-in users by id; anonymous visitors by address and user agent"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.id}'
+    return f"anon:{request.META.get('REMOTE_ADDR', '')}:{request.META.get('HTTP_USER_AGENT', '')}"
+
+
+def today():
+    """``timezone.localdate()``, recomputed only when the local day ends"""
+    global _today
+    day, ends_at = _today
+    if time.time() >= ends_at:
+        day = timezone.localdate()
+        _today = (day, day_start(day + timedelta(days=1)).timestamp())
+    return day
+
+
+def observe(kind, object_id, visitor):
+    """Count one visit in this process's sketch for today; no database access"""
+    value = visitor_hash(visitor)
+    index, rest = value >> RANK_BITS, value & ((1 << RANK_BITS) - 1)
+    rank = RANK_BITS + 1 - rest.bit_length()
+    key = (kind, object_id, today())
+    with _lock:
+        registers = _pending.get(key)
+        if registers is None:
+            registers = _pending[key] = empty()
+        if registers[index] < rank:
+            registers[index] = rank
+
+
+def observe_request(request, kind, object_id):
+    observe(kind, object_id, visitor_key(request))
+
+
+def merge_into_database(sketches):
+    """Merge ``{(kind, object_id, date): registers}`` into the stored sketches.
+
+    Register-wise maximum is the HyperLogLog union, so merging is
+    idempotent and order independent; rows are locked so concurrent
+    processes cannot lose each other's updates.
+    """
+    with transaction.atomic():
+        VisitorSketch.objects.bulk_create(
+            [VisitorSketch(kind=kind, object_id=object_id, date=day, registers=empty().tobytes())
+             for kind, object_id, day in sketches],
+            ignore_conflicts=True,
+        )
+        rows = []
+        for kind in {kind for kind, _, _ in sketches}:
+            object_ids = {object_id for k, object_id, _ in sketches if k == kind}
+            dates = {day for k, _, day in sketches if k == kind}
+            for row in VisitorSketch.objects.select_for_update().filter(
+                kind=kind, object_id__in=object_ids, date__in=dates
+            ):
+                registers = sketches.get((row.kind, row.object_id, row.date))
+                if registers is not None:
+                    row.registers = np.maximum(
+                        np.frombuffer(row.registers, dtype=np.uint8), registers
+                    ).tobytes()
+                    rows.append(row)
+        VisitorSketch.objects.bulk_update(rows, ['registers'], batch_size=500)
+    return len(rows)
+
+
+def flush(force=True):
+    """Merge this process's sketches into the database.
+
+    Follows the event log's schedule: without ``force`` it waits for
+    FLUSH_INTERVAL and never writes inside an open transaction. A failed
+    merge is logged and dropped.
+    """
+    global _pending, _last_flush
+    if not _pending or not force and (
+        transaction.get_connection().in_atomic_block
+        or time.monotonic() - _last_flush < event_options()['FLUSH_INTERVAL']
+    ):
+        return 0
+    with _lock:
+        sketches, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    try:
+        return merge_into_database(sketches)
+    except Exception:
+        logger.exception('Dropped %d visitor sketches', len(sketches))
+        return 0
+
+
+def unique_visitors(kind, object_id, start, end):
+    """Estimated unique visitors over ``start``..``end`` plus a per-day breakdown"""
+    total = empty()
+    days = []
+    for day, registers in VisitorSketch.objects.filter(
+        kind=kind, object_id=object_id, date__range=[start, end]
+    ).order_by('date').values_list('date', 'registers'):
+        registers = np.frombuffer(registers, dtype=np.uint8)
+        np.maximum(total, registers, out=total)
+        days.append({'date': day, 'unique_visitors': estimate(registers)})
+    return {
+        'start_date': start,
+        'end_date': end,
+        'unique_visitors': estimate(total),
+        'days': days,
+    }
@@ -1,16 +1,33 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 from accounts.models import TourOperator
 from attractions.models import AttractionCategory, Attraction
-from tours.models import Tour
-from .models import UserAnalytics, AttractionAnalytics, TourAnalytics
+from bookings.models import Booking, Payment
+from tours.models import Tour, TourAvailability
+from . import events, sketches, trending
+from .cube import reset_cube
+from .heavy_hitters import SpaceSaving
+from .models import (
+    UserAnalytics, AttractionAnalytics, TourAnalytics, BookingAnalytics, SystemAnalytics,
+    DailyEventAggregate, ProductEvent, VisitorSketch,
+)
 
 User = get_user_model()
 
 class AnalyticsAPITestCase(TestCase):
     def setUp(self):
+        # The event and visitor buffers are module globals shared across tests
+        events._buffer.clear()
+        sketches._pending.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             username='testuser',
@@ -120,3 +137,355 @@ class AnalyticsAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('system', response.data)
         self.assertIn('recent', response.data)
+
+    def test_totals_follow_transitions_and_reconcile(self):
+        """Test booking and payment transitions adjust totals and reconciliation repairs drift"""
+        traveller = User.objects.create_user(username='traveller', email='traveller@example.com',
+                                             password='testpassword123')
+        availability = TourAvailability.objects.create(tour=self.tour, date='2026-06-01', spots_available=10)
+        booking = Booking.objects.create(
+            user=traveller, tour=self.tour, tour_availability=availability, participants=2,
+            total_price=200, emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+        )
+        payment = Payment.objects.create(booking=booking, amount=200, payment_method='credit_card',
+                                         transaction_id='txn-1')
+        payment.status = 'completed'
+        payment.save()
+
+        analytics = UserAnalytics.objects.get(user=traveller)
+        self.assertEqual((analytics.total_bookings, analytics.total_spent), (1, 200))
+        self.tour_analytics.refresh_from_db()
+        self.assertEqual((self.tour_analytics.total_bookings, self.tour_analytics.total_revenue), (16, 1700))
+
+        payment.status = 'refunded'
+        payment.save()
+        booking.status = 'cancelled'
+        booking.save()
+        analytics.refresh_from_db()
+        self.assertEqual((analytics.total_bookings, analytics.total_spent), (0, 0))
+
+        # The fixture rows were seeded with totals that have no bookings behind them
+        out = StringIO()
+        call_command('reconcile_analytics', fix=True, stdout=out)
+        self.assertIn('UserAnalytics: 1 drifted rows fixed', out.getvalue())
+        self.assertIn('TourAnalytics: 1 drifted rows fixed', out.getvalue())
+        self.tour_analytics.refresh_from_db()
+        self.assertEqual((self.tour_analytics.total_bookings, self.tour_analytics.total_revenue), (0, 0))
+        call_command('reconcile_analytics', stdout=out)
+        self.assertIn('TourAnalytics: no drift', out.getvalue())
+
+    def test_rollup_backfill(self):
+        """Test the backfill builds one idempotent row per day from grouped bookings"""
+        self.tour.attractions.add(self.attraction)
+        availability = TourAvailability.objects.create(tour=self.tour, date='2026-06-01', spots_available=10)
+        for day, booking_status, user in [('2025-03-01', 'confirmed', self.user),
+                                          ('2025-03-01', 'cancelled', self.user),
+                                          ('2025-03-03', 'completed', self.tour_operator_user)]:
+            booking = Booking.objects.create(
+                user=user, tour=self.tour, tour_availability=availability, participants=1, total_price=100,
+                status=booking_status, emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+            )
+            Booking.objects.filter(pk=booking.pk).update(created_at=f'{day}T10:00:00Z')
+
+        out = StringIO()
+        for _ in range(2):
+            call_command('rollup_analytics', start=date(2025, 3, 1), end=date(2025, 3, 4),
+                         chunk_days=3, workers=1, stdout=out)
+        self.assertIn('Backfilled 4 days', out.getvalue())
+        self.assertEqual(BookingAnalytics.objects.count(), 4)
+
+        first = BookingAnalytics.objects.get(date='2025-03-01')
+        self.assertEqual((first.total_bookings, first.total_revenue), (2, 100))
+        self.assertEqual(first.bookings_by_tour, {str(self.tour.id): 2})
+        self.assertEqual(first.bookings_by_user_type, {'traveller': 2})
+        system = SystemAnalytics.objects.get(date='2025-03-04')
+        self.assertEqual((system.total_bookings, system.total_revenue), (3, 200))
+        self.assertEqual(SystemAnalytics.objects.get(date='2025-03-03').top_destinations, [self.attraction.id])
+
+    def test_admin_dashboard_snapshot_plus_delta(self):
+        """Test the dashboard adds rows newer than the latest snapshot and is served from cache"""
+        cache.clear()
+        SystemAnalytics.objects.create(date=timezone.localdate() - timedelta(days=1), total_users=100,
+                                       total_attractions=10, total_tours=5, total_bookings=50, total_revenue=5000)
+        availability = TourAvailability.objects.create(tour=self.tour, date='2026-06-01', spots_available=10)
+        Booking.objects.create(
+            user=self.user, tour=self.tour, tour_availability=availability, participants=1, total_price=100,
+            status='confirmed', emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+        )
+
+        self.client.force_authenticate(user=self.admin_user)
+        url = f'/api/analytics/admin/dashboard/?start_date={timezone.localdate()}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Users, attractions and tours in setUp were created today, after the snapshot
+        self.assertEqual(response.data['system']['total_users'], 103)
+        self.assertEqual(response.data['system']['total_bookings'], 51)
+        self.assertEqual(response.data['system']['total_revenue'], 5100)
+        self.assertEqual(response.data['recent'], {'total_bookings': 1, 'total_revenue': 100})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data, response.data)
+        for start_date in ('bad', '2026-02-30'):
+            self.assertEqual(self.client.get(f'/api/analytics/admin/dashboard/?start_date={start_date}').status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    def test_timeseries(self):
+        """Test series are resampled into columnar buckets and scoped by owner"""
+        BookingAnalytics.objects.bulk_create([
+            BookingAnalytics(date='2025-01-01', total_bookings=2, total_revenue=200),
+            BookingAnalytics(date='2025-02-15', total_bookings=3, total_revenue=150.5),
+        ])
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get('/api/analytics/timeseries/',
+                                   {'start_date': '2024-12-01', 'end_date': '2025-02-28', 'resolution': 'month'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'resolution': 'month',
+            'periods': ['2024-12-01', '2025-01-01', '2025-02-01'],
+            'bookings': [0, 2, 3],
+            'revenue': [0.0, 200.0, 150.5],
+        })
+
+        availability = TourAvailability.objects.create(tour=self.tour, date='2026-06-01', spots_available=10)
+        Booking.objects.create(
+            user=self.user, tour=self.tour, tour_availability=availability, participants=1, total_price=100,
+            status='confirmed', emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+        )
+        self.client.force_authenticate(user=self.tour_operator_user)
+        response = self.client.get('/api/analytics/timeseries/', {'tour': self.tour.id, 'resolution': 'quarter'})
+        self.assertEqual(sum(response.data['bookings']), 1)
+        self.assertEqual(response.data['revenue'][-1], 100.0)
+        self.assertEqual(self.client.get('/api/analytics/timeseries/').status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(REVENUE_CUBE={'REFRESH_INTERVAL': 0})
+    def test_revenue_cube(self):
+        """Test the cube pivots bookings by dimension and picks up changes and deletions"""
+        reset_cube()
+        availability = TourAvailability.objects.create(tour=self.tour, date='2026-06-01', spots_available=10)
+        bookings = []
+        for booking_status in ('confirmed', 'confirmed', 'pending'):
+            bookings.append(Booking.objects.create(
+                user=self.user, tour=self.tour, tour_availability=availability, participants=1, total_price=100,
+                status=booking_status, emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+            ))
+        Payment.objects.create(booking=bookings[0], amount=100, payment_method='paypal', transaction_id='txn-1')
+
+        self.client.force_authenticate(user=self.tour_operator_user)
+        response = self.client.get('/api/analytics/revenue-cube/', {'group_by': 'status,payment_method'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cells = dict(zip(zip(response.data['status'], response.data['payment_method']), response.data['bookings']))
+        self.assertEqual(cells, {('confirmed', 'paypal'): 1, ('confirmed', 'none'): 1, ('pending', 'none'): 1})
+        # Revenue counts only REVENUE_STATUSES, like the rest of analytics
+        response = self.client.get('/api/analytics/revenue-cube/', {'group_by': 'status'})
+        self.assertEqual(dict(zip(response.data['status'], response.data['revenue'])),
+                         {'confirmed': 200.0, 'pending': 0.0})
+
+        bookings[2].status = 'confirmed'
+        bookings[2].save()
+        response = self.client.get('/api/analytics/revenue-cube/', {'status': 'confirmed'})
+        self.assertEqual((response.data['bookings'], response.data['revenue']), ([3], [300.0]))
+
+        bookings[1].delete()
+        response = self.client.get('/api/analytics/revenue-cube/', {'status': 'confirmed'})
+        self.assertEqual((response.data['bookings'], response.data['revenue']), ([2], [200.0]))
+
+        # Other users' bookings are outside their own tours
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/analytics/revenue-cube/').data['bookings'], [])
+
+    def test_product_events_are_buffered_and_compacted(self):
+        """Test views are logged without a write per request and compacted into daily counts"""
+        views_before = self.attraction_analytics.total_views
+
+        self.client.get(f'/api/attractions/{self.attraction.id}/')
+        self.client.get(f'/api/attractions/{self.attraction.id}/')
+        self.client.get('/api/tours/', {'search': 'beach'})
+        self.assertEqual(events.flush(), 3)
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        ProductEvent.objects.update(created_at=timezone.now() - timedelta(days=1))
+        call_command('compact_events', stdout=StringIO())
+        call_command('compact_events', stdout=StringIO())
+
+        self.assertFalse(ProductEvent.objects.exists())
+        self.assertEqual(
+            DailyEventAggregate.objects.get(date=yesterday, event_type=ProductEvent.ATTRACTION_VIEW,
+                                            object_id=self.attraction.id).count,
+            2
+        )
+        self.assertEqual(DailyEventAggregate.objects.get(event_type=ProductEvent.SEARCH).count, 1)
+        self.attraction_analytics.refresh_from_db()
+        self.assertEqual(self.attraction_analytics.total_views, views_before + 2)
+
+    def test_unique_visitors(self):
+        """Test visitor sketches count distinct visitors and merge across days"""
+        for user in (self.user, self.admin_user, self.user):
+            self.client.force_authenticate(user=user)
+            self.client.get(f'/api/attractions/{self.attraction.id}/')
+        self.client.force_authenticate(user=None)
+        self.client.get(f'/api/attractions/{self.attraction.id}/')
+        self.assertEqual(sketches.flush(), 1)
+        registers = np.frombuffer(VisitorSketch.objects.get().registers, dtype=np.uint8)
+        self.assertEqual(sketches.estimate(registers), 3)
+
+        # Yesterday: 20000 visitors, half of them seen again today
+        yesterday = timezone.localdate() - timedelta(days=1)
+        hashes = np.random.default_rng(1).integers(0, 2 ** 63, size=30000, dtype=np.uint64) * np.uint64(2)
+        key = (VisitorSketch.ATTRACTION, self.attraction.id)
+        sketches.merge_into_database({
+            (*key, yesterday): sketches.add_hashes(sketches.empty(), hashes[:20000]),
+            (*key, timezone.localdate()): sketches.add_hashes(sketches.empty(), hashes[10000:]),
+        })
+
+        self.client.force_authenticate(user=self.tour_operator_user)
+        response = self.client.get('/api/analytics/unique-visitors/', {
+            'attraction': self.attraction.id, 'start_date': timezone.localdate(), 'end_date': timezone.localdate()
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAlmostEqual(response.data['unique_visitors'], 20003, delta=20003 * 0.05)
+        response = self.client.get('/api/analytics/unique-visitors/', {'attraction': self.attraction.id})
+        self.assertAlmostEqual(response.data['unique_visitors'], 30003, delta=30003 * 0.05)
+        self.assertEqual(len(response.data['days']), 2)
+
+        # Other users' attractions are not visible
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/analytics/unique-visitors/', {'attraction': self.attraction.id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(TRENDING={'REFRESH_INTERVAL': 0, 'VIEW_WEIGHT': 1, 'BOOKING_WEIGHT': 10})
+    def test_trending_destinations(self):
+        """Test the live top-K ranks views and bookings per region and picks up new events"""
+        trending.reset_tracker()
+        lake = Attraction.objects.create(
+            name='Test Lake', description='A quiet lake', category=self.category, address='1 Lake Rd',
+            city='Lake City', state_province='Lake State', country='Beach Country',
+            latitude='1.000000', longitude='2.000000', created_by=self.tour_operator_user
+        )
+        self.tour.attractions.add(self.attraction)
+        availability = TourAvailability.objects.create(tour=self.tour, date='2026-06-01', spots_available=10)
+        Booking.objects.create(
+            user=self.user, tour=self.tour, tour_availability=availability, participants=1, total_price=100,
+            emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+        )
+        for _ in range(3):
+            self.client.get(f'/api/attractions/{lake.id}/')
+        events.flush()
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/analytics/trending/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['id'], row['score']) for row in response.data['results']],
+                         [(self.attraction.id, 10), (lake.id, 3)])
+        response = self.client.get('/api/analytics/trending/', {'region': 'Lake State'})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Test Lake'])
+        response = self.client.get('/api/analytics/trending/', {'type': 'tours', 'window': 'week'})
+        self.assertEqual([(row['id'], row['score']) for row in response.data['results']], [(self.tour.id, 10)])
+
+        for _ in range(8):
+            self.client.get(f'/api/attractions/{lake.id}/')
+        events.flush()
+        response = self.client.get('/api/analytics/trending/')
+        self.assertEqual(response.data['results'][0]['id'], lake.id)
+
+        # A view committed after the last refresh but dated before it is still counted, once;
+        # region lookups are reloaded, so it lands in the attraction's new region
+        Attraction.objects.filter(id=lake.id).update(state_province='Other State')
+        ProductEvent.objects.create(event_type=ProductEvent.ATTRACTION_VIEW, object_id=lake.id,
+                                    created_at=timezone.now() - timedelta(seconds=10))
+        for _ in range(2):
+            response = self.client.get('/api/analytics/trending/', {'region': 'Other State'})
+        self.assertEqual([(row['id'], row['score']) for row in response.data['results']], [(lake.id, 1)])
+
+        # Bounded memory still finds the heavy hitter in a long tail
+        summary = SpaceSaving(10)
+        for item in range(1000):
+            summary.offer('hot', 5)
+            summary.offer(item)
+        self.assertEqual(len(summary), 10)
+        self.assertEqual(summary.top(1)[0][0], 'hot')
+
+        # An item missing from a full summary is charged that summary's minimum when merging
+        full, partial = SpaceSaving(2), SpaceSaving(2)
+        full.offer('a', 5)
+        full.offer('b', 3)
+        partial.offer('c', 4)
+        self.assertEqual(full.merge(partial).top(2), [('c', 7, 3), ('a', 5, 0)])
+
+    def test_portfolio(self):
+        """Test an operator's tours and attractions come back in one page query with period changes"""
+        self.tour.attractions.add(self.attraction)
+        availability = TourAvailability.objects.create(tour=self.tour, date='2026-06-01', spots_available=10)
+        for days_ago in (1, 2, 40):
+            booking = Booking.objects.create(
+                user=self.user, tour=self.tour, tour_availability=availability, participants=1, total_price=100,
+                status='confirmed', emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+            )
+            Booking.objects.filter(pk=booking.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        DailyEventAggregate.objects.create(
+            date=timezone.localdate() - timedelta(days=3), event_type=ProductEvent.ATTRACTION_VIEW,
+            object_id=self.attraction.id, count=5
+        )
+        # Today's views are still in the raw log
+        ProductEvent.objects.bulk_create([
+            ProductEvent(event_type=ProductEvent.ATTRACTION_VIEW, object_id=self.attraction.id,
+                         created_at=timezone.now())
+            for _ in range(2)
+        ])
+        Tour.objects.create(
+            title='Other Tour', description='Someone else', tour_operator=self.tour_operator, duration_days=1,
+            max_participants=5, difficulty_level='easy', price=10, start_date='2026-01-01', end_date='2026-12-31',
+            start_location='A', end_location='B',
+            created_by=self.admin_user
+        )
+
+        self.client.force_authenticate(user=self.tour_operator_user)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/analytics/portfolio/tours/',
+                                       {'compare': 'true', 'ordering': '-bookings_change'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        tour = response.data['results'][0]
+        self.assertEqual((tour['id'], tour['period_bookings'], tour['previous_bookings'], tour['bookings_change']),
+                         (self.tour.id, 2, 1, 1))
+        self.assertEqual(tour['revenue_change'], '100.00')
+
+        response = self.client.get('/api/analytics/portfolio/attractions/')
+        attraction = response.data['results'][0]
+        self.assertEqual((attraction['period_bookings'], attraction['period_views']), (2, 7))
+        self.assertNotIn('views_change', attraction)
+
+    def test_update_analytics_metrics(self):
+        """Test peak seasons and completion rates are derived from bookings in one batch"""
+        self.tour.attractions.add(self.attraction)
+        for departure, booking_status, participants in [('2025-12-10', 'completed', 2),
+                                                         ('2026-01-15', 'completed', 3),
+                                                         ('2026-01-20', 'cancelled', 1),
+                                                         ('2026-02-20', 'confirmed', 1),
+                                                         ('2026-07-01', 'cancelled', 9),
+                                                         ('2026-06-01', 'confirmed', 1)]:
+            availability = TourAvailability.objects.create(tour=self.tour, date=departure, spots_available=10)
+            Booking.objects.create(
+                user=self.user, tour=self.tour, tour_availability=availability, participants=participants,
+                total_price=100, status=booking_status,
+                emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+            )
+        # Only future departures: no data, so the stored rate is kept
+        new_tour = Tour.objects.create(
+            title='New Tour', description='Not run yet', tour_operator=self.tour_operator, duration_days=1,
+            max_participants=5, difficulty_level='easy', price=10, start_date='2026-01-01', end_date='2026-12-31',
+            start_location='A', end_location='B', created_by=self.tour_operator_user
+        )
+        TourAnalytics.objects.create(tour=new_tour, completion_rate=80)
+
+        out = StringIO()
+        with patch('analytics.metrics.timezone.localdate', return_value=date(2026, 3, 1)):
+            call_command('update_analytics_metrics', stdout=out)
+        self.assertIn('Updated 1 attraction peak seasons and 1 tour completion rates', out.getvalue())
+        self.attraction_analytics.refresh_from_db()
+        self.tour_analytics.refresh_from_db()
+        # Dec-Feb wraps the year; the cancelled July party is ignored
+        self.assertEqual(self.attraction_analytics.peak_season, 'Dec-Feb')
+        # Two of the four bookings departed by March were completed; the cancelled
+        # 2026-01-20 booking counts as not completed
+        self.assertEqual(self.tour_analytics.completion_rate, 50)
+        self.assertEqual(TourAnalytics.objects.get(tour=new_tour).completion_rate, 80)
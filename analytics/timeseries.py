@@ -0,0 +1,82 @@
+from datetime import timedelta
+import numpy as np
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from bookings.models import Booking
+from .models import BookingAnalytics
+from .rollups import REVENUE_STATUSES, day_start
+
+RESOLUTIONS = ('day', 'week', 'month', 'quarter')
+
+
+def bucket_starts(days, resolution):
+    """First day of the bucket each ``datetime64[D]`` value falls in"""
+    if resolution == 'day':
+        return days
+    if resolution == 'week':
+        # 1970-01-01 was a Thursday; shift back to Monday
+        return days - (days.astype('int64') + 3) % 7
+    months = days.astype('datetime64[M]')
+    if resolution == 'quarter':
+        months = months - months.astype('int64') % 3
+    return months.astype('datetime64[D]')
+
+
+def all_buckets(start, end, resolution):
+    """Every bucket start from ``start``'s bucket through ``end``'s, so gaps chart as zeros"""
+    first, last = bucket_starts(np.array([start, end], dtype='datetime64[D]'), resolution)
+    if resolution in ('day', 'week'):
+        return np.arange(first, last + 1, 7 if resolution == 'week' else 1)
+    months = np.arange(first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1,
+                       3 if resolution == 'quarter' else 1)
+    return months.astype('datetime64[D]')
+
+
+def resample(days, bookings, revenue, start, end, resolution):
+    """Sum daily points into buckets and return the series as columns"""
+    buckets = all_buckets(start, end, resolution)
+    days = np.asarray(days, dtype='datetime64[D]')
+    index = np.searchsorted(buckets, bucket_starts(days, resolution))
+    return {
+        'resolution': resolution,
+        'periods': [str(bucket) for bucket in buckets],
+        'bookings': np.bincount(index, weights=np.asarray(bookings, dtype=float),
+                                minlength=len(buckets)).astype(int).tolist(),
+        'revenue': np.round(np.bincount(index, weights=np.asarray(revenue, dtype=float),
+                                        minlength=len(buckets)), 2).tolist(),
+    }
+
+
+def daily_points(rows):
+    rows = list(rows)
+    if not rows:
+        return [], [], []
+    return tuple(zip(*rows))
+
+
+def platform_series(start, end, resolution):
+    """Platform-wide series from the BookingAnalytics rollups"""
+    rows = BookingAnalytics.objects.filter(date__range=[start, end]).values_list(
+        'date', 'total_bookings', 'total_revenue'
+    )
+    return resample(*daily_points(rows), start, end, resolution)
+
+
+def booking_series(bookings, start, end, resolution):
+    """Series for a subset of bookings, grouped per day in the database and resampled in NumPy"""
+    rows = bookings.filter(
+        created_at__gte=day_start(start), created_at__lt=day_start(end + timedelta(days=1))
+    ).order_by().values(day=TruncDate('created_at')).annotate(
+        count=Count('id'),
+        revenue=Sum('total_price', filter=Q(status__in=REVENUE_STATUSES)),
+    ).values_list('day', 'count', 'revenue')
+    return resample(*daily_points((day, count, revenue or 0) for day, count, revenue in rows),
+                    start, end, resolution)
+
+
+def tour_series(tour_id, start, end, resolution):
+    return booking_series(Booking.objects.filter(tour_id=tour_id), start, end, resolution)
+
+
+def operator_series(operator_id, start, end, resolution):
+    return booking_series(Booking.objects.filter(tour__tour_operator_id=operator_id), start, end, resolution)
@@ -0,0 +1,95 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
+from bookings.models import Booking
+from .models import TourAnalytics, UserAnalytics
+
+# model -> (owner field, bookings field, money field)
+TOTALS = {
+    UserAnalytics: ('user_id', 'total_bookings', 'total_spent'),
+    TourAnalytics: ('tour_id', 'total_bookings', 'total_revenue'),
+}
+
+
+def booking_delta(old_status, new_status):
+    """Change in counted bookings; cancelled bookings are not counted"""
+    return int(new_status != 'cancelled') - int(old_status is not None and old_status != 'cancelled')
+
+
+def payment_delta(old_status, new_status, amount):
+    """Change in collected money; only completed payments count"""
+    # Unsaved-then-saved instances may still hold the float they were built with
+    return Decimal(str(amount)) * (int(new_status == 'completed') - int(old_status == 'completed'))
+
+
+def apply_deltas(model, deltas):
+    """Apply ``{owner_id: (bookings, money)}`` deltas with atomic F() updates.
+
+    Missing rows are created first, so concurrent writers only ever add to
+    the stored values and never overwrite each other.
+    """
+    owner_field, bookings_field, money_field = TOTALS[model]
+    deltas = {owner_id: delta for owner_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(**{owner_field: owner_id}) for owner_id in deltas], ignore_conflicts=True
+    )
+    for owner_id, (bookings, money) in deltas.items():
+        model.objects.filter(**{owner_field: owner_id}).update(**{
+            bookings_field: Greatest(F(bookings_field) + bookings, 0),
+            money_field: F(money_field) + money,
+        })
+
+
+def collect_deltas(transitions, owner_attr, delta):
+    totals = defaultdict(lambda: [0, Decimal('0')])
+    for transition in transitions:
+        bookings, money = delta(transition)
+        totals[getattr(transition, owner_attr)][0] += bookings
+        totals[getattr(transition, owner_attr)][1] += money
+    return {owner_id: tuple(values) for owner_id, values in totals.items()}
+
+
+def recompute(model):
+    """Recompute ``{owner_id: (bookings, money)}`` from bookings and payments in one grouped query"""
+    owner = {UserAnalytics: 'user_id', TourAnalytics: 'tour_id'}[model]
+    rows = Booking.objects.order_by().values(owner).annotate(
+        bookings=Count('id', filter=~Q(status='cancelled')),
+        money=Sum('payment__amount', filter=Q(payment__status='completed')),
+    )
+    return {row[owner]: (row['bookings'], row['money'] or Decimal('0')) for row in rows}
+
+
+def find_drift(model):
+    """Rows whose stored totals differ from the source: ``[(owner_id, stored, expected)]``"""
+    owner_field, bookings_field, money_field = TOTALS[model]
+    expected = recompute(model)
+    stored = {
+        row[0]: (row[1], row[2])
+        for row in model.objects.values_list(owner_field, bookings_field, money_field)
+    }
+    drift = []
+    for owner_id in expected.keys() | stored.keys():
+        want = expected.get(owner_id, (0, Decimal('0')))
+        have = stored.get(owner_id, (0, Decimal('0')))
+        if have != want:
+            drift.append((owner_id, have, want))
+    return sorted(drift)
+
+
+def fix_drift(model, drift):
+    """Overwrite drifted rows with the recomputed totals"""
+    owner_field, bookings_field, money_field = TOTALS[model]
+    model.objects.bulk_create(
+        [model(**{owner_field: owner_id}) for owner_id, _, _ in drift], ignore_conflicts=True
+    )
+    rows = {
+        getattr(row, owner_field): row
+        for row in model.objects.filter(**{f'{owner_field}__in': [owner_id for owner_id, _, _ in drift]})
+    }
+    for owner_id, _, (bookings, money) in drift:
+        setattr(rows[owner_id], bookings_field, bookings)
+        setattr(rows[owner_id], money_field, money)
+    model.objects.bulk_update(rows.values(), [bookings_field, money_field], batch_size=500)
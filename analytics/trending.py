@@ -0,0 +1,242 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from attractions.models import Attraction
+from bookings.models import Booking
+from tours.models import Tour
+from .heavy_hitters import SpaceSaving
+from .models import DailyEventAggregate, ProductEvent
+from .rollups import day_start
+
+DIMENSIONS = ('destinations', 'tours')
+WINDOWS = {'day': 1, 'week': 7}
+
+DEFAULT_TRENDING_OPTIONS = {
+    # Items tracked per region, dimension and day; memory is bounded by this
+    'CAPACITY': 100,
+    # Weight of one detail view and one booking in the ranking
+    'VIEW_WEIGHT': 1,
+    'BOOKING_WEIGHT': 10,
+    # Seconds between incremental refreshes
+    'REFRESH_INTERVAL': 30,
+    # Seconds of views and bookings re-read on each refresh, covering rows that commit late
+    'REFRESH_OVERLAP': 60,
+}
+
+
+def trending_options():
+    return {**DEFAULT_TRENDING_OPTIONS, **getattr(settings, 'TRENDING', {})}
+
+
+class Regions:
+    """Cached attraction -> region and tour -> attractions lookups, loaded as ids are first seen"""
+
+    def __init__(self):
+        self.attractions = {}
+        self.tours = {}
+
+    def load(self, attraction_ids=(), tour_ids=()):
+        tour_ids = set(tour_ids) - self.tours.keys()
+        if tour_ids:
+            for tour_id in tour_ids:
+                self.tours[tour_id] = []
+            for tour_id, attraction_id, region in Tour.attractions.through.objects.filter(
+                tour_id__in=tour_ids
+            ).values_list('tour_id', 'attraction_id', 'attraction__state_province'):
+                self.tours[tour_id].append(attraction_id)
+                self.attractions[attraction_id] = region
+        attraction_ids = set(attraction_ids) - self.attractions.keys()
+        if attraction_ids:
+            self.attractions.update(
+                Attraction.objects.filter(id__in=attraction_ids).values_list('id', 'state_province')
+            )
+
+    def of_tour(self, tour_id):
+        return {self.attractions[attraction_id] for attraction_id in self.tours.get(tour_id, ())}
+
+
+class TrendingTracker:
+    """Live top destinations and tours per region and day, from views and bookings.
+
+    Every (dimension, region, day) has its own Space-Saving summary; region
+    ``None`` covers all regions. A window query merges the summaries of its
+    days. Only the last week of days is kept, so memory stays bounded by
+    regions x 7 x CAPACITY per dimension.
+    """
+
+    def __init__(self):
+        self.options = trending_options()
+        self.summaries = {}
+        self.regions = Regions()
+        self.watermark = None
+        # {id: created_at} of rows already counted inside the overlap, so re-reads skip them
+        self.counted_events = {}
+        self.counted_bookings = {}
+
+    def offer(self, dimension, regions, day, item, weight):
+        for region in {None, *regions}:
+            key = (dimension, region, day)
+            summary = self.summaries.get(key)
+            if summary is None:
+                summary = self.summaries[key] = SpaceSaving(self.options['CAPACITY'])
+            summary.offer(item, weight)
+
+    def offer_views(self, rows):
+        """Feed ``(event_type, object_id, day, count)`` view rows"""
+        rows = list(rows)
+        self.regions.load(
+            attraction_ids={object_id for event_type, object_id, _, _ in rows
+                            if event_type == ProductEvent.ATTRACTION_VIEW},
+            tour_ids={object_id for event_type, object_id, _, _ in rows if event_type == ProductEvent.TOUR_VIEW},
+        )
+        weight = self.options['VIEW_WEIGHT']
+        for event_type, object_id, day, count in rows:
+            if event_type == ProductEvent.ATTRACTION_VIEW:
+                if object_id in self.regions.attractions:
+                    self.offer('destinations', [self.regions.attractions[object_id]], day, object_id, count * weight)
+            else:
+                self.offer('tours', self.regions.of_tour(object_id), day, object_id, count * weight)
+
+    def offer_bookings(self, rows):
+        """Feed ``(tour_id, day, count)`` booking rows; a booking counts for the tour and each attraction it visits"""
+        rows = list(rows)
+        self.regions.load(tour_ids={tour_id for tour_id, _, _ in rows})
+        weight = self.options['BOOKING_WEIGHT']
+        for tour_id, day, count in rows:
+            self.offer('tours', self.regions.of_tour(tour_id), day, tour_id, count * weight)
+            for attraction_id in self.regions.tours[tour_id]:
+                self.offer('destinations', [self.regions.attractions[attraction_id]], day, attraction_id,
+                           count * weight)
+
+    def refresh(self):
+        """Read views and bookings added since the last refresh; the first refresh loads the whole week.
+
+        Each refresh re-reads the rows created within REFRESH_OVERLAP seconds
+        of the previous one, so a row that committed after that refresh is
+        still counted; ids already counted are skipped. Region lookups are
+        reloaded so attractions moved to another region are picked up.
+        """
+        started = timezone.now()
+        today = timezone.localdate()
+        first_day = today - timedelta(days=max(WINDOWS.values()) - 1)
+        overlap = timedelta(seconds=self.options['REFRESH_OVERLAP'])
+        views = ProductEvent.objects.filter(
+            event_type__in=(ProductEvent.ATTRACTION_VIEW, ProductEvent.TOUR_VIEW),
+            created_at__gte=day_start(first_day),
+        )
+        bookings = Booking.objects.filter(created_at__gte=day_start(first_day))
+        self.regions = Regions()
+
+        if self.watermark is None:
+            # Days already compacted out of the raw log, then raw rows up to the overlap
+            since = started - overlap
+            self.offer_views(DailyEventAggregate.objects.filter(
+                event_type__in=(ProductEvent.ATTRACTION_VIEW, ProductEvent.TOUR_VIEW), date__gte=first_day,
+            ).values_list('event_type', 'object_id', 'date', 'count'))
+            self.offer_views(views.filter(created_at__lt=since).order_by().values_list(
+                'event_type', 'object_id', TruncDate('created_at')
+            ).annotate(count=Count('id')))
+            self.offer_bookings(bookings.filter(created_at__lt=since).order_by().values_list(
+                'tour_id', TruncDate('created_at')
+            ).annotate(count=Count('id')))
+        else:
+            since = self.watermark - overlap
+
+        self.offer_views(self.uncounted(
+            self.counted_events, views.filter(created_at__gte=since), 'event_type', 'object_id'
+        ))
+        self.offer_bookings(self.uncounted(self.counted_bookings, bookings.filter(created_at__gte=since), 'tour_id'))
+
+        self.watermark = started
+        for counted in (self.counted_events, self.counted_bookings):
+            for row_id in [row_id for row_id, created_at in counted.items() if created_at < started - overlap]:
+                del counted[row_id]
+        for key in [key for key in self.summaries if key[2] < first_day]:
+            del self.summaries[key]
+
+    @staticmethod
+    def uncounted(counted, rows, *fields):
+        """``(*fields, day, count)`` over ``rows`` whose ids are not in ``counted``, adding them to it"""
+        totals = Counter()
+        for row_id, created_at, day, *values in rows.values_list('id', 'created_at', TruncDate('created_at'), *fields):
+            if row_id not in counted:
+                counted[row_id] = created_at
+                totals[(*values, day)] += 1
+        return [(*key, count) for key, count in totals.items()]
+
+    def top_for_day(self, dimension, day, region=None, n=10):
+        summary = self.summaries.get((dimension, region, day))
+        return summary.top(n) if summary is not None else []
+
+    def top(self, dimension, region=None, window='day', n=10):
+        """The ``n`` highest scoring ids as ``(id, score, error)`` over the last ``window``"""
+        today = timezone.localdate()
+        merged = SpaceSaving(self.options['CAPACITY'])
+        for offset in range(WINDOWS[window]):
+            summary = self.summaries.get((dimension, region, today - timedelta(days=offset)))
+            if summary is not None:
+                merged = merged.merge(summary)
+        return merged.top(n)
+
+
+def view_rows(start, end):
+    """``(event_type, object_id, day, count)`` for detail views in ``start``..``end``, compacted or raw"""
+    event_types = (ProductEvent.ATTRACTION_VIEW, ProductEvent.TOUR_VIEW)
+    yield from DailyEventAggregate.objects.filter(
+        event_type__in=event_types, date__range=[start, end]
+    ).values_list('event_type', 'object_id', 'date', 'count')
+    yield from ProductEvent.objects.filter(
+        event_type__in=event_types,
+        created_at__gte=day_start(start), created_at__lt=day_start(end + timedelta(days=1)),
+    ).order_by().values_list('event_type', 'object_id', TruncDate('created_at')).annotate(count=Count('id'))
+
+
+def top_destinations_by_day(start, end, booking_rows, n):
+    """``{day: [attraction ids]}`` ranked the same way as the live tracker, for the daily rollup"""
+    tracker = TrendingTracker()
+    tracker.offer_bookings(booking_rows)
+    tracker.offer_views(view_rows(start, end))
+    return {
+        day: [item for item, _, _ in tracker.top_for_day('destinations', day, n=n)]
+        for _, _, day in tracker.summaries
+    }
+
+
+_tracker = None
+_refreshed_at = 0.0
+_lock = threading.Lock()
+
+
+def get_tracker():
+    """The process-wide tracker, refreshed incrementally at most every REFRESH_INTERVAL seconds"""
+    global _tracker, _refreshed_at
+    with _lock:
+        if _tracker is None:
+            _tracker = TrendingTracker()
+        if time.monotonic() - _refreshed_at >= _tracker.options['REFRESH_INTERVAL']:
+            _tracker.refresh()
+            _refreshed_at = time.monotonic()
+        return _tracker
+
+
+def reset_tracker():
+    """Drop the process-wide tracker so the next query rebuilds it"""
+    global _tracker, _refreshed_at
+    with _lock:
+        _tracker, _refreshed_at = None, 0.0
+
+
+def trending(dimension, region=None, window='day', limit=10):
+    """Live leaderboard as ``[{'id', 'score', 'error'}]``; scores are upper bounds within ``error``"""
+    tracker = get_tracker()
+    with _lock:
+        # Summaries are mutated by refreshes in other threads
+        return [
+            {'id': item, 'score': score, 'error': error}
+            for item, score, error in tracker.top(dimension, region, window, limit)
+        ]
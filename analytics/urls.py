@@ -5,5 +5,11 @@ urlpatterns = [
     path('user/', views.UserAnalyticsView.as_view(), name='user-analytics'),
     path('attraction/<int:attraction_id>/', views.AttractionAnalyticsView.as_view(), name='attraction-analytics'),
     path('tour/<int:tour_id>/', views.TourAnalyticsView.as_view(), name='tour-analytics'),
+    path('portfolio/tours/', views.TourPortfolioView.as_view(), name='analytics-portfolio-tours'),
+    path('portfolio/attractions/', views.AttractionPortfolioView.as_view(), name='analytics-portfolio-attractions'),
+    path('timeseries/', views.TimeSeriesView.as_view(), name='analytics-timeseries'),
+    path('revenue-cube/', views.RevenueCubeView.as_view(), name='analytics-revenue-cube'),
+    path('unique-visitors/', views.UniqueVisitorsView.as_view(), name='analytics-unique-visitors'),
+    path('trending/', views.TrendingView.as_view(), name='analytics-trending'),
     path('admin/dashboard/', views.AdminDashboardView.as_view(), name='admin-dashboard'),
 ]
\ No newline at end of file
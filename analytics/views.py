@@ -1,20 +1,30 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, filters
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
-from .models import UserAnalytics, AttractionAnalytics, TourAnalytics, BookingAnalytics, SystemAnalytics
+from accounts.models import TourOperator
+from attractions.models import Attraction
+from tours.models import Tour
+from .cube import DIMENSIONS, get_cube
+from .dashboard import get_dashboard
+from .models import (
+    UserAnalytics, AttractionAnalytics, TourAnalytics, VisitorSketch,
+)
 from .serializers import (
     UserAnalyticsSerializer, 
     AttractionAnalyticsSerializer, 
     TourAnalyticsSerializer, 
-    BookingAnalyticsSerializer, 
-    SystemAnalyticsSerializer
+    TourPortfolioSerializer,
+    TourPortfolioComparisonSerializer,
+    AttractionPortfolioSerializer,
+    AttractionPortfolioComparisonSerializer,
 )
-from accounts.models import User
-from attractions.models import Attraction
-from tours.models import Tour
-from bookings.models import Booking
+from .portfolio import attraction_portfolio, tour_portfolio
+from .sketches import unique_visitors
+from .trending import DIMENSIONS as TRENDING_DIMENSIONS, WINDOWS, trending
+from .timeseries import RESOLUTIONS, operator_series, platform_series, tour_series
 
 class UserAnalyticsView(generics.RetrieveAPIView):
     serializer_class = UserAnalyticsSerializer
@@ -56,43 +66,168 @@ class TourAnalyticsView(generics.RetrieveAPIView):
         analytics = generics.get_object_or_404(queryset, tour_id=tour_id)
         return analytics
 
+def date_range_params(request, default_days):
+    """``start_date``/``end_date`` query params, defaulting to the last ``default_days`` days"""
+    end_date = timezone.localdate()
+    dates = {'start_date': end_date - timedelta(days=default_days), 'end_date': end_date}
+    for param in dates:
+        if request.query_params.get(param):
+            try:
+                # None for a malformed value, ValueError for an impossible date
+                dates[param] = parse_date(request.query_params[param])
+            except ValueError:
+                dates[param] = None
+            if dates[param] is None:
+                raise ValidationError({param: 'Enter a valid date (YYYY-MM-DD).'})
+    if dates['start_date'] > dates['end_date']:
+        raise ValidationError({'start_date': 'Must not be after end_date.'})
+    return dates['start_date'], dates['end_date']
+
 class AdminDashboardView(generics.GenericAPIView):
     permission_classes = [permissions.IsAdminUser]
     
     def get(self, request, *args, **kwargs):
-        # Get date range (last 30 days by default)
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=30)
+        # Date range for recent activity (last 30 days by default)
+        start_date, end_date = date_range_params(request, 30)
+        
+        # Served from the latest rollup plus newer rows, cached with stale-while-revalidate
+        return Response(get_dashboard(start_date, end_date))
+
+class TimeSeriesView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        start_date, end_date = date_range_params(request, 365)
+        resolution = request.query_params.get('resolution', 'day')
+        if resolution not in RESOLUTIONS:
+            raise ValidationError({'resolution': f"Choose one of: {', '.join(RESOLUTIONS)}."})
         
-        # System analytics
-        total_users = User.objects.count()
-        total_attractions = Attraction.objects.count()
-        total_tours = Tour.objects.count()
-        total_bookings = Booking.objects.count()
-        total_revenue = Booking.objects.filter(status='confirmed').aggregate(
-            total=Sum('total_price')
-        )['total'] or 0
+        user = request.user
+        tour_id, operator_id = request.query_params.get('tour'), request.query_params.get('operator')
+        if tour_id:
+            # Operators can only chart their own tours
+            tour = generics.get_object_or_404(
+                Tour.objects.all() if user.is_staff else Tour.objects.filter(created_by=user), pk=tour_id
+            )
+            series = tour_series(tour.id, start_date, end_date, resolution)
+        elif operator_id:
+            operator = generics.get_object_or_404(
+                TourOperator.objects.all() if user.is_staff else TourOperator.objects.filter(user=user),
+                pk=operator_id
+            )
+            series = operator_series(operator.id, start_date, end_date, resolution)
+        elif user.is_staff:
+            series = platform_series(start_date, end_date, resolution)
+        else:
+            raise PermissionDenied('Only administrators can view platform-wide series.')
         
-        # Recent booking analytics
-        recent_bookings = BookingAnalytics.objects.filter(
-            date__range=[start_date, end_date]
-        ).aggregate(
-            total_bookings=Sum('total_bookings'),
-            total_revenue=Sum('total_revenue')
-        )
+        return Response(series)
+
+class RevenueCubeView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        group_by = [name for name in params.get('group_by', '').split(',') if name]
+        unknown = set(group_by) - set(DIMENSIONS)
+        if unknown:
+            raise ValidationError({'group_by': f"Unknown dimensions: {', '.join(sorted(unknown))}."})
         
-        data = {
-            'system': {
-                'total_users': total_users,
-                'total_attractions': total_attractions,
-                'total_tours': total_tours,
-                'total_bookings': total_bookings,
-                'total_revenue': total_revenue,
-            },
-            'recent': {
-                'total_bookings': recent_bookings['total_bookings'] or 0,
-                'total_revenue': recent_bookings['total_revenue'] or 0,
-            }
+        filters = {
+            name: params[name].split(',') for name in ('month', 'status', 'payment_method') if params.get(name)
         }
+        tour_ids = None
+        if params.get('tour'):
+            try:
+                tour_ids = {int(tour_id) for tour_id in params['tour'].split(',')}
+            except ValueError:
+                raise ValidationError({'tour': 'Enter comma-separated tour ids.'})
+        if not request.user.is_staff:
+            # Operators can only pivot their own tours
+            own_tours = set(Tour.objects.filter(created_by=request.user).values_list('id', flat=True))
+            tour_ids = own_tours if tour_ids is None else tour_ids & own_tours
+        if tour_ids is not None:
+            filters['tour'] = tour_ids
         
-        return Response(data)
+        return Response(get_cube().query(group_by, filters))
+
+class UniqueVisitorsView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        start_date, end_date = date_range_params(request, 30)
+        user = request.user
+        # Operators can only see visitors to what they created
+        if request.query_params.get('attraction'):
+            queryset = Attraction.objects.all() if user.is_staff else Attraction.objects.filter(created_by=user)
+            kind, obj = VisitorSketch.ATTRACTION, generics.get_object_or_404(
+                queryset, pk=request.query_params['attraction']
+            )
+        elif request.query_params.get('tour'):
+            queryset = Tour.objects.all() if user.is_staff else Tour.objects.filter(created_by=user)
+            kind, obj = VisitorSketch.TOUR, generics.get_object_or_404(queryset, pk=request.query_params['tour'])
+        else:
+            raise ValidationError({'attraction': 'Pass an attraction or tour id.'})
+        
+        return Response(unique_visitors(kind, obj.id, start_date, end_date))
+
+class TrendingView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        dimension, window = params.get('type', 'destinations'), params.get('window', 'day')
+        if dimension not in TRENDING_DIMENSIONS:
+            raise ValidationError({'type': f"Choose one of: {', '.join(TRENDING_DIMENSIONS)}."})
+        if window not in WINDOWS:
+            raise ValidationError({'window': f"Choose one of: {', '.join(WINDOWS)}."})
+        try:
+            limit = min(int(params.get('limit', 10)), 50)
+        except ValueError:
+            raise ValidationError({'limit': 'Enter a whole number.'})
+        
+        results = trending(dimension, params.get('region') or None, window, limit)
+        if dimension == 'destinations':
+            names = dict(Attraction.objects.filter(id__in=[row['id'] for row in results]).values_list('id', 'name'))
+        else:
+            names = dict(Tour.objects.filter(id__in=[row['id'] for row in results]).values_list('id', 'title'))
+        for row in results:
+            row['name'] = names.get(row['id'])
+        return Response({'type': dimension, 'region': params.get('region', ''), 'window': window, 'results': results})
+
+class PortfolioView(generics.ListAPIView):
+    """One sortable, paginated page of the requesting operator's tours or attractions with their analytics"""
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [filters.OrderingFilter]
+    common_ordering_fields = ['total_bookings', 'average_rating', 'total_reviews',
+                              'period_bookings', 'period_revenue', 'period_views']
+    comparison_ordering_fields = ['bookings_change', 'revenue_change', 'views_change']
+    ordering = ['-period_bookings', 'id']
+    
+    @property
+    def compare(self):
+        return self.request.query_params.get('compare') in ('1', 'true')
+    
+    @property
+    def ordering_fields(self):
+        fields = self.portfolio_ordering_fields + self.common_ordering_fields
+        return fields + self.comparison_ordering_fields if self.compare else fields
+    
+    def get_queryset(self):
+        start_date, end_date = date_range_params(self.request, 30)
+        return self.portfolio(self.request.user, start_date, end_date, self.compare)
+    
+    def get_serializer_class(self):
+        return self.comparison_serializer_class if self.compare else self.serializer_class
+
+class TourPortfolioView(PortfolioView):
+    serializer_class = TourPortfolioSerializer
+    comparison_serializer_class = TourPortfolioComparisonSerializer
+    portfolio_ordering_fields = ['title', 'total_revenue', 'completion_rate']
+    portfolio = staticmethod(tour_portfolio)
+
+class AttractionPortfolioView(PortfolioView):
+    serializer_class = AttractionPortfolioSerializer
+    comparison_serializer_class = AttractionPortfolioComparisonSerializer
+    portfolio_ordering_fields = ['name', 'total_views']
+    portfolio = staticmethod(attraction_portfolio)
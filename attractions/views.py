@@ -1,5 +1,7 @@
 from rest_framework import generics, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
+from analytics import events, sketches
+from analytics.models import ProductEvent, VisitorSketch
 from .models import AttractionCategory, Attraction, AttractionReview
 from .serializers import (
     AttractionCategorySerializer, 
@@ -24,11 +26,22 @@ class AttractionListView(generics.ListAPIView):
     search_fields = ['name', 'description', 'city', 'state_province', 'country']
     ordering_fields = ['name', 'created_at', 'average_rating']
     ordering = ['-created_at']
+    
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('search'):
+            events.record_request(request, ProductEvent.SEARCH)
+        return super().list(request, *args, **kwargs)
 
 class AttractionDetailView(generics.RetrieveAPIView):
     queryset = Attraction.objects.filter(is_active=True)
     serializer_class = AttractionSerializer
     permission_classes = [permissions.AllowAny]
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        events.record_request(request, ProductEvent.ATTRACTION_VIEW, response.data['id'])
+        sketches.observe_request(request, VisitorSketch.ATTRACTION, response.data['id'])
+        return response
 
 class AttractionCreateView(generics.CreateAPIView):
     queryset = Attraction.objects.all()
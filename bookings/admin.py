@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Booking, BookingParticipant, Payment
+from .models import Booking, BookingParticipant, Payment, WaitlistEntry
 
 class BookingParticipantInline(admin.TabularInline):
     model = BookingParticipant
@@ -22,3 +22,9 @@ class PaymentAdmin(admin.ModelAdmin):
     list_display = ('booking', 'amount', 'currency', 'payment_method', 'transaction_id', 'status', 'payment_date')
     list_filter = ('status', 'payment_method', 'currency', 'payment_date')
     search_fields = ('transaction_id', 'booking__id')
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('tour_availability', 'user', 'participants', 'status', 'hold_expires_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__email', 'tour_availability__tour__title')
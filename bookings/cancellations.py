@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from tours.models import TourAvailability
+from tours.pricing import invalidate_prices
+from .models import Booking, Payment
+from .signals import (
+    booking_status_changed,
+    booking_transitions,
+    payment_status_changed,
+    payment_transitions,
+)
+from .waitlist import close_waitlist
+
+
+def cancel_payments(bookings, now, reason):
+    """Settle the payments of ``bookings`` as they are cancelled; returns the number refunded.
+
+    Call before the bookings themselves are updated. Completed charges are
+    refunded and pending ones voided (marked failed) so the worker never
+    submits them. Processing charges are already at the gateway and are
+    left to the worker, which refunds them if they succeed; failed payments
+    are left alone.
+    """
+    refundable = Payment.objects.filter(booking__in=bookings, status='completed')
+    uncharged = Payment.objects.filter(booking__in=bookings, status='pending')
+    changed_payments = payment_transitions(refundable, 'refunded') + payment_transitions(uncharged, 'failed')
+    refunded = refundable.update(status='refunded', refund_date=now, updated_at=now)
+    uncharged.update(status='failed', updated_at=now)
+    payment_status_changed.send(sender=Payment, transitions=changed_payments, reason=reason)
+    return refunded
+
+
+def cancel_departure(availability):
+    """Cancel every open booking on a departure with set-based updates.
+
+    Bookings, their payments and the departure's spots are updated in one
+    transaction, and one transition signal per model lets the notification
+    fan-out reach every affected traveller in bulk. The departure is closed
+    for further bookings and its waitlist is closed with it.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Lock the departure so no booking can slip in while we cancel
+        availability = TourAvailability.objects.select_for_update().select_related('tour').get(pk=availability.pk)
+        open_bookings = Booking.objects.filter(
+            tour_availability=availability, status__in=['pending', 'confirmed']
+        )
+        spots_released = open_bookings.aggregate(total=Sum('participants'))['total'] or 0
+
+        refunded = cancel_payments(open_bookings, now, reason='departure_cancelled')
+        changed_bookings = booking_transitions(open_bookings, 'cancelled')
+        cancelled = open_bookings.update(status='cancelled', cancellation_date=now, updated_at=now)
+        # Promotion skips closed departures, so their waitlists are closed here
+        waitlist_cancelled, held = close_waitlist(availability, now)
+
+        TourAvailability.objects.filter(pk=availability.pk).update(
+            spots_available=F('spots_available') + spots_released + held,
+            is_available=False,
+            updated_at=now,
+        )
+
+        booking_status_changed.send(
+            sender=Booking, transitions=changed_bookings, reason='departure_cancelled'
+        )
+
+    invalidate_prices(availability.tour_id)
+
+    return {
+        'cancelled_bookings': cancelled,
+        'refunded_payments': refunded,
+        'spots_released': spots_released,
+        'waitlist_cancelled': waitlist_cancelled,
+    }
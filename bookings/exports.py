@@ -0,0 +1,86 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Booking, BookingParticipant
+
+BOOKING_FIELDS = [
+    'id', 'tour_id', 'tour__title', 'tour_availability__date', 'status', 'participants',
+    'total_price', 'currency', 'user__email', 'emergency_contact_name',
+    'emergency_contact_phone', 'special_requests',
+]
+PARTICIPANT_FIELDS = [
+    'booking_id', 'first_name', 'last_name', 'date_of_birth', 'passport_number', 'nationality',
+]
+CSV_HEADER = [
+    'booking_id', 'tour_id', 'tour_title', 'departure_date', 'status', 'participants',
+    'total_price', 'currency', 'booked_by', 'emergency_contact_name',
+    'emergency_contact_phone', 'special_requests', 'first_name', 'last_name',
+    'date_of_birth', 'passport_number', 'nationality',
+]
+CHUNK_SIZE = 2000
+
+
+def iter_manifest(bookings):
+    """Yield ``(booking, participants)`` pairs for a booking queryset.
+
+    Bookings and participants are streamed as two ``values()`` queries
+    ordered by booking id and merge-joined here, so memory use stays flat
+    no matter how many rows are exported.
+    """
+    bookings = bookings.order_by('id')
+    booking_rows = bookings.values(*BOOKING_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    participant_rows = BookingParticipant.objects.filter(
+        booking__in=bookings.values('id')
+    ).order_by('booking_id', 'id').values(*PARTICIPANT_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+
+    participant = next(participant_rows, None)
+    for booking in booking_rows:
+        participants = []
+        while participant is not None and participant['booking_id'] <= booking['id']:
+            if participant['booking_id'] == booking['id']:
+                participants.append(participant)
+            participant = next(participant_rows, None)
+        yield booking, participants
+
+
+class _Echo:
+    """File-like object whose write returns the value for csv.writer"""
+    def write(self, value):
+        return value
+
+
+def manifest_csv(bookings):
+    """Stream a manifest as CSV, one row per participant"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for booking, participants in iter_manifest(bookings):
+        booking_values = [booking[field] for field in BOOKING_FIELDS]
+        if not participants:
+            yield writer.writerow(booking_values + [''] * (len(PARTICIPANT_FIELDS) - 1))
+        for participant in participants:
+            yield writer.writerow(booking_values + [participant[field] for field in PARTICIPANT_FIELDS[1:]])
+
+
+def manifest_ndjson(bookings):
+    """Stream a manifest as newline-delimited JSON, one booking per line"""
+    for booking, participants in iter_manifest(bookings):
+        record = dict(zip(CSV_HEADER, (booking[field] for field in BOOKING_FIELDS)))
+        record['participants_details'] = [
+            {field: participant[field] for field in PARTICIPANT_FIELDS[1:]}
+            for participant in participants
+        ]
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (manifest_csv, 'text/csv'),
+    'ndjson': (manifest_ndjson, 'application/x-ndjson'),
+}
+
+
+def operator_bookings(user):
+    """Bookings an operator may export: those on tours they created"""
+    queryset = Booking.objects.all()
+    if user.is_staff:
+        return queryset
+    return queryset.filter(tour__created_by=user)
@@ -0,0 +1,54 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+@dataclass
+class GatewayResult:
+    """Outcome of submitting a single payment to a gateway"""
+    payment_id: int
+    succeeded: bool
+    reference: str = ''
+    error: str = ''
+    retry: bool = False
+
+
+class BasePaymentGateway:
+    """Interface every payment gateway adapter implements.
+
+    ``charge`` receives a plain dict (id, transaction_id, amount, currency,
+    payment_method) so adapters never touch the ORM from the event loop.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
+    async def charge(self, payment):
+        raise NotImplementedError
+
+
+class FakePaymentGateway(BasePaymentGateway):
+    """Local gateway for development and tests.
+
+    Options: ``latency`` (seconds per charge), ``failure_rate`` (0..1) and
+    ``decline_methods`` (payment methods that always fail).
+    """
+
+    async def charge(self, payment):
+        latency = self.options.get('latency', 0)
+        if latency:
+            await asyncio.sleep(latency)
+
+        declined = payment['payment_method'] in self.options.get('decline_methods', ())
+        if declined or random.random() < self.options.get('failure_rate', 0):
+            return GatewayResult(payment['id'], False, error='Payment declined')
+        return GatewayResult(payment['id'], True, reference=f"fake_{payment['transaction_id']}")
+
+
+def get_payment_gateway():
+    """Instantiate the gateway configured in ``settings.PAYMENT_GATEWAY``"""
+    config = getattr(settings, 'PAYMENT_GATEWAY', {})
+    backend = config.get('BACKEND', 'bookings.gateways.FakePaymentGateway')
+    return import_string(backend)(**config.get('OPTIONS', {}))
@@ -0,0 +1,57 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from bookings.gateways import get_payment_gateway
+from bookings.payments import MAX_PAYMENT_ATTEMPTS, process_pending_payments
+
+
+class Command(BaseCommand):
+    help = 'Submit pending payments to the configured payment gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Payments claimed per batch')
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Maximum gateway requests in flight')
+        parser.add_argument('--max-attempts', type=int, default=MAX_PAYMENT_ATTEMPTS,
+                            help='Gateway errors after which a payment is failed')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when the queue is empty or the gateway is failing')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        gateway = get_payment_gateway()
+        totals = {'completed': 0, 'failed': 0, 'refunded': 0, 'retried': 0}
+
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            result = process_pending_payments(
+                gateway,
+                batch_size=options['batch_size'],
+                concurrency=options['concurrency'],
+                max_attempts=options['max_attempts'],
+            )
+            processed = sum(result.values())
+
+            for key, value in result.items():
+                totals[key] += value
+            if processed:
+                self.stdout.write(
+                    f"Processed {processed} payments in {time.monotonic() - started:.2f}s "
+                    f"({result['completed']} completed, {result['failed']} failed, "
+                    f"{result['refunded']} refunded, {result['retried']} retried)"
+                )
+            # A batch that was only retried waits instead of hammering a failing gateway
+            if processed - result['retried']:
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['completed']} completed, {totals['failed']} failed, "
+            f"{totals['refunded']} refunded, {totals['retried']} retried"
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bookings.waitlist import promote_lapsed_holds
+
+
+class Command(BaseCommand):
+    help = 'Release lapsed waitlist holds and offer the seats to the next parties'
+
+    def handle(self, *args, **options):
+        offered = promote_lapsed_holds()
+        self.stdout.write(self.style.SUCCESS(f'Offered seats to {offered} waiting parties'))
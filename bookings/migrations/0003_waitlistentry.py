@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_payment_processing_status'),
+        ('tours', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('participants', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('booked', 'Booked'), ('expired', 'Expired'), ('cancelled', 'Cancelled')], default='waiting', max_length=20)),
+                ('hold_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tour_availability', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='tours.touravailability')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['tour_availability', 'status', 'created_at'], name='bookings_wa_tour_av_6dd7cc_idx'), models.Index(fields=['status', 'hold_expires_at'], name='bookings_wa_status_69acaa_idx')],
+            },
+        ),
+    ]
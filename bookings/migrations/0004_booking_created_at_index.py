@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_waitlistentry'),
+        ('tours', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at'], name='bookings_bo_created_1720a2_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_created_at_index'),
+        ('tours', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['updated_at'], name='bookings_bo_updated_e5c31b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at'], name='bookings_pa_updated_f747c6_idx'),
+        ),
+    ]
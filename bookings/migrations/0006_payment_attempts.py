@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -29,6 +29,14 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Date-range scans for analytics rollups
+            models.Index(fields=['created_at']),
+            # Incremental refresh of the revenue cube
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self):
         return f"Booking {self.id} - {self.user.email} - {self.tour.title}"
 
@@ -49,6 +57,7 @@ class Payment(models.Model):
     """Model for payment transactions"""
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
         ('refunded', 'Refunded'),
@@ -70,8 +79,46 @@ class Payment(models.Model):
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     payment_date = models.DateTimeField(null=True, blank=True)
     refund_date = models.DateTimeField(null=True, blank=True)
+    # Gateway errors so far; the worker fails the payment at its limit
+    attempts = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Incremental refresh of the revenue cube
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.booking.id}"
+
+class WaitlistEntry(models.Model):
+    """A party waiting for seats on a sold-out departure"""
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('booked', 'Booked'),
+        ('expired', 'Expired'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    tour_availability = models.ForeignKey(TourAvailability, on_delete=models.CASCADE, related_name='waitlist')
+    participants = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # FIFO scan of one departure's queue during promotion
+            models.Index(fields=['tour_availability', 'status', 'created_at']),
+            # Sweep of lapsed holds across departures
+            models.Index(fields=['status', 'hold_expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Waitlist {self.id} - {self.user.email} - {self.tour_availability}"
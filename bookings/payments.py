@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .gateways import GatewayResult
+from .models import Booking, Payment
+from .signals import (
+    booking_status_changed,
+    booking_transitions,
+    payment_status_changed,
+    payment_transitions,
+)
+
+logger = logging.getLogger(__name__)
+
+# Gateway errors after which a payment is failed instead of retried
+MAX_PAYMENT_ATTEMPTS = 5
+
+
+def claim_pending_payments(batch_size):
+    """Move up to ``batch_size`` pending payments to ``processing`` and return them.
+
+    On databases with row locks, concurrent workers skip each other's rows;
+    on SQLite run a single worker.
+    """
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('id')
+            .values('id', 'booking_id', 'transaction_id', 'amount', 'currency', 'payment_method')[:batch_size]
+        )
+        if payments:
+            Payment.objects.filter(id__in=[p['id'] for p in payments]).update(
+                status='processing', updated_at=timezone.now()
+            )
+    return payments
+
+
+async def submit_payments(gateway, payments, concurrency):
+    """Charge ``payments`` through ``gateway`` with at most ``concurrency`` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(payment):
+        async with semaphore:
+            try:
+                return await gateway.charge(payment)
+            except Exception:
+                # Gateway/transport errors are retried on the next batch;
+                # only explicit declines fail the payment.
+                logger.exception('Gateway error for payment %s', payment['id'])
+                return None
+
+    results = await asyncio.gather(*(submit(p) for p in payments))
+    return [
+        result if result is not None else GatewayResult(payment['id'], False, retry=True)
+        for payment, result in zip(payments, results)
+    ]
+
+
+def apply_gateway_results(results, max_attempts=MAX_PAYMENT_ATTEMPTS):
+    """Write a batch of gateway outcomes back with one UPDATE per target state.
+
+    Returns the rows each UPDATE changed. A charge that succeeds after its
+    booking was cancelled is refunded straight away, and one that is
+    declined or must be retried is voided, since nothing is owed any more.
+    A retried payment counts an attempt and is failed at ``max_attempts``.
+    """
+    completed = [r.payment_id for r in results if r.succeeded]
+    failed = [r.payment_id for r in results if not r.succeeded and not r.retry]
+    retry = [r.payment_id for r in results if r.retry]
+    now = timezone.now()
+
+    with transaction.atomic():
+        processing = Payment.objects.filter(status='processing')
+        open_payments = processing.exclude(booking__status='cancelled')
+        cancelled_payments = processing.filter(booking__status='cancelled')
+        settled = open_payments.filter(id__in=completed)
+        declined = open_payments.filter(id__in=failed)
+        late = cancelled_payments.filter(id__in=completed)
+        voided = cancelled_payments.filter(id__in=failed + retry)
+        exhausted = open_payments.filter(id__in=retry, attempts__gte=max_attempts - 1)
+        changed_payments = (
+            payment_transitions(settled, 'completed') + payment_transitions(declined, 'failed')
+            + payment_transitions(exhausted, 'failed')
+        )
+        changed_cancelled = payment_transitions(late, 'refunded') + payment_transitions(voided, 'failed')
+
+        completed_count = settled.update(status='completed', payment_date=now, updated_at=now)
+        failed_count = declined.update(status='failed', updated_at=now)
+        failed_count += exhausted.update(status='failed', attempts=F('attempts') + 1, updated_at=now)
+        refunded_count = late.update(status='refunded', payment_date=now, refund_date=now, updated_at=now)
+        failed_count += voided.update(status='failed', updated_at=now)
+        retried_count = open_payments.filter(id__in=retry).update(
+            status='pending', attempts=F('attempts') + 1, updated_at=now
+        )
+
+        confirmed = Booking.objects.filter(
+            payment__id__in=completed, payment__status='completed', status='pending'
+        )
+        changed_bookings = booking_transitions(confirmed, 'confirmed')
+        confirmed.update(status='confirmed', confirmation_date=now, updated_at=now)
+
+        payment_status_changed.send(sender=Payment, transitions=changed_payments)
+        payment_status_changed.send(sender=Payment, transitions=changed_cancelled, reason='booking_cancelled')
+        booking_status_changed.send(sender=Booking, transitions=changed_bookings)
+
+    return {'completed': completed_count, 'failed': failed_count, 'refunded': refunded_count,
+            'retried': retried_count}
+
+
+def process_pending_payments(gateway, batch_size=100, concurrency=10, max_attempts=MAX_PAYMENT_ATTEMPTS):
+    """Claim, submit and settle one batch of pending payments"""
+    payments = claim_pending_payments(batch_size)
+    if not payments:
+        return {'completed': 0, 'failed': 0, 'refunded': 0, 'retried': 0}
+    results = asyncio.run(submit_payments(gateway, payments, concurrency))
+    return apply_gateway_results(results, max_attempts)
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from datetime import datetime
-from django.utils import timezone
-from .models import Booking, BookingParticipant, Payment
+from django.db import transaction
+from tours.pricing import get_departure_price
+from .models import Booking, BookingParticipant, Payment, WaitlistEntry
+from .waitlist import active_hold, promote_waitlist
 
 class BookingParticipantSerializer(serializers.ModelSerializer):
     class Meta:
@@ -36,9 +38,14 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         tour_availability = data['tour_availability']
         participants = data['participants']
         
-        if tour_availability.spots_available < participants:
+        # Seats held for this user from the waitlist count as available to them
+        request = self.context.get('request')
+        self.waitlist_hold = active_hold(request.user, tour_availability) if request else None
+        held = self.waitlist_hold.participants if self.waitlist_hold else 0
+        
+        if tour_availability.spots_available + held < participants:
             raise serializers.ValidationError(
-                f"Not enough spots available. Only {tour_availability.spots_available} spots left."
+                f"Not enough spots available. Only {tour_availability.spots_available + held} spots left."
             )
         
         # Check if tour availability date matches tour dates
@@ -52,10 +59,12 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         
         return data
     
+    @transaction.atomic
     def create(self, validated_data):
         participants_data = validated_data.pop('participants_details')
         validated_data['user'] = self.context['request'].user
-        validated_data['total_price'] = validated_data['tour'].price * validated_data['participants']
+        unit_price = get_departure_price(validated_data['tour_availability'])
+        validated_data['total_price'] = unit_price * validated_data['participants']
         validated_data['currency'] = validated_data['tour'].currency
         
         booking = Booking.objects.create(**validated_data)
@@ -64,13 +73,53 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         for participant_data in participants_data:
             BookingParticipant.objects.create(booking=booking, **participant_data)
         
-        # Update tour availability
+        # Update tour availability, consuming the user's waitlist hold first
+        held = 0
+        if self.waitlist_hold:
+            held = self.waitlist_hold.participants
+            self.waitlist_hold.status = 'booked'
+            self.waitlist_hold.save()
         tour_availability = booking.tour_availability
-        tour_availability.spots_available -= booking.participants
+        tour_availability.spots_available -= booking.participants - held
         tour_availability.save()
         
+        # Held seats the party did not book go to the next waiting party
+        if held > booking.participants:
+            promote_waitlist(tour_availability.id)
+        
         return booking
 
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    tour_title = serializers.CharField(source='tour_availability.tour.title', read_only=True)
+    date = serializers.DateField(source='tour_availability.date', read_only=True)
+    
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'tour_availability', 'tour_title', 'date', 'participants',
+                  'status', 'hold_expires_at', 'created_at']
+        read_only_fields = ['id', 'status', 'hold_expires_at', 'created_at']
+    
+    def validate(self, data):
+        tour_availability = data['tour_availability']
+        user = self.context['request'].user
+        
+        if not tour_availability.is_available:
+            raise serializers.ValidationError("This departure is no longer available.")
+        
+        if tour_availability.spots_available >= data['participants']:
+            raise serializers.ValidationError("Spots are available for this departure. Please book directly.")
+        
+        if WaitlistEntry.objects.filter(
+            user=user, tour_availability=tour_availability, status__in=['waiting', 'offered']
+        ).exists():
+            raise serializers.ValidationError("You are already on the waitlist for this departure.")
+        
+        return data
+    
+    def create(self, validated_data):
+        validated_data['user'] = self.context['request'].user
+        return super().create(validated_data)
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
@@ -81,7 +130,10 @@ class PaymentSerializer(serializers.ModelSerializer):
 class PaymentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
-        fields = ['booking', 'payment_method']
+        fields = ['id', 'booking', 'payment_method', 'transaction_id', 'status']
+        read_only_fields = ['id', 'transaction_id', 'status']
+        # A declined payment is retried on the same row; see validate_booking
+        extra_kwargs = {'booking': {'validators': []}}
     
     def validate_booking(self, value):
         # Ensure the booking belongs to the requesting user
@@ -93,21 +145,27 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
         if value.status != 'pending':
             raise serializers.ValidationError("This booking cannot be paid for.")
         
+        # Only a declined payment may be retried
+        if Payment.objects.filter(booking=value).exclude(status='failed').exists():
+            raise serializers.ValidationError("This booking already has a payment in progress or completed.")
+        
         return value
     
     def create(self, validated_data):
         booking = validated_data['booking']
         validated_data['amount'] = booking.total_price
         validated_data['currency'] = booking.currency
-        validated_data['transaction_id'] = f"txn_{booking.id}_{int(datetime.now().timestamp())}"
-        validated_data['status'] = 'completed'  # In a real app, this would be pending until payment is processed
-        validated_data['payment_date'] = timezone.now()
-        
-        payment = Payment.objects.create(**validated_data)
-        
-        # Update booking status
-        booking.status = 'confirmed'
-        booking.confirmation_date = timezone.now()
-        booking.save()
+        validated_data['transaction_id'] = f"txn_{booking.id}_{int(datetime.now().timestamp() * 1000)}"
+        # Queued for the process_payments worker, which submits it to the
+        # gateway and confirms the booking once the charge succeeds
+        validated_data['status'] = 'pending'
+        validated_data['attempts'] = 0
         
-        return payment
\ No newline at end of file
+        failed = Payment.objects.filter(booking=booking, status='failed').first()
+        if failed is None:
+            return Payment.objects.create(**validated_data)
+        # Retry: reuse the declined row with a fresh transaction id
+        for field, value in validated_data.items():
+            setattr(failed, field, value)
+        failed.save()
+        return failed
@@ -1 +1,70 @@
-# Signals for bookings app
\ No newline at end of file
+# Signals for bookings app
+from collections import namedtuple
+from django.db.models.signals import post_init, post_save
+from django.dispatch import Signal, receiver
+from .models import Booking, Payment
+
+BookingTransition = namedtuple('BookingTransition', [
+    'booking_id', 'user_id', 'tour_id', 'tour_availability_id', 'participants',
+    'total_price', 'old_status', 'new_status',
+])
+PaymentTransition = namedtuple('PaymentTransition', [
+    'payment_id', 'booking_id', 'user_id', 'tour_id', 'amount', 'currency',
+    'old_status', 'new_status',
+])
+
+# Sent with ``transitions`` (a list of the tuples above) and an optional
+# ``reason`` whenever bookings or payments change status, both for single
+# saves and for set-based updates that bypass post_save. Senders fire them
+# inside the transaction; receivers defer side effects with on_commit.
+booking_status_changed = Signal()
+payment_status_changed = Signal()
+
+
+def booking_transitions(queryset, new_status):
+    """Describe the change a bulk UPDATE is about to make; call before updating"""
+    return [
+        BookingTransition(*row, new_status)
+        for row in queryset.values_list(
+            'id', 'user_id', 'tour_id', 'tour_availability_id', 'participants', 'total_price', 'status'
+        )
+    ]
+
+
+def payment_transitions(queryset, new_status):
+    """Describe the change a bulk UPDATE is about to make; call before updating"""
+    return [
+        PaymentTransition(*row, new_status)
+        for row in queryset.values_list(
+            'id', 'booking_id', 'booking__user_id', 'booking__tour_id', 'amount', 'currency', 'status'
+        )
+    ]
+
+
+@receiver(post_init, sender=Booking)
+@receiver(post_init, sender=Payment)
+def remember_status(sender, instance, **kwargs):
+    instance._original_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    old_status = None if created else instance._original_status
+    if created or old_status != instance.status:
+        booking_status_changed.send(sender=Booking, transitions=[BookingTransition(
+            instance.id, instance.user_id, instance.tour_id, instance.tour_availability_id,
+            instance.participants, instance.total_price, old_status, instance.status,
+        )])
+    instance._original_status = instance.status
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, **kwargs):
+    old_status = None if created else instance._original_status
+    if created or old_status != instance.status:
+        booking = instance.booking
+        payment_status_changed.send(sender=Payment, transitions=[PaymentTransition(
+            instance.id, booking.id, booking.user_id, booking.tour_id, instance.amount,
+            instance.currency, old_status, instance.status,
+        )])
+    instance._original_status = instance.status
@@ -1,15 +1,30 @@
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
+import json
 from datetime import date, timedelta
+from io import StringIO
 from accounts.models import TourOperator
+from notifications.models import Notification
 from tours.models import Tour, TourAvailability
-from .models import Booking
+from .gateways import BasePaymentGateway, FakePaymentGateway, GatewayResult
+from .models import Booking, BookingParticipant, Payment, WaitlistEntry
+from .payments import apply_gateway_results, process_pending_payments
 
 User = get_user_model()
 
+
+class UnavailableGateway(BasePaymentGateway):
+    """Gateway that is down: every charge raises"""
+
+    async def charge(self, payment):
+        raise ConnectionError('Gateway unavailable')
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
 class BookingAPITestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -103,3 +118,278 @@ class BookingAPITestCase(TestCase):
         response = self.client.post('/api/bookings/create/', new_booking_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Booking.objects.count(), 2)
+
+    def test_payment_creation_is_queued(self):
+        """Test payment requests are queued instead of charged inline"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/bookings/payment/create/', {
+            'booking': self.booking.id,
+            'payment_method': 'credit_card'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'pending')
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'pending')
+
+    def test_payment_worker_settles_batch(self):
+        """Test the payment worker confirms paid bookings and fails declined ones"""
+        declined_booking = Booking.objects.create(
+            user=self.user,
+            tour=self.tour,
+            tour_availability=self.tour_availability,
+            participants=1,
+            total_price=100.00,
+            emergency_contact_name='Emergency Contact',
+            emergency_contact_phone='+1234567890'
+        )
+        Payment.objects.create(booking=self.booking, amount=200.00, payment_method='credit_card',
+                               transaction_id='txn_paid')
+        Payment.objects.create(booking=declined_booking, amount=100.00, payment_method='paypal',
+                               transaction_id='txn_declined')
+
+        gateway = FakePaymentGateway(decline_methods=['paypal'])
+        result = process_pending_payments(gateway, batch_size=10, concurrency=2)
+        self.assertEqual(result, {'completed': 1, 'failed': 1, 'refunded': 0, 'retried': 0})
+
+        self.booking.refresh_from_db()
+        declined_booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+        self.assertEqual(self.booking.payment.status, 'completed')
+        self.assertEqual(declined_booking.status, 'pending')
+        self.assertEqual(declined_booking.payment.status, 'failed')
+
+    @override_settings(PAYMENT_GATEWAY={'BACKEND': 'bookings.tests.UnavailableGateway'})
+    def test_payment_worker_gateway_outage(self):
+        """Test gateway errors are retried up to the attempt limit and do not spin the worker"""
+        payment = Payment.objects.create(booking=self.booking, amount=200.00, payment_method='credit_card',
+                                         transaction_id='txn_outage')
+
+        out = StringIO()
+        with self.assertLogs('bookings.payments', 'ERROR'):
+            call_command('process_payments', once=True, max_attempts=2, stdout=out)
+        self.assertIn('Done: 0 completed, 0 failed, 0 refunded, 1 retried', out.getvalue())
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.attempts), ('pending', 1))
+
+        with self.assertLogs('bookings.payments', 'ERROR'):
+            result = process_pending_payments(UnavailableGateway(), max_attempts=2)
+        self.assertEqual(result, {'completed': 0, 'failed': 1, 'refunded': 0, 'retried': 0})
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.attempts), ('failed', 2))
+
+    def test_payment_retry_after_decline(self):
+        """Test a declined payment can be retried while an active one cannot"""
+        self.client.force_authenticate(user=self.user)
+        payload = {'booking': self.booking.id, 'payment_method': 'paypal'}
+        self.assertEqual(self.client.post('/api/bookings/payment/create/', payload, format='json').status_code,
+                         status.HTTP_201_CREATED)
+        response = self.client.post('/api/bookings/payment/create/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        result = process_pending_payments(FakePaymentGateway(decline_methods=['paypal']), batch_size=10)
+        self.assertEqual(result, {'completed': 0, 'failed': 1, 'refunded': 0, 'retried': 0})
+        declined_transaction = Payment.objects.get(booking=self.booking).transaction_id
+
+        payload['payment_method'] = 'credit_card'
+        response = self.client.post('/api/bookings/payment/create/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        payment = Payment.objects.get(booking=self.booking)
+        self.assertEqual((payment.status, payment.payment_method), ('pending', 'credit_card'))
+        self.assertNotEqual(payment.transaction_id, declined_transaction)
+
+        result = process_pending_payments(FakePaymentGateway(decline_methods=['paypal']), batch_size=10)
+        self.assertEqual(result, {'completed': 1, 'failed': 0, 'refunded': 0, 'retried': 0})
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+
+    def test_booking_cancellation_settles_payment(self):
+        """Test cancelling a booking refunds only a charged payment and voids a pending one"""
+        payment = Payment.objects.create(booking=self.booking, amount=200.00, payment_method='credit_card',
+                                         transaction_id='txn_pending')
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/bookings/{self.booking.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+        self.assertFalse(Notification.objects.filter(title='Refund issued').exists())
+        self.assertFalse(Notification.objects.filter(notification_type='payment_failure').exists())
+
+        paid_booking = Booking.objects.create(
+            user=self.user,
+            tour=self.tour,
+            tour_availability=self.tour_availability,
+            participants=1,
+            total_price=100.00,
+            status='confirmed',
+            emergency_contact_name='Emergency Contact',
+            emergency_contact_phone='+1234567890'
+        )
+        paid = Payment.objects.create(booking=paid_booking, amount=100.00, payment_method='credit_card',
+                                      transaction_id='txn_paid', status='completed')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/bookings/{paid_booking.id}/cancel/')
+        paid.refresh_from_db()
+        self.assertEqual(paid.status, 'refunded')
+        self.assertEqual(Notification.objects.filter(title='Refund issued').count(), 1)
+
+    def test_departure_cancellation(self):
+        """Test an operator cancelling every booking on a departure"""
+        other_booking = Booking.objects.create(
+            user=self.tour_operator_user,
+            tour=self.tour,
+            tour_availability=self.tour_availability,
+            participants=1,
+            total_price=100.00,
+            status='confirmed',
+            emergency_contact_name='Emergency Contact',
+            emergency_contact_phone='+1234567890'
+        )
+        Payment.objects.create(booking=other_booking, amount=100.00, payment_method='credit_card',
+                               transaction_id='txn_other', status='completed')
+        # Not charged yet, so nothing to refund
+        Payment.objects.create(booking=self.booking, amount=200.00, payment_method='credit_card',
+                               transaction_id='txn_pending')
+        # Already at the gateway: left for the worker, which refunds it once the charge succeeds
+        in_flight_booking = Booking.objects.create(
+            user=self.user,
+            tour=self.tour,
+            tour_availability=self.tour_availability,
+            participants=1,
+            total_price=100.00,
+            emergency_contact_name='Emergency Contact',
+            emergency_contact_phone='+1234567890'
+        )
+        in_flight = Payment.objects.create(booking=in_flight_booking, amount=100.00, payment_method='credit_card',
+                                           transaction_id='txn_in_flight', status='processing')
+        # Open waitlist entries, one holding a seat taken out of spots_available
+        waiting_user = User.objects.create_user(username='waiting', email='waiting@example.com',
+                                                password='testpassword123')
+        WaitlistEntry.objects.create(user=waiting_user, tour_availability=self.tour_availability, participants=2)
+        WaitlistEntry.objects.create(user=self.user, tour_availability=self.tour_availability, participants=1,
+                                     status='offered', hold_expires_at=timezone.now() + timedelta(minutes=30))
+        TourAvailability.objects.filter(pk=self.tour_availability.pk).update(spots_available=4)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f'/api/bookings/departures/{self.tour_availability.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.tour_operator_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/bookings/departures/{self.tour_availability.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cancelled_bookings'], 3)
+        self.assertEqual(response.data['refunded_payments'], 1)
+        self.assertEqual(response.data['spots_released'], 4)
+        self.assertEqual(response.data['waitlist_cancelled'], 2)
+
+        self.tour_availability.refresh_from_db()
+        self.assertEqual(self.tour_availability.spots_available, 9)
+        self.assertFalse(self.tour_availability.is_available)
+        self.assertFalse(Booking.objects.exclude(status='cancelled').exists())
+        self.assertEqual(Payment.objects.get(booking=other_booking).status, 'refunded')
+        self.assertEqual(Payment.objects.get(booking=self.booking).status, 'failed')
+        self.assertEqual(Payment.objects.get(pk=in_flight.pk).status, 'processing')
+        self.assertFalse(WaitlistEntry.objects.exclude(status='cancelled').exists())
+        self.assertEqual(Notification.objects.filter(notification_type='tour_update',
+                                                     title='Departure cancelled').count(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='booking_cancellation').count(), 3)
+        self.assertEqual(Notification.objects.filter(title='Refund issued').count(), 1)
+        self.assertFalse(Notification.objects.filter(notification_type='payment_failure').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = apply_gateway_results([GatewayResult(in_flight.id, True)])
+        self.assertEqual(result, {'completed': 0, 'failed': 0, 'refunded': 1, 'retried': 0})
+        in_flight.refresh_from_db()
+        self.assertEqual(in_flight.status, 'refunded')
+        self.assertIsNotNone(in_flight.refund_date)
+        self.assertEqual(Notification.objects.filter(title='Refund issued').count(), 2)
+
+    def test_waitlist_promotion_on_cancellation(self):
+        """Test freed seats are held for waiting parties in FIFO order"""
+        waiting_user = User.objects.create_user(
+            username='waiting',
+            email='waiting@example.com',
+            password='testpassword123'
+        )
+        self.tour_availability.spots_available = 0
+        self.tour_availability.save()
+
+        self.client.force_authenticate(user=waiting_user)
+        response = self.client.post('/api/bookings/waitlist/join/', {
+            'tour_availability': self.tour_availability.id,
+            'participants': 3
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        large_party = WaitlistEntry.objects.get(pk=response.data['id'])
+        small_party = WaitlistEntry.objects.create(
+            user=self.tour_operator_user, tour_availability=self.tour_availability, participants=2
+        )
+
+        # Cancelling the two-seat booking skips the party of three and holds seats for the pair
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/bookings/{self.booking.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        large_party.refresh_from_db()
+        small_party.refresh_from_db()
+        self.tour_availability.refresh_from_db()
+        self.assertEqual(large_party.status, 'waiting')
+        self.assertEqual(small_party.status, 'offered')
+        self.assertEqual(self.tour_availability.spots_available, 0)
+        self.assertTrue(Notification.objects.filter(recipient=self.tour_operator_user,
+                                                    notification_type='tour_update').exists())
+
+        # The promoted party can book against its hold; the seat it leaves goes to the next party
+        single_party = WaitlistEntry.objects.create(
+            user=User.objects.create_user(username='single', email='single@example.com', password='testpassword123'),
+            tour_availability=self.tour_availability, participants=1
+        )
+        self.client.force_authenticate(user=self.tour_operator_user)
+        response = self.client.post('/api/bookings/create/', {
+            'tour': self.tour.id,
+            'tour_availability': self.tour_availability.id,
+            'participants': 1,
+            'emergency_contact_name': 'Contact',
+            'emergency_contact_phone': '+1987654321',
+            'participants_details': []
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        small_party.refresh_from_db()
+        single_party.refresh_from_db()
+        self.tour_availability.refresh_from_db()
+        self.assertEqual(small_party.status, 'booked')
+        self.assertEqual(single_party.status, 'offered')
+        self.assertEqual(self.tour_availability.spots_available, 0)
+
+    def test_manifest_export(self):
+        """Test streaming departure manifests as CSV and NDJSON"""
+        for first_name in ('Ada', 'Grace'):
+            BookingParticipant.objects.create(
+                booking=self.booking,
+                first_name=first_name,
+                last_name='Traveller',
+                date_of_birth='1990-01-01',
+                nationality='Test Country'
+            )
+        self.client.force_authenticate(user=self.tour_operator_user)
+
+        response = self.client.get(f'/api/bookings/departures/{self.tour_availability.id}/manifest/csv/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Grace', lines[2])
+
+        response = self.client.get(f'/api/bookings/manifest/ndjson/?tour={self.tour.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(len(records[0]['participants_details']), 2)
+
+        for params in ({'tour': 'abc'}, {'start_date': '2024-02-30'}):
+            response = self.client.get('/api/bookings/manifest/csv/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/bookings/manifest/ndjson/')
+        self.assertEqual(b''.join(response.streaming_content), b'')
@@ -6,5 +6,11 @@ urlpatterns = [
     path('<int:pk>/', views.BookingDetailView.as_view(), name='booking-detail'),
     path('create/', views.BookingCreateView.as_view(), name='booking-create'),
     path('<int:pk>/cancel/', views.BookingCancelView.as_view(), name='booking-cancel'),
+    path('departures/<int:availability_id>/cancel/', views.DepartureCancelView.as_view(), name='departure-cancel'),
+    path('departures/<int:availability_id>/manifest/<str:file_format>/', views.ManifestExportView.as_view(), name='departure-manifest'),
+    path('manifest/<str:file_format>/', views.ManifestExportView.as_view(), name='manifest-export'),
+    path('waitlist/', views.WaitlistListView.as_view(), name='waitlist-list'),
+    path('waitlist/join/', views.WaitlistJoinView.as_view(), name='waitlist-join'),
+    path('waitlist/<int:pk>/leave/', views.WaitlistLeaveView.as_view(), name='waitlist-leave'),
     path('payment/create/', views.PaymentCreateView.as_view(), name='payment-create'),
 ]
\ No newline at end of file
@@ -1,13 +1,24 @@
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import Booking, Payment
+from tours.models import TourAvailability
+from tours.pricing import invalidate_prices
+from .cancellations import cancel_departure, cancel_payments
+from .exports import EXPORT_FORMATS, operator_bookings
+from .models import Booking, Payment, WaitlistEntry
 from .serializers import (
     BookingSerializer,
     BookingCreateSerializer,
     PaymentSerializer,
-    PaymentCreateSerializer
+    PaymentCreateSerializer,
+    WaitlistEntrySerializer
 )
+from .waitlist import promote_waitlist
 
 class BookingListView(generics.ListAPIView):
     serializer_class = BookingSerializer
@@ -35,6 +46,7 @@ class BookingCancelView(generics.UpdateAPIView):
     def get_queryset(self):
         return Booking.objects.filter(user=self.request.user)
     
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         booking = self.get_object()
         
@@ -44,28 +56,114 @@ class BookingCancelView(generics.UpdateAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Refund a completed payment and void a pending one; a charge still
+        # at the gateway is refunded by the payment worker once it settles
+        now = timezone.now()
+        cancel_payments(Booking.objects.filter(pk=booking.pk), now, reason='booking_cancelled')
+
         # Update booking status
         booking.status = 'cancelled'
-        booking.cancellation_date = timezone.now()
+        booking.cancellation_date = now
         booking.save()
         
-        # Refund payment if it exists
-        try:
-            payment = booking.payment
-            payment.status = 'refunded'
-            payment.refund_date = timezone.now()
-            payment.save()
-        except Payment.DoesNotExist:
-            pass
-        
         # Update tour availability
         tour_availability = booking.tour_availability
         tour_availability.spots_available += booking.participants
         tour_availability.save()
         
+        # Offer the freed seats to the departure's waitlist
+        promote_waitlist(tour_availability.id)
+        
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
 
+class DepartureCancelView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        # Operators can only cancel departures of their own tours
+        queryset = TourAvailability.objects.all()
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(tour__created_by=self.request.user)
+    
+    def post(self, request, *args, **kwargs):
+        availability = generics.get_object_or_404(self.get_queryset(), pk=self.kwargs['availability_id'])
+        return Response(cancel_departure(availability))
+
+class ManifestExportView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        # Operators can only export bookings on their own tours
+        queryset = operator_bookings(self.request.user).exclude(status='cancelled')
+        
+        if 'availability_id' in self.kwargs:
+            return queryset.filter(tour_availability_id=self.kwargs['availability_id'])
+        
+        # Season exports: optional tour and departure date range
+        params = self.request.query_params
+        if params.get('tour'):
+            try:
+                queryset = queryset.filter(tour_id=int(params['tour']))
+            except ValueError:
+                raise ValidationError({'tour': 'Enter a valid tour id.'})
+        for param, lookup in (('start_date', 'gte'), ('end_date', 'lte')):
+            if params.get(param):
+                try:
+                    # None for a malformed value, ValueError for an impossible date
+                    value = parse_date(params[param])
+                except ValueError:
+                    value = None
+                if value is None:
+                    raise ValidationError({param: 'Enter a valid date (YYYY-MM-DD).'})
+                queryset = queryset.filter(**{f'tour_availability__date__{lookup}': value})
+        return queryset
+    
+    def get(self, request, *args, **kwargs):
+        if self.kwargs['file_format'] not in EXPORT_FORMATS:
+            raise Http404
+        stream, content_type = EXPORT_FORMATS[self.kwargs['file_format']]
+        
+        response = StreamingHttpResponse(stream(self.get_queryset()), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="manifest.{self.kwargs["file_format"]}"'
+        return response
+
+class WaitlistListView(generics.ListAPIView):
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return WaitlistEntry.objects.filter(user=self.request.user).select_related('tour_availability__tour')
+
+class WaitlistJoinView(generics.CreateAPIView):
+    queryset = WaitlistEntry.objects.all()
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+class WaitlistLeaveView(generics.UpdateAPIView):
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return WaitlistEntry.objects.filter(user=self.request.user, status__in=['waiting', 'offered'])
+    
+    def update(self, request, *args, **kwargs):
+        entry = self.get_object()
+        was_offered = entry.status == 'offered'
+        entry.status = 'cancelled'
+        entry.save()
+        
+        # Return held seats to the departure and pass them down the queue
+        if was_offered:
+            TourAvailability.objects.filter(pk=entry.tour_availability_id).update(
+                spots_available=F('spots_available') + entry.participants
+            )
+            invalidate_prices(entry.tour_availability.tour_id)
+            promote_waitlist(entry.tour_availability_id)
+        
+        return Response(self.get_serializer(entry).data)
+
 class PaymentCreateView(generics.CreateAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentCreateSerializer
@@ -0,0 +1,124 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from notifications.fanout import notify
+from tours.models import TourAvailability
+from tours.pricing import invalidate_prices
+from .models import WaitlistEntry
+
+
+def hold_duration():
+    return timedelta(minutes=getattr(settings, 'WAITLIST_HOLD_MINUTES', 30))
+
+
+def active_hold(user, tour_availability):
+    """Return the user's unexpired seat hold on a departure, if any"""
+    return WaitlistEntry.objects.filter(
+        user=user,
+        tour_availability=tour_availability,
+        status='offered',
+        hold_expires_at__gt=timezone.now(),
+    ).first()
+
+
+def promote_waitlist(availability_id):
+    """Offer a departure's free seats to its waiting parties in one pass.
+
+    Lapsed holds are released first, then waiting parties are matched in
+    FIFO order, skipping any party too large for what is left. Matched
+    parties get a seat hold (their seats are taken out of
+    ``spots_available``) and a notification once the transaction commits.
+    Only this departure's queue is read, via the (tour_availability,
+    status, created_at) index.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        availability = TourAvailability.objects.select_for_update().select_related('tour').get(
+            pk=availability_id
+        )
+        if not availability.is_available:
+            return []
+
+        lapsed = WaitlistEntry.objects.filter(
+            tour_availability=availability, status='offered', hold_expires_at__lte=now
+        )
+        released = lapsed.aggregate(total=Sum('participants'))['total'] or 0
+        if released:
+            lapsed.update(status='expired', updated_at=now)
+
+        capacity = availability.spots_available + released
+        offered = []
+        if capacity:
+            waiting = WaitlistEntry.objects.filter(
+                tour_availability=availability, status='waiting', participants__lte=capacity
+            ).order_by('created_at', 'id').values_list('id', 'user_id', 'participants')
+            for entry_id, user_id, participants in waiting.iterator():
+                if participants <= capacity:
+                    offered.append((entry_id, user_id, participants))
+                    capacity -= participants
+                    if not capacity:
+                        break
+
+        held = sum(participants for _, _, participants in offered)
+        if released or held:
+            TourAvailability.objects.filter(pk=availability.pk).update(
+                spots_available=F('spots_available') + released - held, updated_at=now
+            )
+            invalidate_prices(availability.tour_id)
+        if not offered:
+            return []
+
+        expires_at = now + hold_duration()
+        WaitlistEntry.objects.filter(id__in=[entry_id for entry_id, _, _ in offered]).update(
+            status='offered', hold_expires_at=expires_at, updated_at=now
+        )
+        notify(
+            {
+                'recipient_id': user_id,
+                'notification_type': 'tour_update',
+                'title': 'Seats available',
+                'message': (
+                    f"{participants} seat(s) on {availability.tour.title} on {availability.date} "
+                    f"are being held for you until {expires_at:%Y-%m-%d %H:%M} UTC. Book now to keep them."
+                ),
+            }
+            for _, user_id, participants in offered
+        )
+
+    return [entry_id for entry_id, _, _ in offered]
+
+
+def close_waitlist(availability, now):
+    """Cancel a cancelled departure's open waitlist entries and tell their users.
+
+    Call inside the departure's transaction. Returns the number of entries
+    and the seats their holds gave back.
+    """
+    entries = WaitlistEntry.objects.filter(tour_availability=availability, status__in=['waiting', 'offered'])
+    held = entries.filter(status='offered').aggregate(total=Sum('participants'))['total'] or 0
+    user_ids = list(entries.values_list('user_id', flat=True))
+    cancelled = entries.update(status='cancelled', updated_at=now)
+    notify(
+        {
+            'recipient_id': user_id,
+            'notification_type': 'tour_update',
+            'title': 'Departure cancelled',
+            'message': (
+                f"{availability.tour.title} on {availability.date} has been cancelled by the tour operator, "
+                f"so your waitlist place has been closed."
+            ),
+        }
+        for user_id in user_ids
+    )
+    return cancelled, held
+
+
+def promote_lapsed_holds():
+    """Re-run promotion on every departure with a lapsed hold"""
+    availability_ids = WaitlistEntry.objects.filter(
+        status='offered', hold_expires_at__lte=timezone.now()
+    ).order_by().values_list('tour_availability_id', flat=True).distinct()
+    return sum(len(promote_waitlist(availability_id)) for availability_id in list(availability_ids))
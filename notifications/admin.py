@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, NotificationPreference
+from .models import Broadcast, Notification, NotificationPreference
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -11,3 +11,9 @@ class NotificationAdmin(admin.ModelAdmin):
 class NotificationPreferenceAdmin(admin.ModelAdmin):
     list_display = ('user', 'email_notifications', 'sms_notifications', 'push_notifications')
     search_fields = ('user__email',)
+
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ('title', 'notification_type', 'status', 'recipients_count', 'created_at', 'completed_at')
+    list_filter = ('notification_type', 'status')
+    readonly_fields = ('status', 'last_user_id', 'recipients_count', 'completed_at')
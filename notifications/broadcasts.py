@@ -0,0 +1,68 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from accounts.models import User
+from .counters import adjust_unread_counts
+from .fanout import PREFERENCE_FIELDS, load_preferences, push
+from .models import Broadcast, Notification
+
+
+def broadcast_chunk(broadcast, user_ids):
+    """Write one chunk of a broadcast and advance its cursor in the same transaction"""
+    preferences = load_preferences(user_ids, {'promotions', 'push_notifications'})
+    preference_field = PREFERENCE_FIELDS.get(broadcast.notification_type)
+    recipients = [
+        user_id for user_id in user_ids
+        if preferences.get(user_id, {}).get(preference_field, True)
+    ]
+
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                recipient_id=user_id,
+                notification_type=broadcast.notification_type,
+                title=broadcast.title,
+                message=broadcast.message,
+            )
+            for user_id in recipients
+        ], batch_size=500)
+        Broadcast.objects.filter(pk=broadcast.pk).update(
+            last_user_id=user_ids[-1],
+            recipients_count=F('recipients_count') + len(notifications),
+        )
+
+    counts = adjust_unread_counts(Counter(recipients))
+    push(
+        [n for n in notifications if preferences.get(n.recipient_id, {}).get('push_notifications', True)],
+        counts,
+    )
+    return len(notifications)
+
+
+def run_broadcast(broadcast, chunk_size=1000, progress=None):
+    """Send ``broadcast`` to every active user, resuming after ``last_user_id``.
+
+    Users are read as id-only keyset chunks. Each chunk is one bulk insert
+    committed together with the cursor, so rerunning an interrupted broadcast
+    neither skips nor repeats anyone. ``progress`` is called with
+    ``(users_done, users_total)`` after each chunk.
+    """
+    users = User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)
+    total = users.count()
+    done = users.filter(id__lte=broadcast.last_user_id).count()
+
+    Broadcast.objects.filter(pk=broadcast.pk).update(status='running')
+    while True:
+        user_ids = list(users.filter(id__gt=broadcast.last_user_id)[:chunk_size])
+        if not user_ids:
+            break
+        broadcast_chunk(broadcast, user_ids)
+        broadcast.last_user_id = user_ids[-1]
+        done += len(user_ids)
+        if progress:
+            progress(done, total)
+
+    Broadcast.objects.filter(pk=broadcast.pk).update(status='completed', completed_at=timezone.now())
+    broadcast.refresh_from_db()
+    return broadcast
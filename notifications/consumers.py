@@ -1,7 +1,46 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from .counters import get_unread_count
 from .models import Notification
+from .serializers import NotificationSerializer
+from .topics import authorize, parse_topic, topic_group
+
+DEFAULT_SOCKET_OPTIONS = {
+    # Seconds events are held so bursts go out as one frame
+    'BATCH_WINDOW': 0.05,
+    # Frames a connection may queue while its previous write is still draining
+    # before it is treated as too slow
+    'MAX_QUEUED_EVENTS': 200,
+    'MAX_SUBSCRIPTIONS': 50,
+    # Most missed notifications replayed on reconnect
+    'REPLAY_LIMIT': 100,
+    # Seconds a ticket from /api/notifications/ws-ticket/ stays valid
+    'TICKET_MAX_AGE': 60,
+    # Seconds a ticket-authenticated user is reused without reloading it
+    'USER_CACHE_TTL': 300,
+}
+# Close code telling a client it fell behind and should reconnect to resync
+SLOW_CONSUMER_CLOSE_CODE = 4008
+# Close code for frames the protocol does not accept (RFC 6455 "unsupported data")
+UNSUPPORTED_DATA_CLOSE_CODE = 1003
+
+
+def socket_options():
+    return {**DEFAULT_SOCKET_OPTIONS, **getattr(settings, 'NOTIFICATION_SOCKET', {})}
+
+
+def missed_notifications(user_id, last_id, limit):
+    """The newest ``limit`` notifications after ``last_id``, serialized oldest first, and whether more exist"""
+    notifications = list(
+        Notification.objects.filter(recipient_id=user_id, is_archived=False, id__gt=last_id)
+        .select_related('related_booking').order_by('-id')[:limit + 1]
+    )
+    return NotificationSerializer(notifications[:limit][::-1], many=True).data, len(notifications) > limit
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -9,51 +48,144 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             # Reject the connection if user is not authenticated
             await self.close()
         else:
+            self.options = socket_options()
+            self.outbox = []
+            self.flush_task = None
+            # Whether a frame has been handed to the socket and not yet written
+            self.sending = False
+            self.topics = set()
+
             # Add the user to a group based on their user ID
             self.user_id = self.scope["user"].id
             self.room_group_name = f"user_{self.user_id}"
-            
+
             # Join room group
             await self.channel_layer.group_add(
                 self.room_group_name,
                 self.channel_name
             )
-            
+
             await self.accept()
 
+            # Initial badge value; later changes are pushed, so clients never poll
+            await self.send(text_data=json.dumps({
+                'unread_count': await database_sync_to_async(get_unread_count)(self.user_id)
+            }))
+
+            # A reconnecting client passes ?last_id=<newest id it has> to catch up
+            last_id = parse_qs(self.scope.get('query_string', b'').decode()).get('last_id', [''])[0]
+            if last_id.isdigit():
+                notifications, truncated = await database_sync_to_async(missed_notifications)(
+                    self.user_id, int(last_id), self.options['REPLAY_LIMIT']
+                )
+                # When truncated, older missed notifications are left out and the
+                # client should reload the inbox to fill the gap
+                await self.send(text_data=json.dumps({
+                    'notifications': notifications,
+                    'truncated': truncated
+                }))
+
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
-
-    # Receive message from WebSocket
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'notification_message',
-                'message': message
-            }
-        )
+        if not hasattr(self, 'room_group_name'):
+            return
+        if self.flush_task:
+            self.flush_task.cancel()
+
+        # Leave room and topic groups
+        for group in [self.room_group_name] + [topic_group(topic) for topic in self.topics]:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    # Receive a subscription request from WebSocket
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None:
+            # The protocol is JSON over text frames only
+            await self.close(code=UNSUPPORTED_DATA_CLOSE_CODE)
+            return
+
+        try:
+            data = json.loads(text_data)
+            action, topic = data.get('action'), data.get('topic')
+        except (ValueError, AttributeError):
+            await self.send(text_data=json.dumps({'error': 'Invalid message'}))
+            return
+
+        if action == 'subscribe':
+            if len(self.topics) >= self.options['MAX_SUBSCRIPTIONS']:
+                await self.send(text_data=json.dumps({'error': 'Too many subscriptions', 'topic': topic}))
+            elif not await database_sync_to_async(authorize)(self.scope['user'], topic):
+                await self.send(text_data=json.dumps({'error': 'Forbidden', 'topic': topic}))
+            else:
+                await self.channel_layer.group_add(topic_group(topic), self.channel_name)
+                self.topics.add(topic)
+                await self.send(text_data=json.dumps({'subscribed': topic}))
+        elif action == 'unsubscribe' and parse_topic(topic):
+            if topic in self.topics:
+                self.topics.discard(topic)
+                await self.channel_layer.group_discard(topic_group(topic), self.channel_name)
+            await self.send(text_data=json.dumps({'unsubscribed': topic}))
+        else:
+            await self.send(text_data=json.dumps({'error': 'Unknown action'}))
+
+    async def enqueue(self, frame):
+        """Queue a frame; frames queued within the batch window go out together"""
+        if self.sending and len(self.outbox) >= self.options['MAX_QUEUED_EVENTS']:
+            # The last write has not drained and the backlog keeps growing:
+            # protect the server from clients that cannot keep up
+            self.outbox = []
+            await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+            return
+
+        # Only the latest badge value matters
+        if set(frame) == {'unread_count'}:
+            self.outbox = [queued for queued in self.outbox if set(queued) != {'unread_count'}]
+        self.outbox.append(frame)
+
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.options['BATCH_WINDOW'])
+        # Frames queued while a write drains go out in the next one
+        while self.outbox:
+            frames, self.outbox = self.outbox, []
+            self.sending = True
+            try:
+                # A lone frame keeps its own shape; bursts are wrapped in a batch
+                await self.send(text_data=json.dumps(frames[0] if len(frames) == 1 else {'batch': frames}))
+            finally:
+                self.sending = False
+        self.flush_task = None
 
     # Receive message from room group
     async def notification_message(self, event):
-        message = event['message']
-
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'message': message
-        }))
+        await self.enqueue({
+            'message': event['message']
+        })
 
     # Method to send notification to user
     async def send_notification(self, event):
-        notification_data = event['notification_data']
-        
-        # Send notification to WebSocket
-        await self.send(text_data=json.dumps(notification_data))
\ No newline at end of file
+        await self.enqueue(event['notification_data'])
+
+    # Receive a coalesced burst of notifications from the fan-out
+    async def send_notifications(self, event):
+        unread_count = event.get('unread_count')
+        if unread_count is None:
+            unread_count = await database_sync_to_async(get_unread_count)(self.user_id)
+
+        await self.enqueue({
+            'notifications': event['notifications'],
+            'unread_count': unread_count
+        })
+
+    # Receive an unread counter change
+    async def unread_count(self, event):
+        await self.enqueue({
+            'unread_count': event['unread_count']
+        })
+
+    # Receive an event published to a subscribed topic
+    async def topic_event(self, event):
+        await self.enqueue({
+            'topic': event['topic'],
+            'event': event['payload']
+        })
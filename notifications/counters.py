@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from .models import Notification
+from .realtime import send_to_groups, user_group
+
+# Counters are corrected from the database at least this often
+UNREAD_COUNT_TIMEOUT = 60 * 60
+
+
+def unread_count_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def count_unread(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False, is_archived=False).count()
+
+
+def get_unread_count(user_id):
+    """Cached unread count, rebuilt from the database on a miss"""
+    count = cache.get(unread_count_key(user_id))
+    if count is None or count < 0:
+        count = count_unread(user_id)
+        cache.set(unread_count_key(user_id), count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_unread_counts(deltas):
+    """Apply ``{user_id: delta}`` to cached counters and return the new values.
+
+    Users without a cached counter are skipped; their next read rebuilds it.
+    """
+    counts = {}
+    for user_id, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            counts[user_id] = cache.incr(unread_count_key(user_id), delta)
+        except ValueError:
+            continue
+    return counts
+
+
+def reset_unread_count(user_id):
+    cache.set(unread_count_key(user_id), 0, UNREAD_COUNT_TIMEOUT)
+
+
+def push_unread_counts(counts):
+    """Push ``{user_id: count}`` to each user's notification socket"""
+    send_to_groups(
+        (user_group(user_id), {'type': 'unread_count', 'unread_count': count})
+        for user_id, count in counts.items()
+    )
@@ -0,0 +1,129 @@
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.core import mail
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from .fanout import PREFERENCE_FIELDS, load_preferences
+from .models import Notification
+
+# Types collapsed into one digest email per recipient and never sent by SMS
+DIGEST_TYPES = {'promotion', 'system_alert'}
+# Failed sends after which a notification is marked failed and no longer retried
+MAX_DELIVERY_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def plan_deliveries(notifications, preferences):
+    """Split a batch into deliveries and ids to mark skipped.
+
+    Each delivery is ``(ids, email, sms_message)``: one notification with its
+    email and/or SMS, or one digest email covering several notifications.
+    """
+    deliveries, skipped = [], []
+    digests = defaultdict(list)
+
+    for notification in notifications:
+        prefs = preferences.get(notification['recipient_id'], {})
+        wanted = prefs.get(PREFERENCE_FIELDS.get(notification['notification_type']), True)
+        email = notification['recipient__email'] if prefs.get('email_notifications', True) else ''
+        phone = notification['recipient__phone_number'] if prefs.get('sms_notifications', True) else ''
+        if notification['notification_type'] in DIGEST_TYPES:
+            phone = ''
+
+        if not wanted or not (email or phone):
+            skipped.append(notification['id'])
+            continue
+
+        if notification['notification_type'] in DIGEST_TYPES:
+            digests[email].append(notification)
+            continue
+        deliveries.append((
+            [notification['id']],
+            mail.EmailMessage(notification['title'], notification['message'], to=[email]) if email else None,
+            (phone, f"{notification['title']}: {notification['message']}") if phone else None,
+        ))
+
+    for email, items in digests.items():
+        if len(items) == 1:
+            subject, body = items[0]['title'], items[0]['message']
+        else:
+            subject = f'You have {len(items)} new updates from NaTourCam'
+            body = '\n\n'.join(f"{item['title']}\n{item['message']}" for item in items)
+        deliveries.append(([item['id'] for item in items], mail.EmailMessage(subject, body, to=[email]), None))
+
+    return deliveries, skipped
+
+
+def send_deliveries(deliveries, sms_backend):
+    """Send each delivery on its own; returns the sent and failed ids and the email and SMS counts.
+
+    A failing message only fails its own notifications. Emails share one
+    SMTP connection when it can be opened.
+    """
+    sent, failed = [], []
+    emails = sms_messages = 0
+    connection = mail.get_connection()
+    try:
+        connection.open()
+    except Exception:
+        # Each send retries the connection on its own
+        logger.exception('Could not open the email connection')
+    try:
+        for ids, email, sms_message in deliveries:
+            try:
+                if email:
+                    email.from_email = settings.DEFAULT_FROM_EMAIL
+                    connection.send_messages([email])
+                if sms_message:
+                    sms_backend.send_messages([sms_message])
+            except Exception:
+                logger.exception('Could not deliver notifications %s', ids)
+                failed.extend(ids)
+                continue
+            sent.extend(ids)
+            emails += bool(email)
+            sms_messages += bool(sms_message)
+    finally:
+        connection.close()
+    return sent, failed, emails, sms_messages
+
+
+def deliver_pending_notifications(sms_backend, batch_size=500, max_attempts=MAX_DELIVERY_ATTEMPTS):
+    """Deliver one batch of pending notifications by email and SMS.
+
+    Recipient preferences are loaded with one query and emails share one
+    SMTP connection. Every notification or digest is sent on its own, so one
+    bad message cannot hold back the rest: sent rows are marked sent, and
+    rows whose send raised count an attempt and stay pending until
+    ``max_attempts``, when they are marked failed. Run a single worker at a
+    time.
+    """
+    notifications = list(
+        Notification.objects.filter(
+            delivery_status='pending', delivery_attempts__lt=max_attempts
+        ).order_by('id').values(
+            'id', 'recipient_id', 'recipient__email', 'recipient__phone_number',
+            'notification_type', 'title', 'message',
+        )[:batch_size]
+    )
+    if not notifications:
+        return {'emails': 0, 'sms': 0, 'sent': 0, 'skipped': 0, 'failed': 0}
+
+    preferences = load_preferences(
+        {n['recipient_id'] for n in notifications},
+        set(PREFERENCE_FIELDS.values()) | {'email_notifications', 'sms_notifications'},
+    )
+    deliveries, skipped = plan_deliveries(notifications, preferences)
+    sent, failed, emails, sms_messages = send_deliveries(deliveries, sms_backend)
+
+    Notification.objects.filter(id__in=sent).update(delivery_status='sent', delivered_at=timezone.now())
+    Notification.objects.filter(id__in=skipped).update(delivery_status='skipped')
+    Notification.objects.filter(id__in=failed).update(
+        delivery_attempts=F('delivery_attempts') + 1,
+        delivery_status=Case(
+            When(delivery_attempts__gte=max_attempts - 1, then=Value('failed')), default=Value('pending'),
+        ),
+    )
+    return {'emails': emails, 'sms': sms_messages, 'sent': len(sent), 'skipped': len(skipped), 'failed': len(failed)}
@@ -0,0 +1,121 @@
+import logging
+import threading
+from collections import Counter, defaultdict
+from functools import partial
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from .counters import adjust_unread_counts
+from .models import Notification, NotificationPreference
+from .realtime import send_to_groups, user_group
+from .serializers import NotificationSerializer
+
+# Preference flag that silences each notification type; unlisted types always go out
+PREFERENCE_FIELDS = {
+    'booking_confirmation': 'booking_notifications',
+    'booking_cancellation': 'booking_notifications',
+    'payment_confirmation': 'payment_notifications',
+    'payment_failure': 'payment_notifications',
+    'tour_reminder': 'tour_updates',
+    'tour_update': 'tour_updates',
+    'promotion': 'promotions',
+}
+
+logger = logging.getLogger(__name__)
+
+# Specs committed during the current request, dispatched once it finishes
+_state = threading.local()
+
+
+def notify(specs):
+    """Create notifications once the current transaction commits.
+
+    ``specs`` are dicts of Notification field values (``recipient_id``,
+    ``notification_type``, ``title``, ``message`` and optionally
+    ``related_booking_id``). Nothing is written if the transaction (or the
+    savepoint ``notify`` was called in) rolls back, and a failing fan-out
+    never breaks the request that triggered it.
+
+    Committed specs are buffered per thread for the rest of the request and
+    dispatched together after the response, so one request writes and
+    pushes its notifications in a single round however many transitions
+    it made. Outside a request they are dispatched on commit.
+    """
+    specs = list(specs)
+    if specs:
+        # Per-call hooks: Django drops them exactly when their savepoint rolls back
+        transaction.on_commit(partial(_committed, specs), robust=True)
+
+
+def _committed(specs):
+    if getattr(_state, 'in_request', False):
+        _state.pending.extend(specs)
+    else:
+        dispatch(specs)
+
+
+def start_request():
+    flush_request()
+    _state.in_request = True
+    _state.pending = []
+
+
+def flush_request():
+    """Dispatch everything committed during the request in one batch"""
+    _state.in_request = False
+    specs, _state.pending = getattr(_state, 'pending', []), []
+    if specs:
+        try:
+            dispatch(specs)
+        except Exception:
+            logger.exception('Failed to dispatch %d notifications', len(specs))
+
+
+def load_preferences(user_ids, fields):
+    """Map user id -> {field: value} for users who saved preferences"""
+    rows = NotificationPreference.objects.filter(user_id__in=user_ids).values('user_id', *fields)
+    return {row.pop('user_id'): row for row in rows}
+
+
+def dispatch(specs):
+    """Write notifications with one bulk insert and push them per recipient"""
+    preferences = load_preferences(
+        {spec['recipient_id'] for spec in specs},
+        set(PREFERENCE_FIELDS.values()) | {'push_notifications'},
+    )
+    allowed = [
+        spec for spec in specs
+        if preferences.get(spec['recipient_id'], {}).get(PREFERENCE_FIELDS.get(spec['notification_type']), True)
+    ]
+    notifications = Notification.objects.bulk_create(
+        [Notification(**spec) for spec in allowed], batch_size=500
+    )
+    counts = adjust_unread_counts(Counter(n.recipient_id for n in notifications))
+    push(
+        [n for n in notifications if preferences.get(n.recipient_id, {}).get('push_notifications', True)],
+        counts,
+    )
+    return notifications
+
+
+def push(notifications, unread_counts=None):
+    """Send each recipient's notifications to their ``user_<id>`` group as one message.
+
+    The recipient's new unread count rides along when it is cached; the
+    consumer fills it in otherwise.
+    """
+    unread_counts = unread_counts or {}
+    # One query per 500 rows for the related bookings instead of one per row
+    for start in range(0, len(notifications), 500):
+        prefetch_related_objects(notifications[start:start + 500], 'related_booking')
+    by_user = defaultdict(list)
+    for notification, data in zip(notifications, NotificationSerializer(notifications, many=True).data):
+        by_user[notification.recipient_id].append(dict(data))
+
+    send_to_groups(
+        (user_group(user_id), {
+            'type': 'send_notifications',
+            'notifications': payload,
+            'unread_count': unread_counts.get(user_id),
+        })
+        for user_id, payload in by_user.items()
+    )
@@ -0,0 +1,65 @@
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from notifications.models import Notification
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Seed a large inbox inside a rolled-back transaction and time the inbox queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Notifications to seed')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (best time is reported)')
+
+    def handle(self, *args, **options):
+        rows, page_size = options['rows'], options['page_size']
+
+        with transaction.atomic():
+            suffix = uuid.uuid4().hex[:8]
+            user = User.objects.create_user(username=f'bench_{suffix}', email=f'bench_{suffix}@example.com')
+            # A second inbox of the same size so the recipient filter has to discriminate
+            other = User.objects.create_user(username=f'other_{suffix}', email=f'other_{suffix}@example.com')
+
+            started = time.perf_counter()
+            for recipient in (user, other):
+                Notification.objects.bulk_create((
+                    Notification(
+                        recipient=recipient,
+                        title=f'Notification {i}',
+                        message='Benchmark notification',
+                        notification_type='system_alert',
+                        is_read=i % 3 == 0,
+                        is_archived=i % 10 == 0,
+                    )
+                    for i in range(rows)
+                ), batch_size=5000)
+            self.stdout.write(f'Seeded {2 * rows} notifications in {time.perf_counter() - started:.2f}s')
+
+            inbox = Notification.objects.filter(recipient=user, is_archived=False).order_by('-created_at', '-id')
+            depth = rows // 2
+            boundary = inbox.values_list('created_at', 'id')[depth]
+
+            queries = {
+                'first page': lambda: list(inbox[:page_size]),
+                f'offset page at row {depth}': lambda: list(inbox[depth:depth + page_size]),
+                f'cursor page at row {depth}': lambda: list(inbox.filter(created_at__lte=boundary[0]).exclude(
+                    created_at=boundary[0], id__gte=boundary[1])[:page_size]),
+                'unread count': lambda: Notification.objects.filter(
+                    recipient=user, is_read=False, is_archived=False).count(),
+            }
+            for label, query in queries.items():
+                best = min(self._time(query) for _ in range(options['repeat']))
+                self.stdout.write(f'{label:>28}: {best * 1000:8.2f} ms')
+
+            self.stdout.write('\nInbox query plan:\n' + inbox[:page_size].explain())
+            transaction.set_rollback(True)
+
+    def _time(self, query):
+        started = time.perf_counter()
+        query()
+        return time.perf_counter() - started
@@ -0,0 +1,81 @@
+import asyncio
+import time
+import uuid
+from channels.auth import AuthMiddlewareStack
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from notifications import tickets
+
+
+class AuthenticatedConsumer(AsyncWebsocketConsumer):
+    """Accepts authenticated sockets only, so the benchmark measures authentication alone"""
+    # No channel layer, so runs do not depend on Redis
+    channel_layer_alias = None
+
+    async def connect(self):
+        if self.scope['user'].is_anonymous:
+            await self.close()
+        else:
+            await self.accept()
+
+
+class Command(BaseCommand):
+    help = 'Compare WebSocket handshake throughput for session and ticket authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--handshakes', type=int, default=500,
+                            help='Handshakes per authentication method')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Handshakes in flight at once')
+
+    def handle(self, *args, **options):
+        # A throwaway user, so existing accounts are never reused or touched
+        suffix = uuid.uuid4().hex[:8]
+        user = get_user_model().objects.create_user(
+            username=f'ws_bench_{suffix}', email=f'ws_bench_{suffix}@example.com', password=None
+        )
+        session = SessionStore()
+        try:
+            session.update({
+                SESSION_KEY: str(user.pk),
+                BACKEND_SESSION_KEY: settings.AUTHENTICATION_BACKENDS[0],
+                HASH_SESSION_KEY: user.get_session_auth_hash(),
+            })
+            session.create()
+
+            consumer = AuthenticatedConsumer.as_asgi()
+            cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'.encode()
+            self.report('Session', AuthMiddlewareStack(consumer), '/ws/notifications/',
+                        [(b'cookie', cookie)], options)
+            tickets._user_cache.clear()
+            self.report('Ticket', tickets.TicketAuthMiddleware(consumer),
+                        f'/ws/notifications/?ticket={tickets.issue_ticket(user)}', [], options)
+        finally:
+            session.delete()
+            user.delete()
+
+    def report(self, label, application, path, headers, options):
+        elapsed = asyncio.run(self.run_handshakes(application, path, headers, options))
+        self.stdout.write(
+            f"{label} auth: {options['handshakes']} handshakes in {elapsed:.2f}s "
+            f"({options['handshakes'] / elapsed:.0f}/s)"
+        )
+
+    async def run_handshakes(self, application, path, headers, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def handshake():
+            async with semaphore:
+                communicator = WebsocketCommunicator(application, path, headers=headers)
+                connected, _ = await communicator.connect()
+                if not connected:
+                    raise RuntimeError('Handshake was rejected')
+                await communicator.disconnect()
+
+        started = time.monotonic()
+        await asyncio.gather(*(handshake() for _ in range(options['handshakes'])))
+        return time.monotonic() - started
@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from notifications.broadcasts import run_broadcast
+from notifications.models import Broadcast
+
+
+class Command(BaseCommand):
+    help = 'Send a system alert or promotion to every active user, or resume an interrupted broadcast'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', dest='notification_type', default='system_alert',
+                            choices=[choice for choice, _ in Broadcast.BROADCAST_TYPES])
+        parser.add_argument('--title', help='Notification title')
+        parser.add_argument('--message', help='Notification message')
+        parser.add_argument('--resume', type=int, metavar='BROADCAST_ID',
+                            help='Continue an unfinished broadcast from its last user')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Users handled per bulk insert')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                broadcast = Broadcast.objects.exclude(status='completed').get(pk=options['resume'])
+            except Broadcast.DoesNotExist:
+                raise CommandError(f"No unfinished broadcast with id {options['resume']}")
+        elif options['title'] and options['message']:
+            broadcast = Broadcast.objects.create(
+                notification_type=options['notification_type'],
+                title=options['title'],
+                message=options['message'],
+            )
+        else:
+            raise CommandError('Pass --title and --message, or --resume BROADCAST_ID')
+
+        started = time.monotonic()
+
+        def progress(done, total):
+            rate = done / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f'Broadcast {broadcast.pk}: {done}/{total} users ({rate:.0f} users/s)')
+
+        broadcast = run_broadcast(broadcast, chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Broadcast {broadcast.pk} completed: {broadcast.recipients_count} notifications '
+            f'in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from notifications.delivery import MAX_DELIVERY_ATTEMPTS, deliver_pending_notifications
+from notifications.sms import get_sms_backend
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending notifications by email and SMS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Notifications delivered per batch')
+        parser.add_argument('--max-attempts', type=int, default=MAX_DELIVERY_ATTEMPTS,
+                            help='Failed sends after which a notification is marked failed')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait when nothing is pending')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        sms_backend = get_sms_backend()
+        totals = {'emails': 0, 'sms': 0, 'sent': 0, 'skipped': 0, 'failed': 0}
+
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            result = deliver_pending_notifications(
+                sms_backend, batch_size=options['batch_size'], max_attempts=options['max_attempts']
+            )
+
+            for key, value in result.items():
+                totals[key] += value
+            if result['sent'] or result['skipped'] or result['failed']:
+                self.stdout.write(
+                    f"Delivered {result['sent']} notifications in {time.monotonic() - started:.2f}s "
+                    f"({result['emails']} emails, {result['sms']} SMS, {result['skipped']} skipped, "
+                    f"{result['failed']} failed)"
+                )
+            # A batch that only failed waits before retrying
+            if result['sent'] or result['skipped']:
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['sent']} delivered ({totals['emails']} emails, {totals['sms']} SMS), "
+            f"{totals['skipped']} skipped, {totals['failed']} failed"
+        ))
@@ -0,0 +1,62 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from notifications.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Archive old read notifications and purge old archived ones in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive-after-days', type=int, default=30,
+                            help='Archive read notifications older than this')
+        parser.add_argument('--purge-after-days', type=int, default=180,
+                            help='Delete archived notifications older than this')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows changed per transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between chunks so other writers get the lock')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        archive_cutoff = now - timedelta(days=options['archive_after_days'])
+        purge_cutoff = now - timedelta(days=options['purge_after_days'])
+
+        self.run_in_chunks(
+            'Archived',
+            Notification.objects.filter(is_read=True, is_archived=False, created_at__lt=archive_cutoff),
+            lambda chunk: chunk.update(is_archived=True),
+            options,
+        )
+        self.run_in_chunks(
+            'Purged',
+            Notification.objects.filter(is_archived=True, created_at__lt=purge_cutoff),
+            lambda chunk: chunk.delete()[0],
+            options,
+        )
+
+    def run_in_chunks(self, label, queryset, action, options):
+        """Apply ``action`` to ``queryset`` one keyset chunk (by id) per transaction"""
+        started = time.monotonic()
+        last_id, total = 0, 0
+
+        while True:
+            ids = list(
+                queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                # Re-apply the filter so rows changed since the scan are left alone
+                total += action(queryset.filter(id__in=ids))
+            last_id = ids[-1]
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{label} {total} notifications in {elapsed:.2f}s ({rate:.0f} rows/sec)'
+        ))
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.reminders import send_tour_reminders
+
+
+class Command(BaseCommand):
+    help = 'Remind travellers with confirmed bookings about upcoming departures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, nargs='+', default=[1],
+                            help='Remind about departures this many days from today')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Bookings reminded per bulk insert')
+
+    def handle(self, *args, **options):
+        for days in options['days']:
+            started = time.monotonic()
+            created = send_tour_reminders(days_ahead=days, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Sent {created} reminders for departures in {days} day(s) '
+                f'in {time.monotonic() - started:.2f}s'
+            ))
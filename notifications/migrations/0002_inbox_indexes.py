@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_waitlistentry'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['recipient', '-created_at', '-id'], name='notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_read', False)), fields=['recipient'], name='notification_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_waitlistentry'),
+        ('notifications', '0002_inbox_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Existing notifications predate delivery and must not be sent now
+        migrations.AddField(
+            model_name='notification',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('skipped', 'Skipped')], default='skipped', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('skipped', 'Skipped')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('delivery_status', 'pending')), fields=['id'], name='notification_delivery_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_waitlistentry'),
+        ('notifications', '0004_broadcast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['recipient', 'id'], name='notification_replay_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_replay_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='delivery_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+    ]
@@ -16,11 +16,23 @@ class Notification(models.Model):
         ('promotion', 'Promotion'),
     ]
 
+    DELIVERY_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     title = models.CharField(max_length=200)
     message = models.TextField()
     notification_type = models.CharField(max_length=30, choices=NOTIFICATION_TYPES)
     related_booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True)
+    # Email/SMS delivery state, advanced by the deliver_notifications worker
+    delivery_status = models.CharField(max_length=10, choices=DELIVERY_STATUS_CHOICES, default='pending')
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    # Failed sends so far; the worker gives up and marks the row failed at its limit
+    delivery_attempts = models.PositiveSmallIntegerField(default=0)
     is_read = models.BooleanField(default=False)
     is_archived = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -28,6 +40,34 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Partial indexes, because boolean filters compile to `NOT is_archived`,
+            # which a plain (recipient, is_archived, ...) index cannot seek on.
+            # Inbox: a recipient's non-archived notifications, newest first
+            models.Index(
+                fields=['recipient', '-created_at', '-id'],
+                condition=models.Q(is_archived=False),
+                name='notification_inbox_idx',
+            ),
+            # Reconnect replay: a recipient's non-archived notifications after an id
+            models.Index(
+                fields=['recipient', 'id'],
+                condition=models.Q(is_archived=False),
+                name='notification_replay_idx',
+            ),
+            # Unread count
+            models.Index(
+                fields=['recipient'],
+                condition=models.Q(is_read=False, is_archived=False),
+                name='notification_unread_idx',
+            ),
+            # Delivery worker queue
+            models.Index(
+                fields=['id'],
+                condition=models.Q(delivery_status='pending'),
+                name='notification_delivery_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Notification for {self.recipient.email} - {self.title}"
@@ -47,3 +87,33 @@ class NotificationPreference(models.Model):
 
     def __str__(self):
         return f"Notification preferences for {self.user.email}"
+
+class Broadcast(models.Model):
+    """Model for a notification sent to every active user"""
+    BROADCAST_TYPES = [
+        ('system_alert', 'System Alert'),
+        ('promotion', 'Promotion'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+    ]
+
+    notification_type = models.CharField(max_length=30, choices=BROADCAST_TYPES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Highest user id already handled, so an interrupted run resumes after it
+    last_user_id = models.PositiveIntegerField(default=0)
+    recipients_count = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Broadcast {self.id} - {self.title}"
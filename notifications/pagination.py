@@ -0,0 +1,7 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NotificationCursorPagination(CursorPagination):
+    """Keyset pagination over the partial notification_inbox_idx: (recipient, -created_at, -id) WHERE NOT is_archived"""
+    page_size = 20
+    ordering = ('-created_at', '-id')
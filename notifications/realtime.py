@@ -0,0 +1,30 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    return f'user_{user_id}'
+
+
+def send_to_groups(messages):
+    """Send ``(group, message)`` pairs over the channel layer in one event loop pass.
+
+    Realtime delivery is best effort: the database stays the source of
+    truth, so failures are logged rather than raised.
+    """
+    messages = list(messages)
+    channel_layer = get_channel_layer()
+    if not messages or channel_layer is None:
+        return
+    try:
+        async_to_sync(_send_all)(channel_layer, messages)
+    except Exception:
+        logger.exception('Failed to push %d channel layer messages', len(messages))
+
+
+async def _send_all(channel_layer, messages):
+    for group, message in messages:
+        await channel_layer.group_send(group, message)
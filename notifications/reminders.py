@@ -0,0 +1,51 @@
+from datetime import timedelta
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from bookings.models import Booking
+from .fanout import dispatch
+from .models import Notification
+
+
+def due_reminders(departure_date):
+    """Confirmed bookings departing on ``departure_date`` that have no reminder yet"""
+    already_reminded = Notification.objects.filter(
+        related_booking=OuterRef('pk'), notification_type='tour_reminder'
+    )
+    return Booking.objects.filter(
+        status='confirmed', tour_availability__date=departure_date
+    ).exclude(Exists(already_reminded))
+
+
+def reminder_spec(booking):
+    return {
+        'recipient_id': booking['user_id'],
+        'related_booking_id': booking['id'],
+        'notification_type': 'tour_reminder',
+        'title': 'Upcoming tour',
+        'message': (
+            f"Your tour {booking['tour__title']} departs on {booking['tour_availability__date']} "
+            f"for {booking['participants']} participant(s). Booking #{booking['id']}."
+        ),
+    }
+
+
+def send_tour_reminders(days_ahead=1, chunk_size=2000):
+    """Create reminders for confirmed bookings departing ``days_ahead`` days from today.
+
+    Bookings are read in keyset chunks from one joined query and each chunk is
+    written with the bulk fan-out. Bookings that already have a reminder are
+    excluded, so reruns only fill in what is missing. Returns the number of
+    reminders created.
+    """
+    departure_date = timezone.localdate() + timedelta(days=days_ahead)
+    queryset = due_reminders(departure_date).order_by('id').values(
+        'id', 'user_id', 'participants', 'tour__title', 'tour_availability__date'
+    )
+    created, last_id = 0, 0
+
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return created
+        created += len(dispatch([reminder_spec(booking) for booking in chunk]))
+        last_id = chunk[-1]['id']
@@ -2,11 +2,13 @@ from rest_framework import serializers
 from .models import Notification, NotificationPreference
 
 class NotificationSerializer(serializers.ModelSerializer):
+    related_booking_status = serializers.CharField(source='related_booking.status', read_only=True, default=None)
+    
     class Meta:
         model = Notification
-        fields = ['id', 'title', 'message', 'notification_type', 'is_read', 
-                  'created_at', 'read_at']
-        read_only_fields = ['id', 'created_at', 'read_at']
+        fields = ['id', 'title', 'message', 'notification_type', 'related_booking',
+                  'related_booking_status', 'is_read', 'created_at', 'read_at']
+        read_only_fields = ['id', 'related_booking', 'created_at', 'read_at']
 
 class NotificationPreferenceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1 +1,95 @@
-# Signals for notifications app
\ No newline at end of file
+# Signals for notifications app
+from functools import partial
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from bookings.signals import booking_status_changed, payment_status_changed
+from .counters import adjust_unread_counts, push_unread_counts
+from .fanout import flush_request, notify, start_request
+from .models import Notification
+from .topics import publish_booking_events
+
+# new status -> (notification type, title, message)
+BOOKING_TEMPLATES = {
+    'confirmed': ('booking_confirmation', 'Booking confirmed',
+                  'Your booking #{booking_id} has been confirmed.'),
+    'cancelled': ('booking_cancellation', 'Booking cancelled',
+                  'Your booking #{booking_id} has been cancelled.'),
+}
+DEPARTURE_CANCELLED_TEMPLATE = (
+    'booking_cancellation', 'Departure cancelled',
+    'Your booking #{booking_id} has been cancelled by the tour operator. Any payment made will be refunded.',
+)
+PAYMENT_TEMPLATES = {
+    'completed': ('payment_confirmation', 'Payment received',
+                  'We received your payment of {amount} {currency} for booking #{booking_id}.'),
+    'failed': ('payment_failure', 'Payment failed',
+               'Your payment for booking #{booking_id} could not be processed. Please try again.'),
+    'refunded': ('payment_confirmation', 'Refund issued',
+                 'Your payment of {amount} {currency} for booking #{booking_id} has been refunded.'),
+}
+
+
+def build_specs(transitions, templates):
+    specs = []
+    for transition in transitions:
+        template = templates.get(transition.new_status)
+        if template is None:
+            continue
+        notification_type, title, message = template
+        specs.append({
+            'recipient_id': transition.user_id,
+            'related_booking_id': transition.booking_id,
+            'notification_type': notification_type,
+            'title': title,
+            'message': message.format(**transition._asdict()),
+        })
+    return specs
+
+
+@receiver(booking_status_changed)
+def notify_booking_transitions(sender, transitions, reason=None, **kwargs):
+    templates = BOOKING_TEMPLATES
+    if reason == 'departure_cancelled':
+        templates = {**BOOKING_TEMPLATES, 'cancelled': DEPARTURE_CANCELLED_TEMPLATE}
+    notify(build_specs(transitions, templates))
+
+
+@receiver(booking_status_changed)
+def publish_booking_topics(sender, transitions, **kwargs):
+    transaction.on_commit(partial(publish_booking_events, transitions), robust=True)
+
+
+@receiver(payment_status_changed)
+def notify_payment_transitions(sender, transitions, reason=None, **kwargs):
+    templates = PAYMENT_TEMPLATES
+    if reason in ('booking_cancelled', 'departure_cancelled'):
+        # Voided payments are covered by the cancellation notice
+        templates = {status: template for status, template in PAYMENT_TEMPLATES.items() if status != 'failed'}
+    notify(build_specs(transitions, templates))
+
+
+@receiver(post_save, sender=Notification)
+def count_created_notification(sender, instance, created, **kwargs):
+    # bulk_create skips post_save; the fan-out adjusts counters for those itself
+    if created and not instance.is_read and not instance.is_archived:
+        transaction.on_commit(partial(bump_unread_count, instance.recipient_id), robust=True)
+
+
+def bump_unread_count(user_id):
+    """Count one committed notification and push the new total to the user's sockets"""
+    counts = adjust_unread_counts({user_id: 1})
+    if counts:
+        push_unread_counts(counts)
+
+
+@receiver(request_started)
+def buffer_request_notifications(sender, **kwargs):
+    start_request()
+
+
+@receiver(request_finished)
+def dispatch_request_notifications(sender, **kwargs):
+    # After the response is sent: one write and push for the whole request
+    flush_request()
@@ -0,0 +1,46 @@
+import sys
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Messages sent through LocMemSMSBackend, for tests
+outbox = []
+
+
+class BaseSMSBackend:
+    """Interface every SMS adapter implements.
+
+    ``send_messages`` receives ``(phone_number, text)`` pairs and returns the
+    number sent; adapters should reuse one provider session for the batch.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
+    def send_messages(self, messages):
+        raise NotImplementedError
+
+
+class ConsoleSMSBackend(BaseSMSBackend):
+    """Write messages to stdout for local development"""
+
+    def send_messages(self, messages):
+        stream = self.options.get('stream', sys.stdout)
+        for phone_number, text in messages:
+            stream.write(f'SMS to {phone_number}: {text}\n')
+        stream.flush()
+        return len(messages)
+
+
+class LocMemSMSBackend(BaseSMSBackend):
+    """Keep messages in ``notifications.sms.outbox``"""
+
+    def send_messages(self, messages):
+        outbox.extend(messages)
+        return len(messages)
+
+
+def get_sms_backend():
+    """Instantiate the adapter configured in ``settings.SMS_BACKEND``"""
+    config = getattr(settings, 'SMS_BACKEND', {})
+    backend = config.get('BACKEND', 'notifications.sms.ConsoleSMSBackend')
+    return import_string(backend)(**config.get('OPTIONS', {}))
@@ -1,13 +1,37 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Notification
+from accounts.models import TourOperator
+from bookings.models import Booking
+from tours.models import Tour, TourAvailability
+from .consumers import NotificationConsumer
+from .counters import unread_count_key
+from .delivery import deliver_pending_notifications
+from .fanout import flush_request, notify, start_request
+from .models import Broadcast, Notification, NotificationPreference
+from .tickets import TicketAuthMiddleware, issue_ticket, read_ticket
+from . import sms
 
 User = get_user_model()
 
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
 class NotificationAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             username='testuser',
@@ -45,3 +69,395 @@ class NotificationAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.notification.refresh_from_db()
         self.assertTrue(self.notification.is_read)
+
+    def test_fan_out_after_commit(self):
+        """Test queued notifications are written in bulk and pushed once per user after commit"""
+        NotificationPreference.objects.create(user=self.user, promotions=False)
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'user_{self.user.id}', channel_name)
+
+        specs = [
+            {'recipient_id': self.user.id, 'notification_type': 'booking_confirmation',
+             'title': 'Booking confirmed', 'message': 'Confirmed'},
+            {'recipient_id': self.user.id, 'notification_type': 'payment_confirmation',
+             'title': 'Payment received', 'message': 'Paid'},
+            {'recipient_id': self.user.id, 'notification_type': 'promotion',
+             'title': 'Sale', 'message': 'Muted by preferences'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(specs)
+            self.assertEqual(Notification.objects.count(), 1)
+
+        self.assertEqual(Notification.objects.count(), 3)
+        message = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(message['type'], 'send_notifications')
+        self.assertEqual([n['title'] for n in message['notifications']], ['Booking confirmed', 'Payment received'])
+
+    def test_fan_out_coalesces_per_request(self):
+        """Test everything committed during a request is dispatched once, after it, and rollbacks are dropped"""
+        spec = {'recipient_id': self.user.id, 'notification_type': 'system_alert', 'title': 'Alert', 'message': 'Hi'}
+        start_request()
+        with patch('notifications.fanout.dispatch') as dispatch:
+            with self.captureOnCommitCallbacks(execute=True):
+                notify([spec])
+                try:
+                    with transaction.atomic():
+                        notify([{**spec, 'title': 'Rolled back'}])
+                        raise ValueError
+                except ValueError:
+                    pass
+                notify([{**spec, 'title': 'Second'}])
+            dispatch.assert_not_called()
+            flush_request()
+        dispatch.assert_called_once()
+        self.assertEqual([s['title'] for s in dispatch.call_args.args[0]], ['Alert', 'Second'])
+
+    def test_cached_unread_count(self):
+        """Test the unread counter is cached, adjusted on writes and healed on a miss"""
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.data['unread_count'], 1)
+        with self.assertNumQueries(0):
+            self.client.get('/api/notifications/unread-count/')
+
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'user_{self.user.id}', channel_name)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(recipient=self.user, title='Second', message='Second',
+                                        notification_type='system_alert')
+            # Not counted until the notification commits
+            self.assertEqual(cache.get(unread_count_key(self.user.id)), 1)
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread_count'], 2)
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel_name),
+                         {'type': 'unread_count', 'unread_count': 2})
+
+        self.client.put(f'/api/notifications/{self.notification.id}/', {'is_read': True}, format='json')
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread_count'], 1)
+
+        self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(cache.get(unread_count_key(self.user.id)), 0)
+
+        cache.delete(unread_count_key(self.user.id))
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread_count'], 0)
+
+    def test_notification_list_cursor_pagination(self):
+        """Test the inbox is cursor-paginated newest first"""
+        Notification.objects.bulk_create([
+            Notification(recipient=self.user, title=f'Bulk {i}', message='Bulk', notification_type='promotion')
+            for i in range(25)
+        ])
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/notifications/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['results'][0]['related_booking_status'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertIsNone(response.data['next'])
+
+    def test_notification_retention(self):
+        """Test old read notifications are archived and old archived ones purged"""
+        old = timezone.now() - timedelta(days=200)
+        Notification.objects.bulk_create([
+            Notification(recipient=self.user, title='Old read', message='Old', notification_type='promotion',
+                         is_read=True),
+            Notification(recipient=self.user, title='Old archived', message='Old', notification_type='promotion',
+                         is_read=True, is_archived=True),
+            Notification(recipient=self.user, title='Old unread', message='Old', notification_type='promotion'),
+        ])
+        Notification.objects.filter(title__startswith='Old').update(created_at=old)
+        Notification.objects.filter(title='Old read').update(created_at=timezone.now() - timedelta(days=60))
+
+        out = StringIO()
+        call_command('notification_retention', archive_after_days=30, purge_after_days=180,
+                     chunk_size=1, pause=0, stdout=out)
+        self.assertIn('Archived 1 notifications', out.getvalue())
+        self.assertIn('Purged 1 notifications', out.getvalue())
+        self.assertTrue(Notification.objects.get(title='Old read').is_archived)
+        self.assertFalse(Notification.objects.filter(title='Old archived').exists())
+        self.assertFalse(Notification.objects.get(title='Old unread').is_archived)
+        self.assertFalse(Notification.objects.get(pk=self.notification.pk).is_archived)
+
+    @override_settings(SMS_BACKEND={'BACKEND': 'notifications.sms.LocMemSMSBackend'})
+    def test_deliver_notifications(self):
+        """Test pending notifications are emailed, texted and digested per preferences"""
+        self.user.phone_number = '+237600000000'
+        self.user.save()
+        quiet = User.objects.create_user(username='quiet', email='quiet@example.com', password='pw12345678')
+        NotificationPreference.objects.create(user=quiet, email_notifications=False, sms_notifications=False)
+        Notification.objects.create(recipient=self.user, title='Sale', message='10% off',
+                                    notification_type='promotion')
+        Notification.objects.create(recipient=self.user, title='Booking confirmed', message='See you soon',
+                                    notification_type='booking_confirmation')
+        Notification.objects.create(recipient=quiet, title='Booking confirmed', message='See you soon',
+                                    notification_type='booking_confirmation')
+        sms.outbox.clear()
+
+        out = StringIO()
+        call_command('deliver_notifications', once=True, stdout=out)
+
+        # One digest for the alert and promotion, one email for the booking
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].subject, 'You have 2 new updates from NaTourCam')
+        self.assertEqual(sms.outbox, [('+237600000000', 'Booking confirmed: See you soon')])
+        self.assertEqual(Notification.objects.filter(delivery_status='sent', delivered_at__isnull=False).count(), 3)
+        self.assertEqual(Notification.objects.get(recipient=quiet).delivery_status, 'skipped')
+        self.assertIn('Done: 3 delivered (2 emails, 1 SMS), 1 skipped', out.getvalue())
+
+    def test_deliver_notifications_retries_failures(self):
+        """Test a failing send is retried up to the attempt limit without holding back the others"""
+        class FailingSMSBackend(sms.LocMemSMSBackend):
+            def send_messages(self, messages):
+                if any(phone == '+237699999999' for phone, _ in messages):
+                    raise ConnectionError('Provider rejected the number')
+                return super().send_messages(messages)
+
+        self.user.phone_number = '+237699999999'
+        self.user.save()
+        NotificationPreference.objects.create(user=self.user, email_notifications=False)
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw12345678')
+        broken = Notification.objects.create(recipient=self.user, title='Booking confirmed', message='See you soon',
+                                             notification_type='booking_confirmation')
+        Notification.objects.create(recipient=other, title='Booking confirmed', message='See you soon',
+                                    notification_type='booking_confirmation')
+        sms.outbox.clear()
+
+        with self.assertLogs('notifications.delivery', 'ERROR'):
+            result = deliver_pending_notifications(FailingSMSBackend(), max_attempts=2)
+        self.assertEqual((result['sent'], result['failed']), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+        broken.refresh_from_db()
+        self.assertEqual((broken.delivery_status, broken.delivery_attempts), ('pending', 1))
+
+        with self.assertLogs('notifications.delivery', 'ERROR'):
+            result = deliver_pending_notifications(FailingSMSBackend(), max_attempts=2)
+        self.assertEqual((result['sent'], result['failed']), (0, 1))
+        broken.refresh_from_db()
+        self.assertEqual((broken.delivery_status, broken.delivery_attempts), ('failed', 2))
+
+        # Exhausted rows are no longer picked up
+        self.assertEqual(deliver_pending_notifications(FailingSMSBackend(), max_attempts=2)['failed'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_tour_reminders(self):
+        """Test reminders go to confirmed bookings departing in N days, once"""
+        operator_user = User.objects.create_user(username='touroperator', email='operator@example.com',
+                                                 password='testpassword123', is_tour_operator=True)
+        operator = TourOperator.objects.create(
+            user=operator_user, company_name='Test Company', company_description='Test', business_license='123456',
+            contact_person='Test Person', contact_email='contact@test.com', contact_phone='+1234567890',
+            address='123 Test St'
+        )
+        tour = Tour.objects.create(
+            title='Test Tour', description='A test tour', tour_operator=operator, duration_days=5,
+            max_participants=10, price=100.00, start_date='2026-01-01', end_date='2026-12-31',
+            start_location='Test Start', end_location='Test End', includes='Test inclusions',
+            created_by=operator_user
+        )
+        tomorrow = TourAvailability.objects.create(
+            tour=tour, date=timezone.localdate() + timedelta(days=1), spots_available=10)
+        next_week = TourAvailability.objects.create(
+            tour=tour, date=timezone.localdate() + timedelta(days=7), spots_available=10)
+        for availability, booking_status in [(tomorrow, 'confirmed'), (tomorrow, 'confirmed'),
+                                             (tomorrow, 'pending'), (next_week, 'confirmed')]:
+            Booking.objects.create(
+                user=self.user, tour=tour, tour_availability=availability, participants=1, total_price=100,
+                status=booking_status, emergency_contact_name='Contact', emergency_contact_phone='+1234567890'
+            )
+
+        out = StringIO()
+        call_command('send_tour_reminders', days=[1], chunk_size=1, stdout=out)
+        call_command('send_tour_reminders', days=[1], stdout=out)
+        self.assertIn('Sent 2 reminders', out.getvalue())
+        self.assertIn('Sent 0 reminders', out.getvalue())
+        reminders = Notification.objects.filter(notification_type='tour_reminder')
+        self.assertEqual(reminders.count(), 2)
+        self.assertTrue(all(n.related_booking.tour_availability_id == tomorrow.id for n in reminders))
+
+    def test_ws_ticket(self):
+        """Test the WebSocket ticket endpoint issues a signed ticket for the caller"""
+        self.assertEqual(self.client.post('/api/notifications/ws-ticket/').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/notifications/ws-ticket/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_ticket(response.data['ticket'], max_age=60), self.user.id)
+        self.assertIsNone(read_ticket(response.data['ticket'] + 'x', max_age=60))
+
+    def test_broadcast_resumes_and_respects_preferences(self):
+        """Test a broadcast reaches every active user once and skips muted promotions"""
+        users = [User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='pw12345678')
+                 for i in range(4)]
+        NotificationPreference.objects.create(user=users[3], promotions=False)
+        # Interrupted after the first two users
+        broadcast = Broadcast.objects.create(notification_type='promotion', title='Sale', message='10% off',
+                                             status='running', last_user_id=users[0].id)
+        Notification.objects.create(recipient=self.user, title='Sale', message='10% off',
+                                    notification_type='promotion')
+        Notification.objects.create(recipient=users[0], title='Sale', message='10% off',
+                                    notification_type='promotion')
+
+        out = StringIO()
+        call_command('broadcast', resume=broadcast.pk, chunk_size=2, stdout=out)
+        self.assertIn(f'Broadcast {broadcast.pk}: 4/5 users', out.getvalue())
+        self.assertEqual(
+            list(Notification.objects.filter(title='Sale').order_by('recipient_id').values_list('recipient_id', flat=True)),
+            [self.user.id] + [user.id for user in users[:3]]
+        )
+        broadcast.refresh_from_db()
+        self.assertEqual(broadcast.status, 'completed')
+        self.assertEqual(broadcast.recipients_count, 2)
+
+
+class StalledConsumer(NotificationConsumer):
+    """Consumer whose notification writes do not drain until ``released`` is set"""
+    released = None
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if 'message' in (text_data or ''):
+            await self.released.wait()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    NOTIFICATION_SOCKET={'BATCH_WINDOW': 0.05, 'MAX_QUEUED_EVENTS': 3, 'REPLAY_LIMIT': 2},
+)
+class NotificationConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        operator_user = User.objects.create_user(
+            username='touroperator',
+            email='operator@example.com',
+            password='testpassword123',
+            is_tour_operator=True
+        )
+        self.tour_operator = TourOperator.objects.create(
+            user=operator_user,
+            company_name='Test Company',
+            company_description='Test company description',
+            business_license='123456',
+            contact_person='Test Person',
+            contact_email='contact@test.com',
+            contact_phone='+1234567890',
+            address='123 Test St'
+        )
+        self.tour = Tour.objects.create(
+            title='Test Tour',
+            description='A test tour',
+            tour_operator=self.tour_operator,
+            duration_days=5,
+            max_participants=10,
+            price=100.00,
+            start_date='2026-01-01',
+            end_date='2026-12-31',
+            start_location='Test Start',
+            end_location='Test End',
+            includes='Test inclusions',
+            created_by=operator_user
+        )
+
+    async def connect(self, path='/ws/notifications/', unread_count=0, consumer=NotificationConsumer):
+        communicator = WebsocketCommunicator(consumer.as_asgi(), path)
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(), {'unread_count': unread_count})
+        return communicator
+
+    async def test_ticket_authentication(self):
+        """Test sockets authenticate from a signed ticket and reject tampered ones"""
+        application = TicketAuthMiddleware(NotificationConsumer.as_asgi())
+        ticket = issue_ticket(self.user)
+
+        communicator = WebsocketCommunicator(application, f'/ws/notifications/?ticket={ticket}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(), {'unread_count': 0})
+        await communicator.disconnect()
+
+        communicator = WebsocketCommunicator(application, f'/ws/notifications/?ticket={ticket[:-1]}')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_replay_missed_notifications(self):
+        """Test a reconnecting client receives the newest notifications after its last id, capped"""
+        seen, *missed = await database_sync_to_async(lambda: [
+            Notification.objects.create(recipient=self.user, title=f'Update {i}', message='Update',
+                                        notification_type='tour_update')
+            for i in range(4)
+        ])()
+
+        communicator = await self.connect(f'/ws/notifications/?last_id={missed[0].id}', unread_count=4)
+        replay = await communicator.receive_json_from()
+        self.assertEqual([n['id'] for n in replay['notifications']], [n.id for n in missed[1:]])
+        self.assertFalse(replay['truncated'])
+        await communicator.disconnect()
+
+        communicator = await self.connect(f'/ws/notifications/?last_id={seen.id}', unread_count=4)
+        replay = await communicator.receive_json_from()
+        self.assertEqual([n['id'] for n in replay['notifications']], [n.id for n in missed[1:]])
+        self.assertTrue(replay['truncated'])
+        await communicator.disconnect()
+
+    async def test_topic_subscriptions(self):
+        """Test topic subscriptions are authorized on the server"""
+        communicator = await self.connect()
+
+        await communicator.send_json_to({'action': 'subscribe', 'topic': f'tour.{self.tour.id}.availability'})
+        self.assertEqual(await communicator.receive_json_from(),
+                         {'subscribed': f'tour.{self.tour.id}.availability'})
+        await communicator.send_json_to({'action': 'subscribe', 'topic': f'operator.{self.tour_operator.id}.bookings'})
+        self.assertEqual((await communicator.receive_json_from())['error'], 'Forbidden')
+
+        await get_channel_layer().group_send(f'tour_{self.tour.id}_availability', {
+            'type': 'topic_event',
+            'topic': f'tour.{self.tour.id}.availability',
+            'payload': {'spots_available': 3},
+        })
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['event'], {'spots_available': 3})
+        await communicator.disconnect()
+
+    async def test_batched_delivery_and_queue_limit(self):
+        """Test bursts are sent as one frame and consumers whose writes do not drain are disconnected"""
+        communicator = await self.connect()
+        channel_layer = get_channel_layer()
+
+        for count in (1, 2):
+            await channel_layer.group_send(f'user_{self.user.id}', {'type': 'notification_message', 'message': count})
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame, {'batch': [{'message': 1}, {'message': 2}]})
+
+        # A burst larger than the queue limit is fine while writes keep draining
+        for count in range(5):
+            await channel_layer.group_send(f'user_{self.user.id}', {'type': 'notification_message', 'message': count})
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame, {'batch': [{'message': count} for count in range(5)]})
+        await communicator.disconnect()
+
+        StalledConsumer.released = asyncio.Event()
+        communicator = await self.connect(consumer=StalledConsumer)
+        await channel_layer.group_send(f'user_{self.user.id}', {'type': 'notification_message', 'message': 0})
+        await asyncio.sleep(0.1)
+        for count in range(1, 5):
+            await channel_layer.group_send(f'user_{self.user.id}', {'type': 'notification_message', 'message': count})
+        output = await communicator.receive_output()
+        self.assertEqual(output, {'type': 'websocket.close', 'code': 4008})
+        StalledConsumer.released.set()
+
+    async def test_binary_frames_close_connection(self):
+        """Test binary frames are rejected with an unsupported data close"""
+        communicator = await self.connect()
+        await communicator.send_to(bytes_data=b'\x00')
+        output = await communicator.receive_output()
+        self.assertEqual(output, {'type': 'websocket.close', 'code': 1003})
@@ -0,0 +1,69 @@
+import time
+from urllib.parse import parse_qs
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from .consumers import socket_options
+
+TICKET_SALT = 'notifications.ws-ticket'
+
+# user id -> (expires at, user); shared by every connection in this process
+_user_cache = {}
+
+
+def issue_ticket(user):
+    """Signed token proving ``user`` may open a notification socket"""
+    return signing.dumps({'user_id': user.id}, salt=TICKET_SALT, compress=False)
+
+
+def read_ticket(ticket, max_age):
+    """User id from a valid, unexpired ticket, else None. Needs no database access."""
+    try:
+        return signing.loads(ticket, salt=TICKET_SALT, max_age=max_age)['user_id']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def cached_user(user_id):
+    cached = _user_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    return None
+
+
+def load_user(user_id, ttl):
+    """Load an active user and cache it for ``ttl`` seconds"""
+    user = get_user_model().objects.filter(pk=user_id, is_active=True).first() or AnonymousUser()
+    if len(_user_cache) >= 10000:
+        _user_cache.clear()
+    _user_cache[user_id] = (time.monotonic() + ttl, user)
+    return user
+
+
+class TicketAuthMiddleware:
+    """Authenticate sockets from a ``?ticket=`` query parameter.
+
+    A valid ticket is checked by signature alone and its user comes from an
+    in-process cache, so reconnect storms skip the session lookup. Sockets
+    without a ticket fall back to session authentication.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.session_auth = AuthMiddlewareStack(inner)
+
+    async def __call__(self, scope, receive, send):
+        ticket = parse_qs(scope.get('query_string', b'').decode()).get('ticket')
+        if not ticket:
+            return await self.session_auth(scope, receive, send)
+
+        options = socket_options()
+        user_id = read_ticket(ticket[0], options['TICKET_MAX_AGE'])
+        user = AnonymousUser()
+        if user_id is not None:
+            user = cached_user(user_id) or await database_sync_to_async(load_user)(
+                user_id, options['USER_CACHE_TTL']
+            )
+        return await self.inner(dict(scope, user=user), receive, send)
@@ -0,0 +1,87 @@
+import re
+from accounts.models import TourOperator
+from tours.models import Tour, TourAvailability
+from .realtime import send_to_groups
+
+# kind -> (topic name template, channel layer group template)
+TOPICS = {
+    'tour_availability': ('tour.{}.availability', 'tour_{}_availability'),
+    'operator_bookings': ('operator.{}.bookings', 'operator_{}_bookings'),
+}
+TOPIC_PATTERNS = {
+    kind: re.compile('^' + re.escape(name).replace(r'\{\}', r'(\d+)') + '$')
+    for kind, (name, _) in TOPICS.items()
+}
+
+
+def parse_topic(topic):
+    """Return ``(kind, object_id)`` for a valid topic name, else None"""
+    if not isinstance(topic, str):
+        return None
+    for kind, pattern in TOPIC_PATTERNS.items():
+        match = pattern.match(topic)
+        if match:
+            return kind, int(match.group(1))
+    return None
+
+
+def topic_group(topic):
+    kind, object_id = parse_topic(topic)
+    return TOPICS[kind][1].format(object_id)
+
+
+def topic_message(kind, object_id, payload):
+    """``(group, message)`` pair delivering ``payload`` to a topic's subscribers"""
+    name, group = TOPICS[kind]
+    return group.format(object_id), {
+        'type': 'topic_event',
+        'topic': name.format(object_id),
+        'payload': payload,
+    }
+
+
+def authorize(user, topic):
+    """Whether ``user`` may subscribe to ``topic``"""
+    parsed = parse_topic(topic)
+    if parsed is None:
+        return False
+    kind, object_id = parsed
+
+    if kind == 'tour_availability':
+        # Live availability is public for active tours
+        return Tour.objects.filter(pk=object_id, is_active=True).exists()
+    if kind == 'operator_bookings':
+        return user.is_staff or TourOperator.objects.filter(pk=object_id, user_id=user.id).exists()
+    return False
+
+
+def publish_booking_events(transitions):
+    """Publish availability and new-booking events for a batch of booking transitions"""
+    availability_ids = {t.tour_availability_id for t in transitions if t.new_status in ('pending', 'cancelled')}
+    new_bookings = [t for t in transitions if t.old_status is None]
+    messages = []
+
+    for row in TourAvailability.objects.filter(id__in=availability_ids).values(
+        'id', 'tour_id', 'date', 'spots_available', 'is_available'
+    ):
+        messages.append(topic_message('tour_availability', row['tour_id'], {
+            'tour_availability': row['id'],
+            'date': row['date'].isoformat(),
+            'spots_available': row['spots_available'],
+            'is_available': row['is_available'],
+        }))
+
+    if new_bookings:
+        operators = dict(Tour.objects.filter(
+            id__in={t.tour_id for t in new_bookings}
+        ).values_list('id', 'tour_operator_id'))
+        for t in new_bookings:
+            messages.append(topic_message('operator_bookings', operators[t.tour_id], {
+                'booking_id': t.booking_id,
+                'tour_id': t.tour_id,
+                'tour_availability': t.tour_availability_id,
+                'participants': t.participants,
+                'status': t.new_status,
+            }))
+
+    send_to_groups(messages)
@@ -6,5 +6,6 @@ urlpatterns = [
     path('<int:pk>/', views.NotificationDetailView.as_view(), name='notification-detail'),
     path('unread-count/', views.UnreadNotificationCountView.as_view(), name='unread-notification-count'),
     path('mark-all-read/', views.MarkAllNotificationsReadView.as_view(), name='mark-all-read'),
+    path('ws-ticket/', views.WebSocketTicketView.as_view(), name='notification-ws-ticket'),
     path('preferences/', views.NotificationPreferenceView.as_view(), name='notification-preferences'),
 ]
\ No newline at end of file
@@ -1,41 +1,45 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.utils import timezone
+from .counters import adjust_unread_counts, get_unread_count, push_unread_counts, reset_unread_count
 from .models import Notification, NotificationPreference
+from .pagination import NotificationCursorPagination
 from .serializers import NotificationSerializer, NotificationPreferenceSerializer
+from .tickets import issue_ticket
+from .consumers import socket_options
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user, is_archived=False)
+        return Notification.objects.filter(
+            recipient=self.request.user, is_archived=False
+        ).select_related('related_booking')
 
 class NotificationDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).select_related('related_booking')
     
     def update(self, request, *args, **kwargs):
         notification = self.get_object()
-        if 'is_read' in request.data and request.data['is_read']:
+        if 'is_read' in request.data and request.data['is_read'] and not notification.is_read:
             notification.is_read = True
             notification.read_at = timezone.now()
             notification.save()
+            if not notification.is_archived:
+                push_unread_counts(adjust_unread_counts({request.user.id: -1}))
         return Response(self.get_serializer(notification).data)
 
 class UnreadNotificationCountView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request, *args, **kwargs):
-        count = Notification.objects.filter(
-            recipient=request.user, 
-            is_read=False, 
-            is_archived=False
-        ).count()
-        return Response({'unread_count': count})
+        return Response({'unread_count': get_unread_count(request.user.id)})
 
 class MarkAllNotificationsReadView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -46,8 +50,19 @@ class MarkAllNotificationsReadView(generics.GenericAPIView):
             is_read=False, 
             is_archived=False
         ).update(is_read=True, read_at=timezone.now())
+        reset_unread_count(request.user.id)
+        push_unread_counts({request.user.id: 0})
         return Response({'message': 'All notifications marked as read'})
 
+class WebSocketTicketView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        return Response({
+            'ticket': issue_ticket(request.user),
+            'expires_in': socket_options()['TICKET_MAX_AGE'],
+        })
+
 class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
     serializer_class = NotificationPreferenceSerializer
     permission_classes = [permissions.IsAuthenticated]
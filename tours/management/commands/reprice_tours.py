@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from tours.pricing import reprice_catalog
+
+
+class Command(BaseCommand):
+    help = 'Recompute dynamic prices for every open departure and refresh the price cache'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        tables = reprice_catalog()
+        departures = sum(len(table) for table in tables.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Priced {departures} departures across {len(tables)} tours in {time.monotonic() - started:.2f}s'
+        ))
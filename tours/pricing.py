@@ -0,0 +1,97 @@
+from decimal import Decimal
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import TourAvailability
+
+DEFAULT_RULES = {
+    # (occupancy fraction, multiplier) points, linearly interpolated
+    'OCCUPANCY_CURVE': [(0.0, 1.0), (0.5, 1.0), (0.8, 1.15), (1.0, 1.3)],
+    # (days until departure, multiplier) points, linearly interpolated
+    'LEAD_TIME_CURVE': [(0, 1.1), (3, 1.05), (14, 1.0), (90, 1.0), (180, 0.95)],
+    'MIN_MULTIPLIER': 0.8,
+    'MAX_MULTIPLIER': 1.5,
+    'CACHE_TIMEOUT': 300,
+}
+
+
+def pricing_rules():
+    return {**DEFAULT_RULES, **getattr(settings, 'DYNAMIC_PRICING', {})}
+
+
+def cache_key(tour_id):
+    return f'tour_prices:{tour_id}'
+
+
+def compute_multipliers(capacity, spots_available, days_out, rules=None):
+    """Vectorized price multipliers for arrays of departures"""
+    rules = rules or pricing_rules()
+    occupancy = np.clip(1 - spots_available / np.maximum(capacity, 1), 0, 1)
+    occupancy_x, occupancy_y = np.asarray(rules['OCCUPANCY_CURVE'], dtype=float).T
+    lead_x, lead_y = np.asarray(rules['LEAD_TIME_CURVE'], dtype=float).T
+
+    multipliers = np.interp(occupancy, occupancy_x, occupancy_y) * np.interp(days_out, lead_x, lead_y)
+    return np.clip(multipliers, rules['MIN_MULTIPLIER'], rules['MAX_MULTIPLIER'])
+
+
+def build_price_tables(tour_ids=None):
+    """Price every open departure in one query and one NumPy pass.
+
+    Returns ``{tour_id: {availability_id: Decimal price}}`` for the given
+    tours, or for the whole catalog when ``tour_ids`` is None.
+    """
+    today = timezone.localdate()
+    rows = TourAvailability.objects.filter(
+        is_available=True, date__gte=today, tour__is_active=True
+    )
+    if tour_ids is not None:
+        rows = rows.filter(tour_id__in=tour_ids)
+    rows = list(rows.values_list(
+        'id', 'tour_id', 'spots_available', 'date', 'tour__price', 'tour__max_participants'
+    ))
+
+    tables = {tour_id: {} for tour_id in (tour_ids or ())}
+    if not rows:
+        return tables
+
+    ids, tours, spots, dates, base_prices, capacity = zip(*rows)
+    days_out = np.fromiter(((d - today).days for d in dates), dtype=float, count=len(rows))
+    prices = np.round(
+        np.asarray(base_prices, dtype=float)
+        * compute_multipliers(np.asarray(capacity, dtype=float), np.asarray(spots, dtype=float), days_out),
+        2,
+    )
+
+    for availability_id, tour_id, price in zip(ids, tours, prices.tolist()):
+        tables.setdefault(tour_id, {})[availability_id] = Decimal(f'{price:.2f}')
+    return tables
+
+
+def get_price_table(tour_id):
+    """Cached ``{availability_id: price}`` table for one tour"""
+    table = cache.get(cache_key(tour_id))
+    if table is None:
+        table = build_price_tables([tour_id])[tour_id]
+        cache.set(cache_key(tour_id), table, pricing_rules()['CACHE_TIMEOUT'])
+    return table
+
+
+def get_departure_price(availability):
+    """Current per-participant price for a departure"""
+    price = get_price_table(availability.tour_id).get(availability.id)
+    return price if price is not None else availability.tour.price
+
+
+def invalidate_prices(*tour_ids):
+    cache.delete_many([cache_key(tour_id) for tour_id in tour_ids])
+
+
+def reprice_catalog():
+    """Recompute and cache price tables for every active tour"""
+    tables = build_price_tables()
+    cache.set_many(
+        {cache_key(tour_id): table for tour_id, table in tables.items()},
+        pricing_rules()['CACHE_TIMEOUT'],
+    )
+    return tables
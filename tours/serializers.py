@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Tour, TourImage, TourItinerary, TourAvailability
+from .pricing import get_departure_price
 
 class TourImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,10 +15,16 @@ class TourItinerarySerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 class TourAvailabilitySerializer(serializers.ModelSerializer):
+    price = serializers.SerializerMethodField()
+    
     class Meta:
         model = TourAvailability
-        fields = ['id', 'date', 'spots_available', 'is_available']
+        fields = ['id', 'date', 'spots_available', 'is_available', 'price']
         read_only_fields = ['id']
+    
+    def get_price(self, obj):
+        # Same cached price table booking creation charges from
+        return get_departure_price(obj)
 
 class TourSerializer(serializers.ModelSerializer):
     tour_operator_name = serializers.CharField(source='tour_operator.company_name', read_only=True)
@@ -1 +1,12 @@
-# Signals for tours app
\ No newline at end of file
+# Signals for tours app
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Tour, TourAvailability
+from .pricing import invalidate_prices
+
+
+@receiver([post_save, post_delete], sender=Tour)
+@receiver([post_save, post_delete], sender=TourAvailability)
+def invalidate_tour_prices(sender, instance, **kwargs):
+    # Occupancy or base price changed; the next read rebuilds the price table
+    invalidate_prices(instance.pk if sender is Tour else instance.tour_id)
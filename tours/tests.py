@@ -2,8 +2,12 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from datetime import date, timedelta
+from decimal import Decimal
+import numpy as np
 from accounts.models import TourOperator
-from .models import Tour
+from .models import Tour, TourAvailability
+from .pricing import compute_multipliers
 
 User = get_user_model()
 
@@ -76,3 +80,30 @@ class TourAPITestCase(TestCase):
         response = self.client.post('/api/tours/create/', new_tour_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Tour.objects.count(), 2)
+
+    def test_dynamic_departure_pricing(self):
+        """Test departure prices react to occupancy and lead time"""
+        multipliers = compute_multipliers(
+            capacity=np.array([10.0, 10.0, 10.0]),
+            spots_available=np.array([10.0, 1.0, 10.0]),
+            days_out=np.array([30.0, 30.0, 0.0]),
+        )
+        self.assertEqual(multipliers[0], 1.0)
+        self.assertGreater(multipliers[1], multipliers[0])
+        self.assertGreater(multipliers[2], multipliers[0])
+
+        self.tour.start_date = date.today()
+        self.tour.end_date = date.today() + timedelta(days=60)
+        self.tour.save()
+        quiet = TourAvailability.objects.create(
+            tour=self.tour, date=date.today() + timedelta(days=30), spots_available=10
+        )
+        busy = TourAvailability.objects.create(
+            tour=self.tour, date=date.today() + timedelta(days=31), spots_available=1
+        )
+
+        response = self.client.get(f'/api/tours/{self.tour.id}/availability/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        prices = {row['id']: Decimal(str(row['price'])) for row in response.data['results']}
+        self.assertEqual(prices[quiet.id], Decimal('100.00'))
+        self.assertGreater(prices[busy.id], prices[quiet.id])
@@ -1,5 +1,7 @@
 from rest_framework import generics, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
+from analytics import events, sketches
+from analytics.models import ProductEvent, VisitorSketch
 from .models import Tour, TourItinerary, TourAvailability
 from .serializers import (
     TourSerializer, 
@@ -20,11 +22,22 @@ class TourListView(generics.ListAPIView):
     search_fields = ['title', 'description', 'start_location', 'end_location']
     ordering_fields = ['title', 'price', 'start_date', 'created_at']
     ordering = ['-created_at']
+    
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('search'):
+            events.record_request(request, ProductEvent.SEARCH)
+        return super().list(request, *args, **kwargs)
 
 class TourDetailView(generics.RetrieveAPIView):
     queryset = Tour.objects.filter(is_active=True)
     serializer_class = TourSerializer
     permission_classes = [permissions.AllowAny]
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        events.record_request(request, ProductEvent.TOUR_VIEW, response.data['id'])
+        sketches.observe_request(request, VisitorSketch.TOUR, response.data['id'])
+        return response
 
 class TourCreateView(generics.CreateAPIView):
     queryset = Tour.objects.all()